@@ -1,58 +1,483 @@
-import streamlit as st
-from google import genai
-from google.genai.errors import ClientError, ServerError, APIError
-
-# ---------------- API KEY ----------------
-
-try:
-    API_KEY = st.secrets["GOOGLE_API_KEY"]
-except KeyError:
-    st.error("❌ AI configuration missing. Please contact administrator.")
-    st.stop()
-
-# ---------------- CLIENT ----------------
-
-client = genai.Client(api_key=API_KEY)
-
-MODEL = "models/gemini-2.5-flash-lite"
-
-# ---------------- QUERY FUNCTION ----------------
-
-def query_ai(prompt: str) -> str:
-    try:
-        response = client.models.generate_content(
-            model=MODEL,
-            contents=prompt,
-            config={
-                "temperature": 0.4,
-                "max_output_tokens": 1400
-            }
-        )
-        return response.text
-
-    except ClientError as e:
-        code = getattr(e, "code", None)
-
-        if code == 429:
-            return "⚠️ AI is busy due to high usage. Please try again in a minute."
-
-        if code == 400:
-            return "⚠️ Request is too large. Please shorten your message."
-
-        if code in (401, 403):
-            return "⚠️ AI access issue. Please contact the administrator."
-
-        if code == 404:
-            return "⚠️ AI model is temporarily unavailable. Please try later."
-
-        return "⚠️ AI could not process your request. Please try again."
-
-    except ServerError:
-        return "⚠️ AI servers are overloaded right now. Please try again shortly."
-
-    except APIError:
-        return "⚠️ AI service is temporarily unavailable. Please try again later."
-
-    except Exception:
-        return "⚠️ Something went wrong. Please refresh the page and try again."
-
+import itertools
+import time
+
+import streamlit as st
+
+from ai_backends import AIError, GeminiBackend, StubBackend, RecordBackend, ReplayBackend
+from ai_cache import ResponseCache, cache_key
+from ai_coalesce import SingleFlight, FlightAbandoned, FlightTimeout
+from ai_limits import CircuitBreaker, CircuitOpen, RateLimiter, RateLimited, backoff
+from ai_metrics import AIMetrics
+from config import get_setting
+
+MODEL = "models/gemini-2.5-flash-lite"
+
+GENERATION_CONFIG = {
+    "temperature": 0.4,
+    "max_output_tokens": 1400
+}
+
+
+def json_config(schema, max_output_tokens=None):
+    """GENERATION_CONFIG for an answer held to a JSON `schema`."""
+    config = dict(GENERATION_CONFIG, response_mime_type="application/json",
+                  response_schema=schema)
+    if max_output_tokens:
+        config["max_output_tokens"] = max_output_tokens
+    return config
+
+# ---------------- BACKEND ----------------
+
+@st.cache_resource
+def get_backend():
+    # AI_BACKEND=stub / replay run without an API key or network
+    name = get_setting("AI_BACKEND", "gemini")
+
+    if name == "stub":
+        return StubBackend(
+            latency=float(get_setting("AI_STUB_LATENCY", 0.5)),
+            chunk_delay=float(get_setting("AI_STUB_CHUNK_DELAY", 0.05)),
+            failure_rate=float(get_setting("AI_STUB_FAILURE_RATE", 0)),
+            failure_code=int(get_setting("AI_STUB_FAILURE_CODE", 503)),
+            seed=int(get_setting("AI_STUB_SEED", 0)),
+        )
+    if name == "replay":
+        return ReplayBackend(
+            get_setting("AI_RECORD_DIR", "ai_recordings"), MODEL,
+            chunk_delay=float(get_setting("AI_STUB_CHUNK_DELAY", 0.05)),
+        )
+    if name not in ("gemini", "record"):
+        raise ValueError(f"Unknown AI_BACKEND: {name!r}")
+
+    try:
+        api_key = get_setting("GOOGLE_API_KEY")
+    except KeyError:
+        # Surfaces as the "AI access issue" message; pages check for it
+        # up front with ai_configured()
+        raise AIError(401, "GOOGLE_API_KEY is not set") from None
+
+    backend = GeminiBackend(api_key, MODEL)
+    if name == "record":
+        backend = RecordBackend(backend, get_setting("AI_RECORD_DIR", "ai_recordings"), MODEL)
+    return backend
+
+
+def backend_name():
+    return get_backend().name
+
+
+def ai_configured():
+    """False when the AI backend can't be built, e.g. without an API key.
+
+    Call it on the script thread: a plan job hitting the same problem
+    can only report it as a failed job.
+    """
+    try:
+        get_backend()
+    except AIError:
+        return False
+    return True
+
+
+def _key(prompt, config=None):
+    # Stub plans must never be served from a cache the real model fills;
+    # read from the setting so building the backend stays inside the
+    # callers' error handling
+    model = "stub" if get_setting("AI_BACKEND", "gemini") == "stub" else MODEL
+    return cache_key(prompt, model, config or GENERATION_CONFIG)
+
+# ---------------- RESPONSE CACHE ----------------
+
+@st.cache_resource
+def get_ai_cache():
+    if str(get_setting("AI_CACHE", "1")).lower() in ("0", "false", "no"):
+        return None
+    return ResponseCache(
+        maxsize=int(get_setting("AI_CACHE_SIZE", 256)),
+        ttl=float(get_setting("AI_CACHE_TTL", 86400)),
+        # Empty AI_CACHE_DIR keeps the cache in memory only
+        disk_dir=get_setting("AI_CACHE_DIR", ".ai_cache") or None,
+        disk_max_bytes=int(float(get_setting("AI_CACHE_DISK_MB", 100)) * 1024 * 1024),
+    )
+
+
+def ai_cache_stats():
+    cache = get_ai_cache()
+    return cache.stats() if cache else None
+
+
+def invalidate_ai_cache(prompt=None, config=None):
+    # One prompt's answer, or everything when no prompt is given
+    cache = get_ai_cache()
+    if cache is None:
+        return
+    if prompt is None:
+        cache.clear()
+    else:
+        cache.invalidate(_key(prompt, config))
+
+
+# ---------------- RATE LIMIT / RETRIES ----------------
+
+# 429 and transient server errors; anything else fails the same way twice
+RETRYABLE_CODES = (429, 500, 502, 503, 504)
+
+
+@st.cache_resource
+def get_limiter():
+    # One per server process, shared by every session: size it to the
+    # project's quota for MODEL
+    return RateLimiter(
+        rpm=float(get_setting("AI_RPM", 15)),
+        tpm=float(get_setting("AI_TPM", 250_000)),
+        timeout=float(get_setting("AI_QUEUE_TIMEOUT", 30)),
+    )
+
+
+def limiter_stats():
+    return get_limiter().stats()
+
+# ---------------- CIRCUIT BREAKER ----------------
+
+@st.cache_resource
+def get_breaker():
+    # Shared by every session: once the API has failed AI_BREAKER_FAILURES
+    # calls in a row nobody waits on it for AI_BREAKER_RESET seconds, then
+    # AI_BREAKER_PROBES trial calls decide whether it is back
+    return CircuitBreaker(
+        threshold=int(get_setting("AI_BREAKER_FAILURES", 5)),
+        reset_timeout=float(get_setting("AI_BREAKER_RESET", 30)),
+        probes=int(get_setting("AI_BREAKER_PROBES", 1)),
+    )
+
+
+def breaker_stats():
+    return get_breaker().stats()
+
+
+def ai_available():
+    """False while the circuit is open: callers should degrade, not call."""
+    return get_breaker().available()
+
+
+def _estimate_tokens(prompt, config):
+    # ~4 characters per token, plus the whole output budget
+    return len(prompt) // 4 + config["max_output_tokens"]
+
+
+def _usage(reply):
+    return reply.total_tokens
+
+
+def _stream_usage(prompt, parts, last):
+    # Only a finished stream reports usage; a closed or broken one is
+    # charged for the prompt and what it produced, at ~4 chars per token
+    usage = last and _usage(last)
+    if usage is not None:
+        return usage
+    return len(prompt) // 4 + sum(len(part) for part in parts) // 4
+
+
+def _retryable(e):
+    return isinstance(e, AIError) and e.code in RETRYABLE_CODES
+
+
+def _upstream_failure(e):
+    # Counts toward opening the circuit: 429 / 5xx and connection errors.
+    # A 400 or 404 means the API answered, just not with a plan.
+    return _retryable(e) or not isinstance(e, AIError)
+
+
+def _with_retries(call, prompt, config, hold=False):
+    """Run call() inside the shared quota, retrying transient failures.
+
+    Returns (result, estimated_tokens) so the caller can settle() the
+    reservation once the real usage is known. Raises CircuitOpen without
+    calling anything while the API is known to be down. With hold=True a
+    successful call keeps its breaker slot; the caller must report the
+    outcome with get_breaker().after_call() once it is known (a stream).
+    """
+    limiter = get_limiter()
+    breaker = get_breaker()
+    estimate = _estimate_tokens(prompt, config)
+    retries = int(get_setting("AI_MAX_RETRIES", 3))
+
+    for attempt in range(retries + 1):
+        breaker.before_call()
+        try:
+            limiter.acquire(estimate)
+        except RateLimited:
+            breaker.cancel()
+            raise
+        try:
+            result = call()
+        except Exception as e:
+            breaker.after_call(failed=_upstream_failure(e))
+            if attempt == retries or not _retryable(e):
+                if attempt:
+                    limiter.record_gave_up()
+                raise
+            limiter.record_retry()
+            time.sleep(backoff(
+                attempt,
+                base=float(get_setting("AI_RETRY_BASE", 1.0)),
+                cap=float(get_setting("AI_RETRY_CAP", 20.0)),
+            ))
+        else:
+            if not hold:
+                breaker.after_call(failed=False)
+            return result, estimate
+
+
+def _open_stream(prompt, config):
+    # Pull the first chunk inside the retry loop: the request is only
+    # sent, and can only fail with a 429, once iteration starts
+    stream = iter(get_backend().stream(prompt, config))
+    first = next(stream, None)
+    return stream if first is None else itertools.chain([first], stream)
+
+
+def _finished(reply):
+    # Truncated (MAX_TOKENS) or filtered answers must not be replayed
+    return reply.finish_reason in (None, "STOP")
+
+# ---------------- ERRORS ----------------
+
+def _error_message(e):
+    # Every failure surfaces as a "⚠️" message; callers test for that prefix
+    if isinstance(e, (RateLimited, FlightTimeout)):
+        return "⚠️ AI is busy due to high usage. Please try again in a minute."
+
+    if isinstance(e, FlightAbandoned):
+        return "⚠️ AI could not process your request. Please try again."
+
+    if isinstance(e, CircuitOpen):
+        return "⚠️ AI service is temporarily unavailable. Please try again in a few minutes."
+
+    if isinstance(e, AIError):
+        code = e.code
+
+        if code == 429:
+            return "⚠️ AI is busy due to high usage. Please try again in a minute."
+
+        if code == 400:
+            return "⚠️ Request is too large. Please shorten your message."
+
+        if code in (401, 403):
+            return "⚠️ AI access issue. Please contact the administrator."
+
+        if code == 404:
+            return "⚠️ AI model is temporarily unavailable. Please try later."
+
+        if code is not None and 400 <= code < 500:
+            return "⚠️ AI could not process your request. Please try again."
+
+        if code is not None and code >= 500:
+            return "⚠️ AI servers are overloaded right now. Please try again shortly."
+
+        return "⚠️ AI service is temporarily unavailable. Please try again later."
+
+    return "⚠️ Something went wrong. Please refresh the page and try again."
+
+
+def _cache_for(prompt, cache, config):
+    # The key also names the prompt's in-flight call, cached or not
+    return (get_ai_cache() if cache else None), _key(prompt, config)
+
+# ---------------- REQUEST COALESCING ----------------
+
+@st.cache_resource
+def get_flights():
+    return SingleFlight(timeout=float(get_setting("AI_COALESCE_TIMEOUT", 120)))
+
+
+def coalesce_stats():
+    return get_flights().stats()
+
+# ---------------- METRICS ----------------
+
+@st.cache_resource
+def get_metrics():
+    return AIMetrics()
+
+
+def _outcome(e):
+    if isinstance(e, AIError):
+        return str(e.code)
+    if isinstance(e, RateLimited):
+        return "rate_limited"
+    if isinstance(e, FlightTimeout):
+        return "timeout"
+    if isinstance(e, FlightAbandoned):
+        return "abandoned"
+    if isinstance(e, CircuitOpen):
+        return "circuit_open"
+    return "error"
+
+
+def _record(site, source, start, error=None, first_chunk=None, reply=None):
+    get_metrics().record(
+        site, source, time.perf_counter() - start,
+        outcome="ok" if error is None else _outcome(error),
+        first_chunk=first_chunk,
+        prompt_tokens=reply.prompt_tokens if reply else None,
+        output_tokens=reply.output_tokens if reply else None,
+        finish_reason=reply.finish_reason if reply else None,
+    )
+
+
+def _gauges():
+    gauges = {"ai_limiter": limiter_stats(), "ai_shared": coalesce_stats(),
+              "ai_breaker": breaker_stats()}
+    cache = ai_cache_stats()
+    if cache:
+        gauges["ai_cache"] = cache
+    return gauges
+
+
+def metrics_text():
+    """Prometheus text exposition of every AI metric."""
+    return get_metrics().to_prometheus(_gauges())
+
+
+def metrics_json():
+    return get_metrics().to_json(_gauges())
+
+
+def metrics_snapshot():
+    return get_metrics().to_dict(_gauges())
+
+# ---------------- QUERY FUNCTION ----------------
+
+def query_ai(prompt: str, cache: bool = True, site: str = "other",
+             config: dict = None) -> str:
+    # cache=False neither reads nor stores: use it when the caller wants
+    # a fresh answer to a prompt it has already sent. `site` names the
+    # calling flow in the metrics; `config` replaces GENERATION_CONFIG,
+    # e.g. json_config(schema) for a structured answer.
+    config = config or GENERATION_CONFIG
+    start = time.perf_counter()
+    store, key = _cache_for(prompt, cache, config)
+    if store is not None:
+        text = store.get(key)
+        if text is not None:
+            _record(site, "cache", start)
+            return text
+
+    flights = get_flights()
+    flight, leader = flights.join(key)
+    if not leader:
+        try:
+            text = "".join(flights.follow(flight))
+        except Exception as e:
+            _record(site, "shared", start, e)
+            return _error_message(e)
+        _record(site, "shared", start)
+        return text
+
+    error = None
+    reply = None
+    try:
+        reply, estimate = _with_retries(
+            lambda: get_backend().generate(prompt, config),
+            prompt, config,
+        )
+        get_limiter().settle(estimate, _usage(reply))
+        text = reply.text
+        # Only successful, complete answers; errors return a "⚠️"
+        # message below and are never cached
+        if store is not None and text and _finished(reply):
+            store.put(key, text)
+        flights.publish(flight, text or "")
+        return text
+
+    except Exception as e:
+        error = e
+        return _error_message(e)
+
+    finally:
+        flights.finish(key, flight, error)
+        _record(site, "model", start, error, reply=reply)
+
+# ---------------- STREAMING ----------------
+
+def stream_ai(prompt: str, cache: bool = True, site: str = "other",
+              config: dict = None):
+    """Yield the response in chunks as the model produces them.
+
+    A cached answer comes back as a single chunk. A failure, before or
+    part-way through the stream, is yielded as one final chunk holding
+    the "⚠️" message. Closing the generator early (the caller rejected the
+    output) cancels the request and stores nothing.
+
+    An identical prompt already streaming for another session is followed
+    rather than sent again.
+    """
+    config = config or GENERATION_CONFIG
+    start = time.perf_counter()
+    store, key = _cache_for(prompt, cache, config)
+    if store is not None:
+        text = store.get(key)
+        if text is not None:
+            _record(site, "cache", start, first_chunk=0.0)
+            yield text
+            return
+
+    flights = get_flights()
+    flight, leader = flights.join(key)
+    if not leader:
+        error = FlightAbandoned("Follower stopped reading")
+        first = None
+        try:
+            for chunk in flights.follow(flight):
+                if first is None:
+                    first = time.perf_counter() - start
+                yield chunk
+            error = None
+        except Exception as e:
+            error = e
+            yield _error_message(e)
+        finally:
+            _record(site, "shared", start, error, first)
+        return
+
+    # Anything but a clean finish (including our caller closing us) fails
+    # the followers instead of leaving them with a truncated plan
+    error = FlightAbandoned("Shared AI call was stopped early")
+    parts = []
+    stream = None
+    last = None
+    first = None
+    try:
+        # Retries only cover opening the stream; a failure part-way
+        # through cannot be retried without repeating what was shown
+        stream, estimate = _with_retries(lambda: _open_stream(prompt, config),
+                                         prompt, config, hold=True)
+        for last in stream:
+            if first is None:
+                first = time.perf_counter() - start
+            if last.text:
+                parts.append(last.text)
+                flights.publish(flight, last.text)
+                yield last.text
+
+        text = "".join(parts)
+        if store is not None and text and last and _finished(last):
+            store.put(key, text)
+        error = None
+
+    except Exception as e:
+        error = e
+        yield _error_message(e)
+
+    finally:
+        if stream is not None:
+            # Also runs when the caller closes us early (GeneratorExit):
+            # release the breaker slot held since the stream opened and
+            # settle the reservation with what was actually used
+            failed = (error is not None and not isinstance(error, FlightAbandoned)
+                      and _upstream_failure(error))
+            get_breaker().after_call(failed=failed)
+            get_limiter().settle(estimate, _stream_usage(prompt, parts, last))
+        flights.finish(key, flight, error)
+        _record(site, "model", start, error, first, last)
@@ -0,0 +1,316 @@
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+
+from ai_cache import cache_key
+from plan_model import parse_plan
+from sample_plans import make_plan
+
+# Model backends behind ai_api.query_ai / stream_ai.
+#
+#   gemini   the real Google GenAI API
+#   stub     deterministic local plans with configurable latency and
+#            injected failures, for offline runs and load tests
+#   record   gemini, saving every response under a directory
+#   replay   answers only from such a directory
+#
+# Every backend returns Reply objects and raises AIError, so the caching,
+# rate limiting, retry and coalescing layers in ai_api work unchanged
+# whichever one is behind them.
+
+
+class AIError(Exception):
+    """A failed model call; `code` follows the HTTP status of the API."""
+
+    def __init__(self, code, message=""):
+        super().__init__(f"{code} {message}".strip())
+        self.code = code
+
+
+@dataclass
+class Reply:
+    text: str
+    finish_reason: str = None    # "STOP", "MAX_TOKENS", ...; last chunk only when streaming
+    prompt_tokens: int = None
+    output_tokens: int = None
+    total_tokens: int = None
+
+
+def _estimate(text):
+    return max(1, len(text) // 4)
+
+# ---------------- GEMINI ----------------
+
+class GeminiBackend:
+    name = "gemini"
+
+    def __init__(self, api_key, model):
+        from google import genai
+
+        self.model = model
+        self.client = genai.Client(api_key=api_key)
+
+    @staticmethod
+    def _reply(response):
+        try:
+            reason = response.candidates[0].finish_reason
+        except (AttributeError, IndexError, TypeError):
+            reason = None
+        usage = getattr(response, "usage_metadata", None)
+
+        return Reply(
+            text=response.text or "",
+            finish_reason=getattr(reason, "name", reason),
+            prompt_tokens=getattr(usage, "prompt_token_count", None),
+            output_tokens=getattr(usage, "candidates_token_count", None),
+            total_tokens=getattr(usage, "total_token_count", None),
+        )
+
+    @staticmethod
+    def _error(e):
+        from google.genai.errors import APIError, ServerError
+
+        if isinstance(e, APIError):
+            code = getattr(e, "code", None)
+            if code is None and isinstance(e, ServerError):
+                code = 500
+            return AIError(code, getattr(e, "message", "") or "")
+        return e
+
+    def generate(self, prompt, config):
+        try:
+            response = self.client.models.generate_content(
+                model=self.model,
+                contents=prompt,
+                config=config
+            )
+        except Exception as e:
+            raise self._error(e) from e
+        return self._reply(response)
+
+    def stream(self, prompt, config):
+        try:
+            for chunk in self.client.models.generate_content_stream(
+                model=self.model,
+                contents=prompt,
+                config=config
+            ):
+                yield self._reply(chunk)
+        except Exception as e:
+            raise self._error(e) from e
+
+# ---------------- STUB ----------------
+
+# Enough of each prompt to make the stub's plan look like an answer to it
+_PLACE = re.compile(r"Workout place selected:\s*(Gym|Home)")
+_DIET = re.compile(r"Diet preference:\s*(Vegetarian|Eggetarian|Non-Vegetarian)")
+_CITY = re.compile(r"commonly eaten (?:in|and easily available in)\s*([A-Z][\w .]+?)[,\n]")
+_BUDGET = re.compile(r"₹\s*(\d+)")
+_WEEK = re.compile(r"Week\s+(\d+)")
+_HALF = re.compile(r"ONLY a COMPLETE 7-day (WORKOUT|DIET)")
+_ITEM = re.compile(r"^\s*- (?:(Day) (\d+):|([^:]+):?\s*(.*))$")
+
+
+def _as_json(text):
+    # The stub's markdown plan in the shape plan_schema.PLAN_SCHEMA asks for
+    plan = {"title": "", "workout": [], "diet": []}
+    section = None
+    for line in text.splitlines():
+        match = _ITEM.match(line)
+        if not match:
+            continue
+        if match.group(1):
+            plan[section].append({"day": int(match.group(2))})
+        elif line.startswith("- "):
+            name = match.group(3).lower()
+            section = "workout" if "workout" in name else "diet" if "diet" in name else None
+            if name == "title":
+                plan["title"] = match.group(4)
+        elif section == "workout":
+            plan["workout"][-1].setdefault("exercises", []).append(
+                {"name": match.group(3), "detail": match.group(4)})
+        elif section == "diet":
+            plan["diet"][-1].setdefault("meals", []).append(
+                {"meal": match.group(3), "food": match.group(4)})
+    return json.dumps(plan, ensure_ascii=False)
+
+
+def _as_patch(text, rng):
+    # One plan_patch.PATCH_SCHEMA operation: a dinner taken from the
+    # stub's plan for the prompt, on a day picked from the same seed
+    day = rng.choice(parse_plan(text).diet)
+    meal = day.meal("Dinner") or day.meals[-1]
+    return json.dumps({"ops": [{"op": "set_meal", "day": day.day,
+                                "meal": meal.meal or "Dinner", "food": meal.food}]},
+                      ensure_ascii=False)
+
+
+class StubBackend:
+    """Well-formed 7-day plans, the same one for the same prompt.
+
+    A JSON config (ai_api.json_config) gets the same plan as JSON, or a
+    one-meal edit for the chat patch schema.
+    `latency` is the wait before the first chunk, `chunk_delay` the wait
+    between chunks; `failure_rate` of calls raise AIError(failure_code),
+    drawn from a seeded RNG so a load test fails the same calls each run.
+    """
+
+    name = "stub"
+
+    def __init__(self, latency=0.0, chunk_delay=0.0, chunk_size=80,
+                 failure_rate=0.0, failure_code=503, seed=0):
+        self.latency = latency
+        self.chunk_delay = chunk_delay
+        self.chunk_size = chunk_size
+        self.failure_rate = failure_rate
+        self.failure_code = failure_code
+
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+
+    def _plan(self, prompt):
+        def field(pattern, default):
+            match = pattern.search(prompt)
+            return match.group(1).strip() if match else default
+
+        digest = hashlib.sha256(prompt.encode("utf-8")).digest()
+        text = make_plan(
+            random.Random(digest),
+            week=int(field(_WEEK, 1)),
+            diet=field(_DIET, "Vegetarian"),
+            workout_place=field(_PLACE, "Home"),
+            city=field(_CITY, "Chennai"),
+            budget=int(field(_BUDGET, 500)),
+        )
+
+        half = field(_HALF, None)
+        if half == "WORKOUT":
+            return text[text.index("- 7-Day Workout Plan"):text.index("- 7-Day Diet Plan")].strip()
+        if half == "DIET":
+            return text[text.index("- 7-Day Diet Plan"):text.index("- Hydration:")].strip()
+        return text
+
+    def _maybe_fail(self):
+        with self._lock:
+            fail = self._rng.random() < self.failure_rate
+        if fail:
+            raise AIError(self.failure_code, "injected by the stub backend")
+
+    def _replies(self, prompt, config):
+        self._maybe_fail()
+        time.sleep(self.latency)
+
+        text = self._plan(prompt)
+        if (config or {}).get("response_mime_type") == "application/json":
+            if "ops" in config["response_schema"]["properties"]:
+                digest = hashlib.sha256(prompt.encode("utf-8")).digest()
+                text = _as_patch(text, random.Random(digest))
+            else:
+                text = _as_json(text)
+        chunks = [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)]
+        for i, chunk in enumerate(chunks):
+            if i:
+                time.sleep(self.chunk_delay)
+            last = i == len(chunks) - 1
+            yield Reply(
+                text=chunk,
+                finish_reason="STOP" if last else None,
+                prompt_tokens=_estimate(prompt) if last else None,
+                output_tokens=_estimate(text) if last else None,
+                total_tokens=_estimate(prompt) + _estimate(text) if last else None,
+            )
+
+    def generate(self, prompt, config):
+        parts = list(self._replies(prompt, config))
+        last = parts[-1]
+        return Reply("".join(p.text for p in parts), last.finish_reason,
+                     last.prompt_tokens, last.output_tokens, last.total_tokens)
+
+    def stream(self, prompt, config):
+        return self._replies(prompt, config)
+
+# ---------------- RECORD / REPLAY ----------------
+
+class RecordBackend:
+    """Pass calls to `inner` and save each complete answer to `directory`."""
+
+    name = "record"
+
+    def __init__(self, inner, directory, model):
+        self.inner = inner
+        self.directory = directory
+        self.model = model
+        os.makedirs(directory, exist_ok=True)
+
+    def _save(self, prompt, config, reply):
+        if reply.finish_reason not in (None, "STOP") or not reply.text:
+            return
+        path = os.path.join(self.directory, f"{cache_key(prompt, self.model, config)}.json")
+        record = {"model": self.model, "config": config, "prompt": prompt,
+                  "text": reply.text, "prompt_tokens": reply.prompt_tokens,
+                  "output_tokens": reply.output_tokens}
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(record, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, path)
+
+    def generate(self, prompt, config):
+        reply = self.inner.generate(prompt, config)
+        self._save(prompt, config, reply)
+        return reply
+
+    def stream(self, prompt, config):
+        parts = []
+        last = None
+        for last in self.inner.stream(prompt, config):
+            parts.append(last.text)
+            yield last
+
+        if last is not None:
+            self._save(prompt, config, Reply("".join(parts), last.finish_reason,
+                                             last.prompt_tokens, last.output_tokens))
+
+
+class ReplayBackend:
+    """Answer from a RecordBackend directory; unknown prompts are a 404."""
+
+    name = "replay"
+
+    def __init__(self, directory, model, chunk_delay=0.0, chunk_size=80):
+        self.directory = directory
+        self.model = model
+        self.chunk_delay = chunk_delay
+        self.chunk_size = chunk_size
+
+    def _load(self, prompt, config):
+        path = os.path.join(self.directory, f"{cache_key(prompt, self.model, config)}.json")
+        try:
+            with open(path, encoding="utf-8") as f:
+                record = json.load(f)
+        except FileNotFoundError:
+            raise AIError(404, "prompt not in the replay recordings") from None
+
+        prompt_tokens = record.get("prompt_tokens") or _estimate(prompt)
+        output_tokens = record.get("output_tokens") or _estimate(record["text"])
+        return Reply(record["text"], "STOP", prompt_tokens, output_tokens,
+                     prompt_tokens + output_tokens)
+
+    def generate(self, prompt, config):
+        return self._load(prompt, config)
+
+    def stream(self, prompt, config):
+        reply = self._load(prompt, config)
+        text = reply.text
+        for i in range(0, len(text), self.chunk_size):
+            if i:
+                time.sleep(self.chunk_delay)
+            if i + self.chunk_size >= len(text):
+                yield Reply(text[i:], "STOP", reply.prompt_tokens,
+                            reply.output_tokens, reply.total_tokens)
+            else:
+                yield Reply(text[i:i + self.chunk_size])
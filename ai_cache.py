@@ -0,0 +1,268 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Content-addressed cache for model responses.
+#
+# The key is a SHA-256 over the normalized prompt, the model name and the
+# generation config, so two students with the same profile, city, budget
+# and preferences share one answer. Two tiers:
+#
+#   memory   LRU of the hottest entries in this server process
+#   disk     one JSON file per key under AI_CACHE_DIR, shared by every
+#            process on the machine and surviving restarts; oldest files
+#            are evicted once the directory grows past its byte budget
+#
+# Both tiers expire entries after `ttl` seconds of wall-clock time. Callers
+# only put() responses they trust; error strings never reach this module.
+
+
+def normalize_prompt(prompt):
+    # Prompts are f-string templates: indentation and trailing blanks vary
+    # with the call site, not with what is being asked
+    lines = (line.strip() for line in prompt.strip().splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def cache_key(prompt, model, config):
+    payload = json.dumps(
+        {"model": model, "config": config, "prompt": normalize_prompt(prompt)},
+        sort_keys=True, ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, maxsize=256, ttl=86400, disk_dir=None,
+                 disk_max_bytes=100 * 1024 * 1024):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+
+        self._lock = threading.Lock()
+        self._data = OrderedDict()   # key -> (created_at, text)
+
+        self._memory_hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._stores = 0
+        self._evictions = 0
+        self._disk_evictions = 0
+        self._expirations = 0
+        self._invalidations = 0
+
+        self._disk_bytes = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._disk_bytes = sum(size for _, size, _ in self._disk_files())
+
+    # ---------------- LOOKUP ----------------
+
+    def get(self, key):
+        now = time.time()
+
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                created_at, text = entry
+                if created_at + self.ttl > now:
+                    self._data.move_to_end(key)
+                    self._memory_hits += 1
+                    return text
+                del self._data[key]
+                self._expirations += 1
+
+        entry = self._read_disk(key, now)
+
+        with self._lock:
+            if entry is None:
+                self._misses += 1
+                return None
+            self._disk_hits += 1
+            self._remember(key, *entry)
+            return entry[1]
+
+    def put(self, key, text):
+        if not text:
+            return
+        now = time.time()
+
+        with self._lock:
+            self._remember(key, now, text)
+            self._stores += 1
+
+        self._write_disk(key, now, text)
+
+    # ---------------- INVALIDATION ----------------
+
+    def invalidate(self, key):
+        with self._lock:
+            found = self._data.pop(key, None) is not None
+
+        path = self._path(key)
+        if path:
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+                found = True
+                with self._lock:
+                    self._disk_bytes -= size
+            except FileNotFoundError:
+                pass
+
+        if found:
+            with self._lock:
+                self._invalidations += 1
+        return found
+
+    def clear(self):
+        with self._lock:
+            self._invalidations += len(self._data)
+            self._data.clear()
+
+        for path, _, _ in self._disk_files():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self._disk_bytes = 0
+
+    # ---------------- MEMORY TIER ----------------
+
+    def _remember(self, key, created_at, text):
+        self._data[key] = (created_at, text)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self._evictions += 1
+
+    # ---------------- DISK TIER ----------------
+
+    def _path(self, key):
+        if not self.disk_dir:
+            return None
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _disk_files(self):
+        # (path, size, last use) for every entry, oldest first
+        if not self.disk_dir:
+            return []
+        files = []
+        with os.scandir(self.disk_dir) as it:
+            for entry in it:
+                if not entry.name.endswith(".json"):
+                    continue
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((entry.path, st.st_size, st.st_mtime))
+        files.sort(key=lambda f: f[2])
+        return files
+
+    def _read_disk(self, key, now):
+        path = self._path(key)
+        if not path:
+            return None
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+        if data["created_at"] + self.ttl <= now:
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+            except FileNotFoundError:
+                size = 0
+            with self._lock:
+                self._disk_bytes -= size
+                self._expirations += 1
+            return None
+
+        # mtime doubles as "last used" for size-based eviction
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return data["created_at"], data["text"]
+
+    def _write_disk(self, key, created_at, text):
+        path = self._path(key)
+        if not path:
+            return
+
+        body = json.dumps({"created_at": created_at, "text": text},
+                          ensure_ascii=False).encode("utf-8")
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(body)
+            # Replacing an entry frees what the old file took
+            try:
+                old = os.path.getsize(path)
+            except FileNotFoundError:
+                old = 0
+            os.replace(tmp, path)
+        except OSError as e:
+            # A full or read-only disk only costs us the second tier
+            print("AI cache write failed:", e)
+            return
+
+        with self._lock:
+            self._disk_bytes += len(body) - old
+            over = self._disk_bytes > self.disk_max_bytes
+        if over:
+            self._evict_disk()
+
+    def _evict_disk(self):
+        # Re-scan: other processes share the directory, so our running
+        # total is only a hint for when to look
+        files = self._disk_files()
+        total = sum(size for _, size, _ in files)
+        evicted = 0
+
+        for path, size, _ in files:
+            if total <= self.disk_max_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            evicted += 1
+
+        with self._lock:
+            self._disk_bytes = total
+            self._disk_evictions += evicted
+
+    # ---------------- STATS ----------------
+
+    def stats(self):
+        with self._lock:
+            hits = self._memory_hits + self._disk_hits
+            lookups = hits + self._misses
+            return {
+                "entries": len(self._data),
+                "max_entries": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "disk_dir": self.disk_dir,
+                "disk_bytes": self._disk_bytes,
+                "disk_max_bytes": self.disk_max_bytes if self.disk_dir else 0,
+                "hits": hits,
+                "memory_hits": self._memory_hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+                "stores": self._stores,
+                "evictions": self._evictions,
+                "disk_evictions": self._disk_evictions,
+                "expirations": self._expirations,
+                "invalidations": self._invalidations,
+            }
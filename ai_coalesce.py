@@ -0,0 +1,109 @@
+import threading
+
+# Single-flight for model calls: while a prompt is being answered, anyone
+# else asking for the same key (a double-clicked button, two students with
+# the same profile) follows that call instead of paying for their own.
+#
+# The leader publishes each chunk as it arrives, so followers of a stream
+# see it grow at the same pace. When the leader finishes, its text or its
+# exception reaches every follower.
+
+
+class FlightTimeout(Exception):
+    """The shared call made no progress within the follower's timeout."""
+
+
+class FlightAbandoned(Exception):
+    """The leader stopped reading before the response was complete."""
+
+
+class Flight:
+    __slots__ = ("chunks", "done", "error", "cond", "followers")
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.cond = threading.Condition()
+        self.followers = 0
+
+
+class SingleFlight:
+    def __init__(self, timeout=120):
+        self.timeout = timeout
+
+        self._lock = threading.Lock()
+        self._flights = {}   # key -> Flight
+
+        self._leaders = 0
+        self._followers = 0
+        self._timeouts = 0
+        self._errors_shared = 0
+
+    def join(self, key):
+        """Return (flight, True) to lead a new call or (flight, False) to follow."""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.followers += 1
+                self._followers += 1
+                return flight, False
+
+            flight = self._flights[key] = Flight()
+            self._leaders += 1
+            return flight, True
+
+    def publish(self, flight, chunk):
+        with flight.cond:
+            flight.chunks.append(chunk)
+            flight.cond.notify_all()
+
+    def finish(self, key, flight, error=None):
+        # Unregister first: a request arriving after this starts fresh
+        # (and normally hits the response cache the leader just filled)
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            if error is not None and flight.followers:
+                self._errors_shared += flight.followers
+
+        with flight.cond:
+            flight.done = True
+            flight.error = error
+            flight.cond.notify_all()
+
+    def follow(self, flight):
+        """Yield the leader's chunks; re-raise its error when it fails."""
+        seen = 0
+        while True:
+            with flight.cond:
+                ready = flight.cond.wait_for(
+                    lambda: flight.done or len(flight.chunks) > seen,
+                    self.timeout,
+                )
+                if not ready:
+                    with self._lock:
+                        self._timeouts += 1
+                    raise FlightTimeout(f"No progress on a shared AI call in {self.timeout:.0f}s")
+
+                chunks = flight.chunks[seen:]
+                done, error = flight.done, flight.error
+
+            for chunk in chunks:
+                yield chunk
+            seen += len(chunks)
+
+            if done and seen == len(flight.chunks):
+                if error is not None:
+                    raise error
+                return
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": len(self._flights),
+                "calls": self._leaders,
+                "calls_saved": self._followers,
+                "follower_timeouts": self._timeouts,
+                "errors_shared": self._errors_shared,
+            }
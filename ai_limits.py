@@ -0,0 +1,225 @@
+import random
+import threading
+import time
+
+# Client-side quota and failure handling for the model API, shared by every session in the
+# server process.
+#
+# Two token buckets, requests/minute and tokens/minute, refill continuously
+# and start full, so a burst up to one minute's quota goes straight through
+# and anything beyond it queues until capacity frees up instead of being
+# sent to come back as a 429. A call reserves its estimated tokens up front;
+# settle() returns the difference once the real usage is known.
+
+
+class RateLimited(Exception):
+    """Waited longer than the queue timeout for quota."""
+
+
+class RateLimiter:
+    def __init__(self, rpm=15, tpm=250_000, timeout=30):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.timeout = timeout
+
+        self._cond = threading.Condition()
+        self._requests = float(rpm)
+        self._tokens = float(tpm)
+        self._updated = time.monotonic()
+
+        self._admitted = 0
+        self._queued = 0
+        self._waiting = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._timeouts = 0
+        self._retries = 0
+        self._gave_up = 0
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+
+    def acquire(self, tokens, timeout=None):
+        """Block until one request and `tokens` fit the quota.
+
+        Returns the seconds spent queued; raises RateLimited on timeout.
+        """
+        tokens = min(tokens, self.tpm)   # a huge prompt still gets through, alone
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+
+        with self._cond:
+            self._waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+
+                    if self._requests >= 1 and self._tokens >= tokens:
+                        self._requests -= 1
+                        self._tokens -= tokens
+                        break
+
+                    need = max((1 - self._requests) * 60 / self.rpm,
+                               (tokens - self._tokens) * 60 / self.tpm)
+                    if now + need > deadline:
+                        self._timeouts += 1
+                        raise RateLimited(f"No AI quota within {timeout:.0f}s")
+                    self._cond.wait(need)
+            finally:
+                self._waiting -= 1
+
+            waited = time.monotonic() - start
+            self._admitted += 1
+            if waited > 0.001:
+                self._queued += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+            return waited
+
+    def settle(self, estimated, actual):
+        # Give back (or take) the difference between reserved and used
+        if actual is None:
+            return
+        with self._cond:
+            self._refill(time.monotonic())
+            self._tokens = min(self.tpm, self._tokens + estimated - actual)
+            self._cond.notify_all()
+
+    def record_retry(self):
+        with self._cond:
+            self._retries += 1
+
+    def record_gave_up(self):
+        with self._cond:
+            self._gave_up += 1
+
+    def stats(self):
+        with self._cond:
+            self._refill(time.monotonic())
+            return {
+                "rpm": self.rpm,
+                "tpm": self.tpm,
+                "requests_available": round(self._requests, 1),
+                "tokens_available": int(self._tokens),
+                "admitted": self._admitted,
+                "queued": self._queued,
+                "waiting_now": self._waiting,
+                "wait_avg_ms": round(1000 * self._wait_total / self._admitted, 1)
+                if self._admitted else 0.0,
+                "wait_max_ms": round(1000 * self._wait_max, 1),
+                "timeouts": self._timeouts,
+                "retries": self._retries,
+                "gave_up": self._gave_up,
+            }
+
+
+def backoff(attempt, base=1.0, cap=20.0):
+    # Full jitter: sessions that failed together retry apart
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class CircuitOpen(Exception):
+    """The model API is failing; calls are refused until a probe succeeds."""
+
+
+class CircuitBreaker:
+    """Stop calling an upstream that keeps failing, for every session at once.
+
+    closed     calls go through; `threshold` consecutive failures open it
+    open       calls fail fast with CircuitOpen for `reset_timeout` seconds
+    half_open  up to `probes` trial calls go through; one success closes
+               the circuit, one failure opens it again
+    """
+
+    def __init__(self, threshold=5, reset_timeout=30, probes=1):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.probes = probes
+
+        self._lock = threading.Lock()
+        self._state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = 0
+
+        self._opened = 0
+        self._rejected = 0
+
+    def _advance(self, now):
+        if self._state == "open" and now - self._opened_at >= self.reset_timeout:
+            self._state = "half_open"
+            self._probing = 0
+
+    def available(self):
+        """False while calls would be refused; nothing is reserved."""
+        with self._lock:
+            self._advance(time.monotonic())
+            return self._state == "closed" or (
+                self._state == "half_open" and self._probing < self.probes
+            )
+
+    def before_call(self):
+        with self._lock:
+            now = time.monotonic()
+            self._advance(now)
+
+            if self._state == "closed":
+                return
+            if self._state == "half_open" and self._probing < self.probes:
+                self._probing += 1
+                return
+
+            self._rejected += 1
+            retry_in = max(0.0, self._opened_at + self.reset_timeout - now)
+            raise CircuitOpen(f"AI circuit open, next probe in {retry_in:.0f}s")
+
+    def cancel(self):
+        # The call never reached the upstream: free a probe slot, no verdict
+        with self._lock:
+            if self._state == "half_open" and self._probing:
+                self._probing -= 1
+
+    def after_call(self, failed):
+        with self._lock:
+            if self._state == "half_open":
+                self._probing = max(0, self._probing - 1)
+                if failed:
+                    self._trip()
+                else:
+                    self._state = "closed"
+                    self._failures = 0
+                return
+
+            if not failed:
+                self._failures = 0
+                return
+
+            self._failures += 1
+            if self._state == "closed" and self._failures >= self.threshold:
+                self._trip()
+
+    def _trip(self):
+        self._state = "open"
+        self._opened_at = time.monotonic()
+        self._opened += 1
+
+    def stats(self):
+        with self._lock:
+            now = time.monotonic()
+            self._advance(now)
+            return {
+                "state": self._state,
+                "open": int(self._state == "open"),
+                "consecutive_failures": self._failures,
+                "threshold": self.threshold,
+                "reset_timeout_s": self.reset_timeout,
+                "retry_in_s": round(max(0.0, self._opened_at + self.reset_timeout - now), 1)
+                if self._state == "open" else 0.0,
+                "times_opened": self._opened,
+                "rejected": self._rejected,
+            }
@@ -0,0 +1,169 @@
+import json
+import threading
+import time
+from collections import deque
+
+# In-process metrics for model calls: a tiny counter / histogram registry
+# with Prometheus text and JSON export, plus the last few calls verbatim.
+#
+# Every call is labelled with
+#   site     which flow asked (first_plan, week_n, regenerate, chat_patch, chat_edit, ...)
+#   source   model (a real call), cache (response cache) or shared
+#            (followed another session's identical in-flight call)
+#   outcome  ok, or what went wrong: the API status code (429, 503, ...),
+#            rate_limited, timeout, abandoned (the caller rejected the
+#            stream part-way), circuit_open (refused without calling) or
+#            error
+
+SECONDS_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 1500, 2000, 4000, 8000)
+
+
+def _labels(names, values):
+    return ",".join(f'{n}="{v}"' for n, v in zip(names, values))
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}   # label values -> float
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[n]) for n in self.labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        for key, value in sorted(self.values.items()):
+            yield self.name, key, (), value
+
+    def to_json(self):
+        return [{**dict(zip(self.labels, key)), "value": value}
+                for key, value in sorted(self.values.items())]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=SECONDS_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.values = {}   # label values -> [bucket counts..., sum, count]
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[n]) for n in self.labels)
+        row = self.values.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                row[i] += 1
+        row[-2] += value
+        row[-1] += 1
+
+    def samples(self):
+        for key, row in sorted(self.values.items()):
+            for bound, count in zip(self.buckets, row):
+                yield f"{self.name}_bucket", key, (("le", bound),), count
+            yield f"{self.name}_bucket", key, (("le", "+Inf"),), row[-1]
+            yield f"{self.name}_sum", key, (), row[-2]
+            yield f"{self.name}_count", key, (), row[-1]
+
+    def to_json(self):
+        out = []
+        for key, row in sorted(self.values.items()):
+            count = row[-1]
+            out.append({
+                **dict(zip(self.labels, key)),
+                "count": count,
+                "sum": round(row[-2], 4),
+                "avg": round(row[-2] / count, 4) if count else 0.0,
+                "buckets": dict(zip(map(str, self.buckets), row[:len(self.buckets)])),
+            })
+        return out
+
+
+class AIMetrics:
+    def __init__(self, recent=200):
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=recent)
+
+        labels = ("site", "source")
+        self.calls = Counter(
+            "ai_calls_total", "AI calls by call site, source and outcome",
+            ("site", "source", "outcome"))
+        self.seconds = Histogram(
+            "ai_call_seconds", "Wall time of an AI call", labels)
+        self.first_chunk = Histogram(
+            "ai_first_chunk_seconds", "Time to the first streamed chunk", labels)
+        self.prompt_tokens = Histogram(
+            "ai_prompt_tokens", "Prompt tokens per model call", ("site",), TOKEN_BUCKETS)
+        self.output_tokens = Histogram(
+            "ai_output_tokens", "Response tokens per model call", ("site",), TOKEN_BUCKETS)
+        self.finish = Counter(
+            "ai_finish_reason_total", "Model calls by finish reason", ("site", "reason"))
+        self._metrics = (self.calls, self.seconds, self.first_chunk,
+                         self.prompt_tokens, self.output_tokens, self.finish)
+
+    def record(self, site, source, seconds, outcome="ok", first_chunk=None,
+               prompt_tokens=None, output_tokens=None, finish_reason=None):
+        with self._lock:
+            self.calls.inc(site=site, source=source, outcome=outcome)
+            self.seconds.observe(seconds, site=site, source=source)
+            if first_chunk is not None:
+                self.first_chunk.observe(first_chunk, site=site, source=source)
+            if prompt_tokens is not None:
+                self.prompt_tokens.observe(prompt_tokens, site=site)
+            if output_tokens is not None:
+                self.output_tokens.observe(output_tokens, site=site)
+            if source == "model" and finish_reason is not None:
+                self.finish.inc(site=site, reason=finish_reason)
+
+            self._recent.append({
+                "at": round(time.time(), 3),
+                "site": site,
+                "source": source,
+                "outcome": outcome,
+                "seconds": round(seconds, 3),
+                "first_chunk": None if first_chunk is None else round(first_chunk, 3),
+                "prompt_tokens": prompt_tokens,
+                "output_tokens": output_tokens,
+                "finish_reason": finish_reason,
+            })
+
+    # ---------------- EXPORT ----------------
+
+    def to_prometheus(self, gauges=None):
+        """Prometheus text format; `gauges` adds {prefix: stats dict} snapshots."""
+        lines = []
+        with self._lock:
+            for metric in self._metrics:
+                lines.append(f"# HELP {metric.name} {metric.help}")
+                lines.append(f"# TYPE {metric.name} {metric.kind}")
+                for name, key, extra, value in metric.samples():
+                    labels = _labels(metric.labels, key)
+                    if extra:
+                        labels = ",".join(filter(None, [labels, _labels(*zip(*extra))]))
+                    lines.append(f"{name}{{{labels}}} {value}" if labels else f"{name} {value}")
+
+        for prefix, stats in (gauges or {}).items():
+            for key, value in stats.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                lines.append(f"# TYPE {prefix}_{key} gauge")
+                lines.append(f"{prefix}_{key} {value}")
+
+        return "\n".join(lines) + "\n"
+
+    def to_dict(self, gauges=None):
+        with self._lock:
+            data = {metric.name: metric.to_json() for metric in self._metrics}
+            data["recent_calls"] = list(reversed(self._recent))
+        data.update(gauges or {})
+        return data
+
+    def to_json(self, gauges=None):
+        return json.dumps(self.to_dict(gauges), indent=1, default=str)
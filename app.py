@@ -1,1089 +1,1220 @@
-import streamlit as st, random
-from auth import signup, login
-from auth import user_exists
-from database import get_connection
-from ai_api import query_ai
-from pdf_utils import create_pdf
-from database import get_plan_history
-from datetime import datetime, timedelta
-from database import get_user_profile, upsert_user_profile
-from database import get_user_progress
-import pandas as pd
-
-def is_valid_plan(text: str) -> bool:
-    if not text:
-        return False
-
-    t = text.lower()
-
-    # ❌ AI / system error phrases
-    blocked_phrases = [
-        "ai is busy",
-        "high usage",
-        "try again",
-        "please try again",
-        "currently unavailable",
-        "service unavailable",
-        "rate limit",
-        "too many requests",
-        "unable to generate",
-        "something went wrong",
-        "error"
-    ]
-
-    if any(p in t for p in blocked_phrases):
-        return False
-
-    # ✅ Must contain ALL 7 days
-    for i in range(1, 8):
-        if f"day {i}:" not in t:
-            return False
-
-    # ✅ Length safety (prevents cut-off)
-    if len(text) < 800:
-        return False
-
-    return True
-
-
-st.set_page_config(
-    page_title="FitAI",
-    page_icon="🏋️",
-    layout="wide",
-    initial_sidebar_state="expanded"  # 👈 IMPORTANT
-)
-
-
-st.markdown("""
-<style>
-.card {
-    background-color:#1E1E1E;
-    padding:16px;
-    border-radius:12px;
-    margin-bottom:16px;
-}
-</style>
-""", unsafe_allow_html=True)
-
-def logo(center=True):
-    st.markdown(
-        f"<h1 style='text-align:{'center' if center else 'left'};'>🏋️ FitAI</h1>",
-        unsafe_allow_html=True
-    )
-    st.caption("Smart Fitness • Smart Diet")
-
-QUOTES = [
-    "Consistency beats intensity 💪",
-    "Your body adapts when you listen 🧠",
-    "Small steps create big results 🔥",
-    "Progress, not perfection 🚀",
-    "Show up for yourself every day 🏃",
-    "Discipline builds freedom 🧩",
-    "Strong habits build strong bodies 🏋️",
-    "One workout at a time ⏱️",
-    "Fuel your body, power your goals 🍎",
-    "Your future self will thank you 🙌",
-    "Healthy choices add up 📈",
-    "Focus on effort, not excuses 🎯",
-    "Train your mind as much as your body 🧠",
-    "Every rep makes you better 🔁",
-    "Consistency is the real transformation 🔥",
-    "Start where you are, grow from there 🌱",
-    "Small wins matter every day 🏆",
-    "Health is your best investment 💚",
-    "Build strength, build confidence 💥",
-    "Trust the process, stay patient ⏳"
-]
-
-if "page" not in st.session_state:
-    st.session_state.page="welcome"
-if "user_id" not in st.session_state:
-    st.session_state.user_id=None
-if "show_history" not in st.session_state:
-    st.session_state.show_history = False
-if "show_progress" not in st.session_state:
-    st.session_state.show_progress = False
-if "username" not in st.session_state:
-    st.session_state.username = ""
-
-
-# -------- ACCESS GUARD (STEP 3) --------
-if st.session_state.page not in ("welcome", "auth", "thankyou") and not st.session_state.user_id:
-    st.session_state.page = "welcome"
-    st.rerun()
-if st.session_state.page == "dashboard":
-    pass  # dashboard content already rendered below
-
-# -------- THANK YOU --------
-if st.session_state.page=="thankyou":
-    logo()
-    st.markdown(f"### Thank you, {st.session_state.username} 🙏")
-    st.info(random.choice(QUOTES))
-    st.info("Thanks for using FitAI. Stay healthy 💙")
-    if st.button("🔁 Back to Welcome"):
-        st.session_state.clear()
-        st.session_state.page="welcome"
-        st.rerun()
-    st.stop()
-
-# -------- WELCOME --------
-if st.session_state.page=="welcome":
-    logo()
-    st.info(random.choice(QUOTES))
-    if st.button("🚀 Get Started", use_container_width=True):
-        st.session_state.page="auth"
-        st.rerun()
-    st.stop()
-
-# -------- AUTH --------
-if st.session_state.page == "auth" and not st.session_state.user_id:
-    logo()
-    t1, t2 = st.tabs(["Login", "Signup"])
-
-    # -------- LOGIN (FORM) --------
-    with t1:
-        with st.form("login_form", clear_on_submit=True):
-            u = st.text_input("Username", key="login_username")
-            p = st.text_input("Password", type="password", key="login_password")
-            submit = st.form_submit_button("Login")
-
-            if submit:
-                if not u or not p:
-                    st.warning("Please enter both username and password")
-                    st.stop()
-
-                r = login(u, p)
-                if r:
-                    st.session_state.user_id = r[0]
-                    st.session_state.username = u
-
-                    # detect last completed week
-                    conn = get_connection()
-                    cursor = conn.cursor()
-                    cursor.execute(
-                        "SELECT COALESCE(MAX(week), 0) FROM plans WHERE user_id=%s",
-                        (st.session_state.user_id,)
-                    )
-                    st.session_state.current_week = cursor.fetchone()[0]
-                    cursor.close()
-                    conn.close()
-                    
-                    st.session_state.page = (
-                        "week2" if st.session_state.current_week >= 1 else "dashboard"
-                    )
-                    st.rerun()
-                else:
-                    if not user_exists(u):
-                        st.warning("⚠️ User not found. Please sign up to continue.")
-                    else:
-                        st.error("❌ Invalid username or password.")
-
-    # -------- SIGNUP (NORMAL INPUTS) --------
-    with t2:
-        u=st.text_input("New Username",key="signup_username")
-        p=st.text_input("New Password", type="password",key="signup_password")
-        if st.button("Signup") and signup(u,p):
-            st.session_state.pop("signup_username", None)
-            st.session_state.pop("signup_password", None)
-
-            st.success("Signup successful. Please login.")
-    st.stop()
-
-
-STATE_CITY_MAP = {
-    "Andhra Pradesh": ["Visakhapatnam", "Vijayawada", "Guntur", "Nellore", "Kurnool", "Rajahmundry", "Tirupati", "Anantapur"],
-    "Arunachal Pradesh": ["Itanagar", "Naharlagun", "Pasighat", "Tawang"],
-    "Assam": ["Guwahati", "Silchar", "Dibrugarh", "Jorhat", "Tezpur", "Nagaon"],
-    "Bihar": ["Patna", "Gaya", "Bhagalpur", "Muzaffarpur", "Darbhanga", "Purnia"],
-    "Chhattisgarh": ["Raipur", "Bhilai", "Bilaspur", "Korba", "Durg"],
-    "Goa": ["Panaji", "Margao", "Vasco da Gama", "Mapusa"],
-    "Gujarat": ["Ahmedabad", "Surat", "Vadodara", "Rajkot", "Bhavnagar", "Junagadh", "Gandhinagar"],
-    "Haryana": ["Gurugram", "Faridabad", "Panipat", "Ambala", "Hisar", "Rohtak"],
-    "Himachal Pradesh": ["Shimla", "Solan", "Dharamshala", "Mandi", "Una"],
-    "Jharkhand": ["Ranchi", "Jamshedpur", "Dhanbad", "Bokaro", "Hazaribagh"],
-    "Karnataka": ["Bengaluru", "Mysuru", "Mangaluru", "Hubballi", "Belagavi", "Davangere", "Ballari"],
-    "Kerala": ["Thiruvananthapuram", "Kochi", "Kozhikode", "Thrissur", "Kollam", "Alappuzha", "Palakkad"],
-    "Madhya Pradesh": ["Bhopal", "Indore", "Jabalpur", "Gwalior", "Ujjain", "Sagar"],
-    "Maharashtra": ["Mumbai", "Pune", "Nagpur", "Nashik", "Aurangabad", "Solapur", "Kolhapur"],
-    "Manipur": ["Imphal", "Thoubal", "Bishnupur"],
-    "Meghalaya": ["Shillong", "Tura", "Nongpoh"],
-    "Mizoram": ["Aizawl", "Lunglei", "Champhai"],
-    "Nagaland": ["Kohima", "Dimapur", "Mokokchung"],
-    "Odisha": ["Bhubaneswar", "Cuttack", "Rourkela", "Sambalpur", "Balasore"],
-    "Punjab": ["Ludhiana", "Amritsar", "Jalandhar", "Patiala", "Bathinda", "Mohali"],
-    "Rajasthan": ["Jaipur", "Jodhpur", "Udaipur", "Kota", "Bikaner", "Ajmer"],
-    "Sikkim": ["Gangtok", "Namchi", "Gyalshing"],
-    "Tamil Nadu": ["Chennai", "Coimbatore", "Madurai", "Trichy", "Salem", "Tirunelveli", "Erode", "Vellore", "Thoothukudi", "Thanjavur"],
-    "Telangana": ["Hyderabad", "Warangal", "Karimnagar", "Nizamabad", "Khammam"],
-    "Tripura": ["Agartala", "Udaipur", "Dharmanagar"],
-    "Uttar Pradesh": ["Lucknow", "Kanpur", "Varanasi", "Prayagraj", "Noida", "Ghaziabad", "Meerut", "Agra"],
-    "Uttarakhand": ["Dehradun", "Haridwar", "Roorkee", "Haldwani", "Nainital"],
-    "West Bengal": ["Kolkata", "Howrah", "Durgapur", "Asansol", "Siliguri"],
-    "Delhi": ["New Delhi", "Dwarka", "Rohini", "Saket"],
-    "Jammu and Kashmir": ["Srinagar", "Jammu", "Anantnag"],
-    "Ladakh": ["Leh", "Kargil"],
-    "Chandigarh": ["Chandigarh"],
-    "Puducherry": ["Puducherry", "Karaikal"],
-    "Andaman and Nicobar Islands": ["Port Blair"],
-    "Dadra and Nagar Haveli and Daman and Diu": ["Daman", "Silvassa"],
-    "Lakshadweep": ["Kavaratti"]
-}
-
-profile = get_user_profile(st.session_state.user_id)
-
-if profile:
-    (
-        age_db, height_db, weight_db,
-        state_db, city_db, goal_db,
-        diet_db, workout_place_db, budget_db
-    ) = profile
-else:
-    age_db = height_db = weight_db = None
-    state_db = city_db = goal_db = diet_db = workout_place_db = None
-    budget_db = None
-
-conn = get_connection()
-cursor = conn.cursor()
-cursor.execute("SELECT COUNT(*) FROM plans WHERE user_id=%s",(st.session_state.user_id,))
-plan_count=cursor.fetchone()[0]
-cursor.close()
-conn.close()
-
-# -------- SIDEBAR --------
-st.sidebar.title("Profile")
-st.sidebar.info("👈 Please fill all details before generating your plan")
-age=st.sidebar.number_input("Age",16,40,value=int(age_db) if age_db is not None else 18,step=1)
-height=st.sidebar.number_input("Height (cm)",130.0,220.0, value=float(height_db) if height_db is not None else 165.0,step=0.1)
-weight=st.sidebar.number_input("Weight (kg)",30.0,200.0, value=float(weight_db) if weight_db is not None else 60.0,step=0.1)
-st.sidebar.markdown("### State")
-
-state = st.sidebar.selectbox(
-    "Select your state",
-    list(STATE_CITY_MAP.keys()),
-    index=list(STATE_CITY_MAP.keys()).index(state_db)
-    if state_db in STATE_CITY_MAP else 0
-)
-st.sidebar.markdown("### City")
-
-cities_for_state = STATE_CITY_MAP.get(state, [])
-
-city_suggestion = st.sidebar.selectbox(
-    "Select city (optional)",
-    [""] + cities_for_state,
-    index=(cities_for_state.index(city_db) + 1)
-    if city_db in cities_for_state else 0
-)
-
-city = st.sidebar.text_input(
-    "Type your city",
-    value=city_db or city_suggestion
-)
-
-goal=st.sidebar.selectbox("Goal",["Fat Loss","Muscle Gain","Maintenance"],
-    index=["Fat Loss","Muscle Gain","Maintenance"].index(goal_db)
-    if goal_db else 0)
-diet=st.sidebar.selectbox("Diet",["Vegetarian","Eggetarian","Non-Vegetarian"],
-    index=["Vegetarian","Eggetarian","Non-Vegetarian"].index(diet_db)
-    if diet_db else 0)
-budget=st.sidebar.slider("Budget ₹",100,1000,
-    value=budget_db or 500)
-workout_place=st.sidebar.radio("Workout Place",["Home","Gym"],
-    index=0 if workout_place_db=="Home"
-    else 1 if workout_place_db=="Gym"
-    else 0)
-
-if st.sidebar.button("Logout"):
-    st.session_state.show_progress = False
-    st.session_state.show_history = False
-
-    name=st.session_state.username
-    st.session_state.clear()
-    st.session_state.page="thankyou"
-    st.session_state.username=name
-    st.rerun()
-
-# -------- TOP BAR --------
-top_left, top_right = st.columns([6, 2])
-
-with top_left:
-    logo(False)
-
-with top_right:
-    st.markdown(
-        f"""
-        <div style="text-align:right;">
-            👤 <b>{st.session_state.username}</b>
-        </div>
-        """,
-        unsafe_allow_html=True
-    )
-
-        # 📜 Plan History (guard)
-    if plan_count == 0:
-        st.button("📜 Plan History", use_container_width=True, disabled=True)
-    else:
-        if st.button("📜 Plan History", use_container_width=True):
-            st.session_state.show_history = True
-            st.session_state.page = "dashboard"
-            st.rerun()
-
-    if plan_count == 0:
-        st.button("📈 Progress Trends", use_container_width=True, disabled=True)
-    else:
-        if st.button("📈 Progress Trends", use_container_width=True):
-            st.session_state.show_progress = True
-            st.session_state.page = "dashboard"   # ✅ ADD THIS
-            st.rerun()
-
-    if st.button("🚪 Logout", use_container_width=True):
-        st.session_state.show_progress = False
-        st.session_state.show_history = False
-
-        name = st.session_state.username
-        st.session_state.clear()
-        st.session_state.page = "thankyou"
-        st.session_state.username = name
-        st.rerun()
-
-if st.session_state.page == "week2":
-    st.session_state.show_history = False
-    st.session_state.show_progress = False
-
-
-# -------- WEEK 2 / NEXT PLAN PAGE --------
-if st.session_state.page == "week2":
-    # ---- Detect current week number ----
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-    "SELECT COALESCE(MAX(week), 0) FROM plans WHERE user_id=%s",
-    (st.session_state.user_id,)
-)
-    current_week = cursor.fetchone()[0] + 1
-    cursor.close()
-    conn.close()
-
-    logo()
-    st.subheader(f"🔄 Week {current_week} – Update Your Progress")
-
-    new_weight = st.number_input(
-        "Current weight (kg)",
-        min_value=30.0,
-        max_value=200.0,
-        step=0.1
-    )
-
-    difficulty = st.selectbox(
-        "How was last week's plan?",
-        ["Too Easy", "Just Right", "Too Hard"]
-    )
-
-    notes = st.text_area(
-        "Any issues? (pain, schedule, food problems)",
-        placeholder="Optional"
-    )
-
-    if st.button(f"Generate Week {current_week} Plan"):
-        # Save progress
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO progress(user_id, week, weight, difficulty) VALUES (%s,%s,%s,%s)",
-            (st.session_state.user_id, current_week, new_weight, difficulty)
-        )
-        conn.commit()
-        cursor.close()
-        conn.close()
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-    UPDATE user_profile
-    SET weight = %s
-    WHERE user_id = %s
-""", (new_weight, st.session_state.user_id))
-        conn.commit()
-        cursor.close()
-        conn.close()
-
-        profile = get_user_profile(st.session_state.user_id)
-        if profile:
-            (
-            age_db, height_db, weight_db,
-            state_db, city_db, goal_db,
-            diet_db, workout_place_db, budget_db
-        ) = profile
-        conn = get_connection()
-        cursor = conn.cursor()
-        # Fetch previous plan
-        cursor.execute(
-            "SELECT plan FROM plans WHERE user_id=%s ORDER BY timestamp DESC LIMIT 1",
-            (st.session_state.user_id,)
-        )
-        prev_plan = cursor.fetchone()[0]
-        cursor.close()
-        conn.close()
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-SELECT value FROM preferences
-WHERE user_id=%s AND key='user_preferences'
-""", (st.session_state.user_id,))
-
-        row = cursor.fetchone()
-        preferences = row[0] if row else ""
-        cursor.close()
-        conn.close()
-
-        if not city or not state:
-            st.error("Please select your state and city.")
-            st.stop()
-        with st.spinner(f"🤖 Adapting your plan for Week {current_week}..."):
-            adapted = query_ai(f"""
-ROLE:
-You are a Certified Indian Fitness Coach & Nutritionist.
-
-TASK:
-Generate a COMPLETELY NEW and COMPLETE 7-day workout + diet plan for WEEK {current_week}.
-
-THIS IS A STRICT RE-GENERATION TASK.
-The previous plan is provided ONLY for reference to AVOID repetition.
-
-━━━━━━━━━━━━━━━━━━
-USER CONTEXT:
-- Previous week plan: PROVIDED BELOW
-- User feedback: {difficulty}
-- Current weight: {new_weight} kg
-- User notes / issues: {notes}
-- Goal: {goal}
-- Diet type: {diet}
-- Weekly budget: ₹{budget}
-- Location: {city}, {state}
-- Workout place: {workout_place}
-- User preferences (fixed from Week 1): {preferences}
-━━━━━━━━━━━━━━━━━━
-
-━━━━━━━━━━━━━━━━━━
-ABSOLUTE RULES (NON-NEGOTIABLE):
-1. You MUST return a COMPLETE plan (Day 1 to Day 7).
-2. Workout AND diet must be present for ALL 7 days.
-3. Do NOT stop early.
-4. Do NOT summarize.
-5. Do NOT explain.
-6. Do NOT reuse or slightly modify previous content.
-7. Output ONLY the final plan.
-━━━━━━━━━━━━━━━━━━
-
-━━━━━━━━━━━━━━━━━━
-WORKOUT EVOLUTION RULES (VERY IMPORTANT):
-- DO NOT repeat exercises from the previous week.
-- DO NOT reuse the same exercise with higher reps/sets.
-- ALL major exercises must be DIFFERENT from last week.
-- You MAY keep the same muscle split, but exercises must change.
-- Introduce NEW movement patterns (tempo, unilateral, stability, isometric, compound variations).
-- At least 2–3 completely NEW exercises per day.
-- If feedback was:
-  • "Too Easy" → increase difficulty using harder variations
-  • "Just Right" → moderate progression with new exercises
-  • "Too Hard" → reduce load but STILL change exercises
-- Maintain safety and recovery.
-━━━━━━━━━━━━━━━━━━
-
-━━━━━━━━━━━━━━━━━━
-DIET VARIATION RULES (VERY IMPORTANT):
-- DO NOT repeat the same meals from last week.
-- DO NOT reuse identical breakfast/lunch/dinner items.
-- Rotate protein sources, grains, vegetables.
-- Change meals on AT LEAST 5 out of 7 days.
-- Calories should remain goal-appropriate.
-- Use foods commonly available in {city}, {state}.
-- Respect diet type strictly ({diet}).
-━━━━━━━━━━━━━━━━━━
-
-━━━━━━━━━━━━━━━━━━
-PREFERENCE RULES:
-- Respect all user preferences strictly.
-- If a preference conflicts with safety, replace with the closest safe alternative.
-━━━━━━━━━━━━━━━━━━
-
-━━━━━━━━━━━━━━━━━━
-FORMAT (BULLET POINTS ONLY — FOLLOW EXACTLY):
-
-- Title: Week {current_week} Fitness Plan
-
-- 7-Day Workout Plan
-  - Day 1:
-    - Exercise: sets × reps
-  - Day 2:
-    - Exercise: sets × reps
-  - Day 3:
-    - Exercise: sets × reps
-  - Day 4:
-    - Exercise: sets × reps
-  - Day 5:
-    - Exercise: sets × reps
-  - Day 6:
-    - Exercise: sets × reps
-  - Day 7:
-    - Active recovery / rest
-
-- 7-Day Diet Plan
-  - Day 1:
-    - Breakfast:
-    - Lunch:
-    - Dinner:
-  - Day 2:
-    - Breakfast:
-    - Lunch:
-    - Dinner:
-  - Day 3:
-    - Breakfast:
-    - Lunch:
-    - Dinner:
-  - Day 4:
-    - Breakfast:
-    - Lunch:
-    - Dinner:
-  - Day 5:
-    - Breakfast:
-    - Lunch:
-    - Dinner:
-  - Day 6:
-    - Breakfast:
-    - Lunch:
-    - Dinner:
-  - Day 7:
-    - Breakfast:
-    - Lunch:
-    - Dinner:
-
-- Hydration:
-  - Drink 2.5–3 liters of water daily
-
-━━━━━━━━━━━━━━━━━━
-PREVIOUS WEEK PLAN (REFERENCE ONLY — DO NOT COPY):
-{prev_plan}
-
-FINAL CHECK BEFORE RESPONDING:
-- Did you change ALL major exercises? YES / NO
-- Are ALL 7 days present? YES / NO
-- Is diet different from last week? YES / NO
-
-ONLY RESPOND IF ALL ANSWERS ARE YES.
-
-""")
-        
-        required_days=[f"Day {i}"for i in range(1,8)]
-        if not adapted or adapted.strip().startswith("⚠️"):
-            st.error("❌ Failed to generate next week plan. Please try again.")
-            st.stop()
-
-        # ⚠️ Incomplete plan → regenerate ONCE
-        if not all(day in adapted for day in required_days):
-            st.warning("⚠️ Incomplete plan detected. Regenerating...")
-            adapted = query_ai(f"""
-You are a certified fitness coach.
-
-CRITICAL (NON-NEGOTIABLE):
-- Return a COMPLETE 7-day plan
-- MUST include Day 1 through Day 7
-- Workout + Diet for all days
-- Do NOT summarize
-- Do NOT stop early
-- Do NOT explain
-
-FORMAT:
-                              
-7-Day Workout Plan
-Day 1:
-...
-Day 7:
-
-                               
-7-Day Diet Plan
-Day 1:
-- Breakfast:
-- Lunch:
-- Dinner:
-...
-Day 7:
-- Breakfast:
-- Lunch:
-- Dinner:
-                               
-""")
-
-
-        # ❌ Still broken → do NOT save
-        if not all(day in adapted for day in required_days):
-            st.error("❌ Plan generation failed. Please try again.")
-            st.stop()
-
-        
-        # ✅ PART 5 — UPDATE USER PROFILE WITH LATEST VALUES
-        upsert_user_profile(
-    st.session_state.user_id,
-    age, height, weight,
-    state, city,
-    goal, diet,
-    workout_place,
-    budget
-)
-        st.session_state.profile_updated = True
-        # 🔄 Refresh profile data after saving
-        profile = get_user_profile(st.session_state.user_id)
-        if profile:
-            (
-            age_db, height_db, weight_db,
-            state_db, city_db, goal_db,
-            diet_db, workout_place_db, budget_db
-            ) = profile
-        # ✅ ISSUE 5 — insert or replace SAME week
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-    INSERT INTO plans (user_id, week, plan)
-    VALUES (%s, %s, %s)
-    ON CONFLICT(user_id, week)
-    DO UPDATE SET
-        plan = excluded.plan,
-        timestamp = CURRENT_TIMESTAMP
-""", (
-    st.session_state.user_id,
-    current_week,
-    adapted
-))
-        conn.commit()
-        cursor.close()
-        conn.close()
-
-        st.session_state.plan = adapted
-        st.session_state.current_week = current_week
-        st.session_state.page = "dashboard"
-        st.session_state.show_progress = False
-
-        st.success(f"✅ Your Week {current_week} plan is ready!")
-        st.rerun()
-
-    if st.button("⬅️ Back"):
-        st.session_state.page = "dashboard"
-        st.rerun()
-
-    if not (st.session_state.show_history or st.session_state.show_progress):
-        st.stop()
-
-
-# -------- DASHBOARD --------
-st.markdown("<div class='card'>", unsafe_allow_html=True)
-c1,c2,c3 = st.columns(3)
-c1.metric("🤖 AI Confidence","High")
-c2.metric("🎯 Goal", goal)
-c3.metric("🏋️ Workout", workout_place)
-st.markdown("</div>", unsafe_allow_html=True)
-
-st.info(random.choice(QUOTES))
-
-if st.session_state.get("show_progress"):
-
-    # 🚨 NEW USER SAFETY CHECK (ADD HERE)
-    if plan_count == 0:
-        st.info("📈 You need to generate your first 7-day plan to see progress.")
-
-        col1, col2 = st.columns(2)
-
-        with col1:
-            if st.button("⬅️ Back to Dashboard"):
-                st.session_state.show_progress = False
-                st.session_state.page = "dashboard"
-                st.rerun()
-
-        with col2:
-            
-            if st.button("🚀 Generate First Plan"):
-                st.session_state.show_progress = False
-                st.session_state.page = "dashboard"
-                st.rerun()
-
-        st.stop()   # ⛔ VERY IMPORTANT
-
-    st.subheader("📈 Your Progress Trends")
-
-    progress = get_user_progress(st.session_state.user_id)
-    
-    if len(progress) == 0:
-        st.info("📈 Track your weight after Week 2 to see progress trends.")
-        st.stop()
-
-    if not progress:
-        st.info("📈 Progress trends will appear after generating your next week plan.")
-    else:
-        dates = []
-        weights = []
-        # ✅ Week 1 baseline from user profile
-        if weight_db is not None:
-            dates.append("Week 1")
-            weights.append(weight_db)
-        
-        # Week-based progress (NO ENUMERATE)
-        for week,weight,_,ts in progress:
-            dates.append(f"Week {week}")
-            weights.append(weight)
-
-        df_weight = pd.DataFrame({
-        "Date": dates,
-        "Weight (kg)": weights
-})
-
-        st.line_chart(df_weight, x="Date", y="Weight (kg)")
-    
-    if st.button("❌ Close Progress"):
-        st.session_state.show_progress = False
-        st.rerun()
-
-
-    if st.button("➡️ Generate Next Week Plan", key="from_progress_trends"):
-        st.session_state.show_progress = False
-        st.session_state.show_history = False
-        st.session_state.page = "week2"
-        st.rerun()
-
-# -------- HISTORY --------
-
-if st.session_state.get("show_history"):
-    st.subheader("📜 Your Plan History")
-
-    history = get_plan_history(st.session_state.user_id)
-
-    if not history:
-        st.info("No plans generated yet.")
-    else:
-        total = len(history)
-        for _,week, plan, ts in history:
-            ist_time = ts + timedelta(hours=5, minutes=30)
-            with st.expander(f"🗓️ Week {week} — {ist_time.strftime('%d %b %Y, %I:%M %p')}"):
-                st.markdown(plan)
-
-
-    if st.button("❌ Close History"):
-        st.session_state.show_history = False
-        st.rerun()
-    
-    if st.button("➡️ Generate Next Week Plan", key="from_history"):
-        st.session_state.show_progress = False
-        st.session_state.show_history = False
-        st.session_state.page = "week2"
-        st.rerun()
-
-# -------- PLAN --------
-if "plan" not in st.session_state and plan_count == 0:
-    st.markdown("### 🧠 Personal Preferences (Optional)")
-
-    preferences = st.text_area(
-    "Any food, workout, or lifestyle preferences?",
-    placeholder="""
-Examples:
-- I hate burpees
-- Prefer South Indian breakfast
-- Knee pain – avoid jumping
-- Short workouts (30–40 mins)
-- Like yoga once a week
-""",
-    height=120
-)
-    if preferences and len(preferences) > 300:
-        st.warning("Please keep preferences short and clear (1–3 lines).")
-        st.stop()
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-INSERT INTO preferences (user_id, key, value)
-VALUES (%s, 'user_preferences', %s)
-ON CONFLICT (user_id, key)
-DO UPDATE SET
-    value = EXCLUDED.value
-""", (st.session_state.user_id, preferences))
-    conn.commit()
-    cursor.close()
-    conn.close()
-
-    if st.button("Generate 7-Day Plan"):
-        with st.spinner("🤖 Generating plan..."):
-            prompt = f"""
-ROLE: Certified Indian fitness coach and nutritionist.
-
-CRITICAL INSTRUCTIONS:
-- Generate a COMPLETE 7-day workout plan AND 7-day diet plan
-- Diet MUST use foods commonly eaten in {city}, {state}
-- Prefer local, seasonal, and culturally common foods of {city}
-- If a food is expensive or unavailable in {city}, suggest a cheaper local alternative
-- Budget limit: ₹{budget} per week
-- Diet preference: {diet}
-- User Preferences: {preferences if preferences else "No specific preferences provided"}
-- Student-friendly, hostel/home suitable
-- No supplements
-
-PREFERENCE RULE (NON-NEGOTIABLE):
-- Respect user preferences strictly
-- If a preference conflicts with safety, choose a safer alternative
-
-CRITICAL WORKOUT PLACE RULE (NON-NEGOTIABLE):
-- Workout place selected: {workout_place}
-
-IF workout place is "Gym":
-- Use ONLY gym-based exercises
-- MUST include gym equipment such as:
-  - Barbell
-  - Dumbbells
-  - Machines (leg press, lat pulldown, chest press)
-- DO NOT include:
-  - Brisk walking
-  - Jogging
-  - Yoga
-  - Bodyweight-only workouts
-  - Home cardio (jumping jacks, skipping)
-
-IF workout place is "Home":
-- Use ONLY bodyweight or minimal equipment exercises
-- DO NOT include gym machines or barbells
-
-FORMAT (USE BULLET POINTS):
-- Title
-- 7-Day Workout Plan (Day 1 to Day 7)
-- 7-Day Diet Plan (Day 1 to Day 7)
-  - Breakfast
-  - Lunch
-  - Dinner
-- Hydration note
-
-STRICT RULES:
-- NO explanations
-- NO reviews
-- NO suggestions outside the plan
-- Do NOT skip Day 7 
-- Output ONLY the plan
-"""
-            if not state or not city:
-                st.error("Please select your fill all the details in the sidebar before generating the plan.")
-                st.stop()
-
-            raw=query_ai(prompt)
-
-            validated = query_ai(f"""
-You are a fitness plan generator.
-
-CRITICAL RULES (NON-NEGOTIABLE):
-- BOTH workout AND diet MUST include Day 1 through Day 7
-- Do NOT skip Day 7 under any circumstance
-- If any day is missing, regenerate the FULL plan
-
-STRICT OUTPUT RULES:
-- Output ONLY the final corrected plan
-- Do NOT include reviews, explanations, or suggestions
-- Do NOT praise the plan
-- Do NOT explain changes
-- Do NOT add commentary
-- Do NOT mention what was fixed
-
-FORMAT REQUIRED (USE BULLET POINTS EXACTLY LIKE THIS):
-
-- Title
-
-- 7-Day Workout Plan
-  - Day 1:
-    - Exercise: sets × reps
-    - Exercise: sets × reps
-  - Day 2:
-    - Exercise: sets × reps
-  - Day 3:
-    - Exercise: sets × reps
-  - Day 4:
-    - Exercise: sets × reps
-  - Day 5:
-    - Exercise: sets × reps
-  - Day 6:
-    - Exercise: sets × reps
-  - Day 7:
-    - Rest / Light activity
-
-- 7-Day Diet Plan
-  - Day 1:
-    - Breakfast: ...
-    - Lunch: ...
-    - Dinner: ...
-  - Day 2:
-    - Breakfast: ...
-    - Lunch: ...
-    - Dinner: ...
-  - Day 3:
-    - Breakfast: ...
-    - Lunch: ...
-    - Dinner: ...
-  - Day 4:
-    - Breakfast: ...
-    - Lunch: ...
-    - Dinner: ...
-  - Day 5:
-    - Breakfast: ...
-    - Lunch: ...
-    - Dinner: ...
-  - Day 6:
-    - Breakfast: ...
-    - Lunch: ...
-    - Dinner: ...
-  - Day 7:
-    - Breakfast: ...
-    - Lunch: ...
-    - Dinner: ...
-
-- Hydration:
-  - Drink 2.5–3 liters of water daily
-
-PLAN TO FIX:
-{raw}
-""")
-            # ✅ PART 5 — SAVE / UPDATE USER PROFILE
-            upsert_user_profile(
-    st.session_state.user_id,
-    age, height, weight,
-    state, city,
-    goal, diet,
-    workout_place,
-    budget
-)
-            # 🔄 Refresh profile data after saving
-            profile = get_user_profile(st.session_state.user_id)
-            if profile:
-                (
-                age_db, height_db, weight_db,
-                state_db, city_db, goal_db,
-                diet_db, workout_place_db, budget_db
-                ) = profile
-
-            st.session_state.plan=validated
-            conn = get_connection()
-            cursor = conn.cursor()
-            cursor.execute(
-    """INSERT INTO plans(user_id, week, plan) VALUES (%s, %s, %s)  ON CONFLICT(user_id, week)
-    DO UPDATE SET
-        plan = excluded.plan,
-        timestamp = CURRENT_TIMESTAMP""" ,
-    (st.session_state.user_id, 1, validated)
-)
-            conn.commit()
-            cursor.close()
-            conn.close()
-
-            st.session_state.current_week = 1
-
-
-if "plan" in st.session_state:
-    st.markdown("<div class='card'>", unsafe_allow_html=True)
-    st.markdown(st.session_state.plan)
-    st.markdown("</div>", unsafe_allow_html=True)
-
-# -------- CHAT --------
-if "plan" in st.session_state:
-    st.info(
-    "💡 Pro Tip: Ask for small changes like:\n"
-    "- Modify Day 3 workout\n"
-    "- Change only diet\n"
-    "- Replace dinner options\n\n"
-    "This helps avoid incomplete updates."
-)
-
-    msg=st.chat_input("Modify plan / ask alternatives")
-    if msg:
-        with st.spinner("🤖 Updating plan..."):
-            updated = query_ai(f"""
-You are updating an existing fitness plan.
-
-IMPORTANT CONTEXT (DO NOT IGNORE):
-- User location: {city}, {state}
-- Diet preference: {diet}
-- Weekly budget: ₹{budget}
-- Use foods commonly eaten and easily available in {city}
-- If a food is expensive or uncommon in {city}, replace it with a cheaper local alternative
-CRITICAL RULES (NON-NEGOTIABLE):
-- You MUST return the COMPLETE plan
-- Workout AND diet must include Day 1 through Day 7
-- Do NOT return partial plans
-- Do NOT stop mid-output
-- Do NOT summarize
-- Do NOT omit unchanged days
-- If content is long, CONTINUE until the full plan is complete
-
-FORMAT (USE BULLET POINTS):
-- Title
-- 7-Day Workout Plan (Day 1 to Day 7)
-- 7-Day Diet Plan (Day 1 to Day 7)
-- Hydration note
-
-CURRENT PLAN:
-{st.session_state.plan}
-
-USER REQUEST:
-{msg}
-
-OUTPUT:
-Return the FULL UPDATED PLAN ONLY.
-No explanations.
-""")
-        # ✅ SAFETY CHECK 1 — must contain all 7 days
-        required_days = [f"Day {i}:" for i in range(1, 8)]
-
-        if not updated:
-            st.error("❌ AI returned empty response. Plan not updated.")
-            st.stop()
-
-        if not all(day in updated for day in required_days):
-            st.warning("⚠️ Incomplete plan detected. Regenerating full plan...")
-
-            updated = query_ai(f"""
-Regenerate the FULL 7-day fitness plan.
-
-CRITICAL RULES:
-- Workout AND diet MUST include Day 1 through Day 7
-- Do NOT omit any day
-- Do NOT summarize
-- Do NOT explain
-- Return the COMPLETE plan only
-
-CURRENT PLAN:
-{st.session_state.plan}
-""")
-
-    # 🔐 Final validation after regeneration
-            if not updated or not all(day in updated for day in required_days):
-                st.error("❌ Failed to regenerate a complete plan. Existing plan kept safe.")
-                st.warning("AI is busy now.Please try again later.")
-                st.stop()
-
-
-        # ✅ SAFETY CHECK 2 — prevent shorter/partial overwrite
-        if len(updated) < len(st.session_state.plan) * 0.7:
-            st.error("⚠️ Response looks incomplete. Existing plan kept safe.")
-            st.stop()
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-    UPDATE plans
-    SET plan = %s, timestamp = CURRENT_TIMESTAMP
-    WHERE user_id = %s AND week = %s
-""", (
-    updated,
-    st.session_state.user_id,
-    st.session_state.current_week
-))
-        conn.commit()
-        cursor.close()
-        conn.close()
-        st.session_state.plan=updated
-        st.success("✅ Plan updated successfully")
-        st.rerun()
-
-# -------- DOWNLOAD --------
-if "plan" in st.session_state:
-    file=create_pdf(st.session_state.plan)
-    with open(file,"rb") as f:
-        st.download_button("Download PDF", f, "FitnessPlan.pdf")
-
-
+import streamlit as st, random
+from concurrent.futures import ThreadPoolExecutor
+import async_db
+from async_db import gather
+from auth import signup, login
+from auth import user_exists
+from database import save_plan, update_plan, save_preferences
+from database import list_plan_versions, get_plan_version, rollback_plan
+from ai_api import stream_ai, query_ai, json_config, invalidate_ai_cache, ai_available, ai_configured
+from plan_check import PlanStreamCheck
+from plan_parts import assemble_plan
+from plan_schema import PLAN_SCHEMA, PlanSchemaError, parse_plan_json, render_plan
+from plan_model import parse_plan
+from plan_patch import PATCH_SCHEMA, PatchError, RewriteNeeded, parse_patch, apply_patch
+from plan_summary import summarize_plans
+from jobs import get_jobs, JobFailed, DONE
+from config import get_setting
+from pdf_utils import create_pdf
+from history_view import render_plan_history
+from profile_options import STATE_CITY_MAP, GOALS, DIETS, WORKOUT_PLACES, DIFFICULTIES
+from datetime import timedelta
+from database import get_plan_index, get_plan_model
+from database import get_user_progress, load_user_state
+import pandas as pd
+
+def is_valid_plan(text: str) -> bool:
+    if not text:
+        return False
+
+    t = text.lower()
+
+    # ❌ AI / system error phrases
+    blocked_phrases = [
+        "ai is busy",
+        "high usage",
+        "try again",
+        "please try again",
+        "currently unavailable",
+        "service unavailable",
+        "rate limit",
+        "too many requests",
+        "unable to generate",
+        "something went wrong",
+        "error"
+    ]
+
+    if any(p in t for p in blocked_phrases):
+        return False
+
+    # ✅ Must contain ALL 7 days
+    if not parse_plan(text).complete:
+        return False
+
+    # ✅ Length safety (prevents cut-off)
+    if len(text) < 800:
+        return False
+
+    return True
+
+
+def generate_plans(prompts, sections=2, cache=True, sites="other", on_text=None):
+    """Generate one or more plans (or plan halves) at once.
+
+    Each prompt is consumed in its own thread and checked as it arrives;
+    on_text(i, text_so_far) sees every prompt's progress. `sites` names
+    the calling flow (one per prompt, or one for all) in the AI metrics.
+    Returns [(text, problem), ...] in prompt order; problem is None for a
+    complete plan, the "⚠️" message on an AI error, or why the stream was
+    cut short. Runs on a job worker, so nothing here touches Streamlit.
+    """
+    if isinstance(sites, str):
+        sites = [sites] * len(prompts)
+    texts = [""] * len(prompts)
+
+    def produce(i, prompt):
+        check = PlanStreamCheck(sections=sections)
+        chunks = stream_ai(prompt, cache=cache, site=sites[i])
+        try:
+            for chunk in chunks:
+                if chunk.startswith("⚠️"):
+                    return chunk
+                texts[i] += chunk
+                if on_text:
+                    on_text(i, texts[i])
+                problem = check.feed(chunk)
+                if problem:
+                    return problem
+            return check.finish()
+        finally:
+            # Stop paying for tokens we are going to throw away
+            chunks.close()
+
+    if len(prompts) == 1:
+        problems = [produce(0, prompts[0])]
+    else:
+        with ThreadPoolExecutor(max_workers=len(prompts)) as pool:
+            problems = list(pool.map(produce, range(len(prompts)), prompts))
+
+    results = []
+    for prompt, text, problem in zip(prompts, texts, problems):
+        if problem and not problem.startswith("⚠️"):
+            invalidate_ai_cache(prompt)
+        results.append((text, problem))
+    return results
+
+
+def generate_plan(prompt, job, cache=True, site="other"):
+    # One prompt, streamed into the job's live preview
+    return generate_plans([prompt], cache=cache, sites=site,
+                          on_text=lambda _, text: job.update(text=text))[0]
+
+
+def read_plan_json(answer):
+    # (plan, None) for a complete structured plan, else (None, why not)
+    if answer.startswith("⚠️"):
+        return None, answer
+    try:
+        return parse_plan_json(answer), None
+    except PlanSchemaError as e:
+        return None, str(e)
+
+
+def serve_degraded(message, plan=None):
+    # The AI circuit is open: answer right away with the last stored plan
+    # instead of queueing the user behind calls that are going to fail
+    st.warning(message)
+    if plan:
+        st.markdown("### 📋 Your latest saved plan")
+        st.markdown(plan)
+    st.stop()
+
+
+st.set_page_config(
+    page_title="FitAI",
+    page_icon="🏋️",
+    layout="wide",
+    initial_sidebar_state="expanded"  # 👈 IMPORTANT
+)
+
+# Checked here on the script thread; plan jobs run on workers, where a
+# missing key could only show up as a generic job failure
+if not ai_configured():
+    st.error("❌ AI configuration missing. Please contact administrator.")
+    st.stop()
+
+
+st.markdown("""
+<style>
+.card {
+    background-color:#1E1E1E;
+    padding:16px;
+    border-radius:12px;
+    margin-bottom:16px;
+}
+</style>
+""", unsafe_allow_html=True)
+
+def logo(center=True):
+    st.markdown(
+        f"<h1 style='text-align:{'center' if center else 'left'};'>🏋️ FitAI</h1>",
+        unsafe_allow_html=True
+    )
+    st.caption("Smart Fitness • Smart Diet")
+
+QUOTES = [
+    "Consistency beats intensity 💪",
+    "Your body adapts when you listen 🧠",
+    "Small steps create big results 🔥",
+    "Progress, not perfection 🚀",
+    "Show up for yourself every day 🏃",
+    "Discipline builds freedom 🧩",
+    "Strong habits build strong bodies 🏋️",
+    "One workout at a time ⏱️",
+    "Fuel your body, power your goals 🍎",
+    "Your future self will thank you 🙌",
+    "Healthy choices add up 📈",
+    "Focus on effort, not excuses 🎯",
+    "Train your mind as much as your body 🧠",
+    "Every rep makes you better 🔁",
+    "Consistency is the real transformation 🔥",
+    "Start where you are, grow from there 🌱",
+    "Small wins matter every day 🏆",
+    "Health is your best investment 💚",
+    "Build strength, build confidence 💥",
+    "Trust the process, stay patient ⏳"
+]
+
+if "page" not in st.session_state:
+    st.session_state.page="welcome"
+if "user_id" not in st.session_state:
+    st.session_state.user_id=None
+if "show_history" not in st.session_state:
+    st.session_state.show_history = False
+if "show_progress" not in st.session_state:
+    st.session_state.show_progress = False
+if "username" not in st.session_state:
+    st.session_state.username = ""
+
+
+# -------- ACCESS GUARD (STEP 3) --------
+if st.session_state.page not in ("welcome", "auth", "thankyou") and not st.session_state.user_id:
+    st.session_state.page = "welcome"
+    st.rerun()
+if st.session_state.page == "dashboard":
+    pass  # dashboard content already rendered below
+
+# -------- THANK YOU --------
+if st.session_state.page=="thankyou":
+    logo()
+    st.markdown(f"### Thank you, {st.session_state.username} 🙏")
+    st.info(random.choice(QUOTES))
+    st.info("Thanks for using FitAI. Stay healthy 💙")
+    if st.button("🔁 Back to Welcome"):
+        st.session_state.clear()
+        st.session_state.page="welcome"
+        st.rerun()
+    st.stop()
+
+# -------- WELCOME --------
+if st.session_state.page=="welcome":
+    logo()
+    st.info(random.choice(QUOTES))
+    if st.button("🚀 Get Started", use_container_width=True):
+        st.session_state.page="auth"
+        st.rerun()
+    st.stop()
+
+# -------- AUTH --------
+if st.session_state.page == "auth" and not st.session_state.user_id:
+    logo()
+    t1, t2 = st.tabs(["Login", "Signup"])
+
+    # -------- LOGIN (FORM) --------
+    with t1:
+        with st.form("login_form", clear_on_submit=True):
+            u = st.text_input("Username", key="login_username")
+            p = st.text_input("Password", type="password", key="login_password")
+            submit = st.form_submit_button("Login")
+
+            if submit:
+                if not u or not p:
+                    st.warning("Please enter both username and password")
+                    st.stop()
+
+                r = login(u, p)
+                if r:
+                    st.session_state.user_id = r[0]
+                    st.session_state.username = u
+
+                    # detect last completed week
+                    st.session_state.current_week = load_user_state(
+                        st.session_state.user_id
+                    ).latest_week
+                    
+                    st.session_state.page = (
+                        "week2" if st.session_state.current_week >= 1 else "dashboard"
+                    )
+                    st.rerun()
+                else:
+                    if not user_exists(u):
+                        st.warning("⚠️ User not found. Please sign up to continue.")
+                    else:
+                        st.error("❌ Invalid username or password.")
+
+    # -------- SIGNUP (NORMAL INPUTS) --------
+    with t2:
+        u=st.text_input("New Username",key="signup_username")
+        p=st.text_input("New Password", type="password",key="signup_password")
+        if st.button("Signup") and signup(u,p):
+            st.session_state.pop("signup_username", None)
+            st.session_state.pop("signup_password", None)
+
+            st.success("Signup successful. Please login.")
+    st.stop()
+
+user_state = load_user_state(st.session_state.user_id)
+profile = user_state.profile
+
+if profile:
+    (
+        age_db, height_db, weight_db,
+        state_db, city_db, goal_db,
+        diet_db, workout_place_db, budget_db
+    ) = profile
+else:
+    age_db = height_db = weight_db = None
+    state_db = city_db = goal_db = diet_db = workout_place_db = None
+    budget_db = None
+
+plan_count = user_state.plan_count
+
+# -------- SIDEBAR --------
+st.sidebar.title("Profile")
+st.sidebar.info("👈 Please fill all details before generating your plan")
+age=st.sidebar.number_input("Age",16,40,value=int(age_db) if age_db is not None else 18,step=1)
+height=st.sidebar.number_input("Height (cm)",130.0,220.0, value=float(height_db) if height_db is not None else 165.0,step=0.1)
+weight=st.sidebar.number_input("Weight (kg)",30.0,200.0, value=float(weight_db) if weight_db is not None else 60.0,step=0.1)
+st.sidebar.markdown("### State")
+
+state = st.sidebar.selectbox(
+    "Select your state",
+    list(STATE_CITY_MAP.keys()),
+    index=list(STATE_CITY_MAP.keys()).index(state_db)
+    if state_db in STATE_CITY_MAP else 0
+)
+st.sidebar.markdown("### City")
+
+cities_for_state = STATE_CITY_MAP.get(state, [])
+
+city_suggestion = st.sidebar.selectbox(
+    "Select city (optional)",
+    [""] + cities_for_state,
+    index=(cities_for_state.index(city_db) + 1)
+    if city_db in cities_for_state else 0
+)
+
+city = st.sidebar.text_input(
+    "Type your city",
+    value=city_db or city_suggestion
+)
+
+goal=st.sidebar.selectbox("Goal",GOALS,
+    index=GOALS.index(goal_db)
+    if goal_db else 0)
+diet=st.sidebar.selectbox("Diet",DIETS,
+    index=DIETS.index(diet_db)
+    if diet_db else 0)
+budget=st.sidebar.slider("Budget ₹",100,1000,
+    value=budget_db or 500)
+workout_place=st.sidebar.radio("Workout Place",WORKOUT_PLACES,
+    index=0 if workout_place_db=="Home"
+    else 1 if workout_place_db=="Gym"
+    else 0)
+
+if st.sidebar.button("Logout"):
+    st.session_state.show_progress = False
+    st.session_state.show_history = False
+
+    name=st.session_state.username
+    st.session_state.clear()
+    st.session_state.page="thankyou"
+    st.session_state.username=name
+    st.rerun()
+
+# -------- TOP BAR --------
+top_left, top_right = st.columns([6, 2])
+
+with top_left:
+    logo(False)
+
+with top_right:
+    st.markdown(
+        f"""
+        <div style="text-align:right;">
+            👤 <b>{st.session_state.username}</b>
+        </div>
+        """,
+        unsafe_allow_html=True
+    )
+
+        # 📜 Plan History (guard)
+    if plan_count == 0:
+        st.button("📜 Plan History", use_container_width=True, disabled=True)
+    else:
+        if st.button("📜 Plan History", use_container_width=True):
+            st.session_state.show_history = True
+            st.session_state.page = "dashboard"
+            st.rerun()
+
+    if plan_count == 0:
+        st.button("📈 Progress Trends", use_container_width=True, disabled=True)
+    else:
+        if st.button("📈 Progress Trends", use_container_width=True):
+            st.session_state.show_progress = True
+            st.session_state.page = "dashboard"   # ✅ ADD THIS
+            st.rerun()
+
+    if st.button("🚪 Logout", use_container_width=True):
+        st.session_state.show_progress = False
+        st.session_state.show_history = False
+
+        name = st.session_state.username
+        st.session_state.clear()
+        st.session_state.page = "thankyou"
+        st.session_state.username = name
+        st.rerun()
+
+# -------- BACKGROUND GENERATION --------
+# Plans are generated by jobs.py workers: the buttons below only submit a
+# job, and this section follows it until it finishes, in this session or
+# in a new one after the browser reconnects.
+JOB_DONE_MESSAGES = {
+    "first_plan": "✅ Your 7-day plan is ready!",
+    "week_n": "✅ Your Week {week} plan is ready!",
+    "chat_edit": "✅ Plan updated successfully",
+}
+
+
+@st.fragment(run_every=float(get_setting("JOB_POLL_SECONDS", 1.5)))
+def job_progress(job_id):
+    job = get_jobs().get(job_id)
+    if job is None or not job.active:
+        st.rerun()
+    st.info(f"🤖 {job.stage or 'Generating your plan...'}")
+    if job.text:
+        st.markdown(job.text + " ▌")
+
+
+if "job_id" not in st.session_state:
+    running = get_jobs().active_for(st.session_state.user_id)
+    if running:
+        st.session_state.job_id = running.id
+
+if "job_id" in st.session_state:
+    job = get_jobs().get(st.session_state.job_id)
+    if job is not None and job.active:
+        job_progress(job.id)
+        st.stop()
+
+    del st.session_state.job_id
+    if job is not None and job.status == DONE:
+        st.session_state.plan = job.result
+        st.session_state.current_week = job.week
+        st.session_state.page = "dashboard"
+        st.session_state.show_progress = False
+        st.toast(JOB_DONE_MESSAGES.get(job.kind, "✅ Done").format(week=job.week))
+        st.rerun()
+    elif job is not None:
+        if job.kind == "week_n" and not ai_available():
+            serve_degraded(job.error, user_state.latest_plan)
+        st.error(job.error)
+
+if st.session_state.page == "week2":
+    st.session_state.show_history = False
+    st.session_state.show_progress = False
+
+
+# -------- WEEK 2 / NEXT PLAN PAGE --------
+if st.session_state.page == "week2":
+    # ---- Detect current week number ----
+    current_week = user_state.latest_week + 1
+
+    logo()
+    st.subheader(f"🔄 Week {current_week} – Update Your Progress")
+
+    new_weight = st.number_input(
+        "Current weight (kg)",
+        min_value=30.0,
+        max_value=200.0,
+        step=0.1
+    )
+
+    difficulty = st.selectbox(
+        "How was last week's plan?",
+        DIFFICULTIES
+    )
+
+    notes = st.text_area(
+        "Any issues? (pain, schedule, food problems)",
+        placeholder="Optional"
+    )
+
+    if st.button(f"Generate Week {current_week} Plan"):
+        if not ai_available():
+            serve_degraded(
+                f"⚠️ AI service is temporarily unavailable, so Week {current_week} was not generated. "
+                "Here is your latest plan; please try again in a few minutes.",
+                user_state.latest_plan,
+            )
+        # Latest plan + preferences were loaded with the rerun state
+        preferences = user_state.preferences
+        # The model only needs what recent weeks used, not the full plans
+        recent = [user_state.latest_plan]
+        recent_weeks = int(get_setting("AI_PREV_PLANS", 2))
+        if recent_weeks > 1:
+            # Stored plan models: names and meals without reading the text
+            rows, _ = get_plan_index(st.session_state.user_id, limit=recent_weeks)
+            recent = [get_plan_model(row[0]) for row in rows]
+        prev_summary = summarize_plans(recent)
+
+        if not city or not state:
+            st.error("Please select your state and city.")
+            st.stop()
+        week_prompt = f"""
+ROLE:
+You are a Certified Indian Fitness Coach & Nutritionist.
+
+TASK:
+Generate a COMPLETELY NEW and COMPLETE 7-day workout + diet plan for WEEK {current_week}.
+
+THIS IS A STRICT RE-GENERATION TASK.
+What recent weeks used is listed ONLY so you can AVOID repeating it.
+
+━━━━━━━━━━━━━━━━━━
+USER CONTEXT:
+- Exercises and meals used in recent weeks: LISTED BELOW
+- User feedback: {difficulty}
+- Current weight: {new_weight} kg
+- User notes / issues: {notes}
+- Goal: {goal}
+- Diet type: {diet}
+- Weekly budget: ₹{budget}
+- Location: {city}, {state}
+- Workout place: {workout_place}
+- User preferences (fixed from Week 1): {preferences}
+━━━━━━━━━━━━━━━━━━
+
+━━━━━━━━━━━━━━━━━━
+ABSOLUTE RULES (NON-NEGOTIABLE):
+1. You MUST return a COMPLETE plan (Day 1 to Day 7).
+2. Workout AND diet must be present for ALL 7 days.
+3. Do NOT stop early.
+4. Do NOT summarize.
+5. Do NOT explain.
+6. Do NOT reuse or slightly modify previous content.
+7. Output ONLY the final plan.
+━━━━━━━━━━━━━━━━━━
+
+━━━━━━━━━━━━━━━━━━
+WORKOUT EVOLUTION RULES (VERY IMPORTANT):
+- DO NOT repeat exercises from the previous week.
+- DO NOT reuse the same exercise with higher reps/sets.
+- ALL major exercises must be DIFFERENT from last week.
+- You MAY keep the same muscle split, but exercises must change.
+- Introduce NEW movement patterns (tempo, unilateral, stability, isometric, compound variations).
+- At least 2–3 completely NEW exercises per day.
+- If feedback was:
+  • "Too Easy" → increase difficulty using harder variations
+  • "Just Right" → moderate progression with new exercises
+  • "Too Hard" → reduce load but STILL change exercises
+- Maintain safety and recovery.
+━━━━━━━━━━━━━━━━━━
+
+━━━━━━━━━━━━━━━━━━
+DIET VARIATION RULES (VERY IMPORTANT):
+- DO NOT repeat the same meals from last week.
+- DO NOT reuse identical breakfast/lunch/dinner items.
+- Rotate protein sources, grains, vegetables.
+- Change meals on AT LEAST 5 out of 7 days.
+- Calories should remain goal-appropriate.
+- Use foods commonly available in {city}, {state}.
+- Respect diet type strictly ({diet}).
+━━━━━━━━━━━━━━━━━━
+
+━━━━━━━━━━━━━━━━━━
+PREFERENCE RULES:
+- Respect all user preferences strictly.
+- If a preference conflicts with safety, replace with the closest safe alternative.
+━━━━━━━━━━━━━━━━━━
+
+━━━━━━━━━━━━━━━━━━
+FORMAT (BULLET POINTS ONLY — FOLLOW EXACTLY):
+
+- Title: Week {current_week} Fitness Plan
+
+- 7-Day Workout Plan
+  - Day 1:
+    - Exercise: sets × reps
+  - Day 2:
+    - Exercise: sets × reps
+  - Day 3:
+    - Exercise: sets × reps
+  - Day 4:
+    - Exercise: sets × reps
+  - Day 5:
+    - Exercise: sets × reps
+  - Day 6:
+    - Exercise: sets × reps
+  - Day 7:
+    - Active recovery / rest
+
+- 7-Day Diet Plan
+  - Day 1:
+    - Breakfast:
+    - Lunch:
+    - Dinner:
+  - Day 2:
+    - Breakfast:
+    - Lunch:
+    - Dinner:
+  - Day 3:
+    - Breakfast:
+    - Lunch:
+    - Dinner:
+  - Day 4:
+    - Breakfast:
+    - Lunch:
+    - Dinner:
+  - Day 5:
+    - Breakfast:
+    - Lunch:
+    - Dinner:
+  - Day 6:
+    - Breakfast:
+    - Lunch:
+    - Dinner:
+  - Day 7:
+    - Breakfast:
+    - Lunch:
+    - Dinner:
+
+- Hydration:
+  - Drink 2.5–3 liters of water daily
+
+━━━━━━━━━━━━━━━━━━
+ALREADY USED IN RECENT WEEKS (DO NOT REUSE):
+{prev_summary}
+
+FINAL CHECK BEFORE RESPONDING:
+- Did you change ALL major exercises? YES / NO
+- Are ALL 7 days present? YES / NO
+- Is diet different from last week? YES / NO
+
+ONLY RESPOND IF ALL ANSWERS ARE YES.
+
+"""
+        uid = st.session_state.user_id
+        profile_row = (age, height, weight, state, city, goal, diet, workout_place, budget)
+
+        def generate_week(job):
+            # Save progress while the model streams the plan
+            saving = async_db.start(async_db.record_progress(
+                uid, current_week, new_weight, difficulty
+            ))
+            job.update(f"Adapting your plan for Week {current_week}...")
+            adapted, problem = generate_plan(week_prompt, job, site="week_n")
+            saving.result()
+
+            if not adapted or (problem and problem.startswith("⚠️")):
+                raise JobFailed("❌ Failed to generate next week plan. Please try again.")
+
+            # ⚠️ Incomplete plan → regenerate ONCE
+            if problem or not parse_plan(adapted).complete:
+                job.update(f"⚠️ Incomplete plan detected ({problem or 'missing days'}). Regenerating...", "")
+                # Never replay the rejected answer, nor a cached regeneration
+                invalidate_ai_cache(week_prompt)
+                adapted, problem = generate_plan(f"""
+You are a certified fitness coach.
+
+CRITICAL (NON-NEGOTIABLE):
+- Return a COMPLETE 7-day plan
+- MUST include Day 1 through Day 7
+- Workout + Diet for all days
+- Do NOT summarize
+- Do NOT stop early
+- Do NOT explain
+
+FORMAT:
+                              
+7-Day Workout Plan
+Day 1:
+...
+Day 7:
+
+                               
+7-Day Diet Plan
+Day 1:
+- Breakfast:
+- Lunch:
+- Dinner:
+...
+Day 7:
+- Breakfast:
+- Lunch:
+- Dinner:
+                               
+""", job, cache=False, site="regenerate")
+
+            # ❌ Still broken → do NOT save
+            if problem or not parse_plan(adapted).complete:
+                raise JobFailed("❌ Plan generation failed. Please try again.")
+
+            # ✅ PART 5 — UPDATE USER PROFILE WITH LATEST VALUES
+            # ✅ ISSUE 5 — insert or replace SAME week
+            # (independent rows → written concurrently)
+            gather(
+                async_db.upsert_user_profile(uid, *profile_row),
+                async_db.save_plan(uid, current_week, adapted),
+            )
+            return adapted
+
+        # Returns at once; the job section above follows it to the end
+        st.session_state.job_id = get_jobs().submit(
+            uid, current_week, "week_n", generate_week
+        ).id
+        st.rerun()
+
+    if st.button("⬅️ Back"):
+        st.session_state.page = "dashboard"
+        st.rerun()
+
+    if not (st.session_state.show_history or st.session_state.show_progress):
+        st.stop()
+
+
+# -------- DASHBOARD --------
+st.markdown("<div class='card'>", unsafe_allow_html=True)
+c1,c2,c3 = st.columns(3)
+c1.metric("🤖 AI Confidence","High")
+c2.metric("🎯 Goal", goal)
+c3.metric("🏋️ Workout", workout_place)
+st.markdown("</div>", unsafe_allow_html=True)
+
+st.info(random.choice(QUOTES))
+
+if st.session_state.get("show_progress"):
+
+    # 🚨 NEW USER SAFETY CHECK (ADD HERE)
+    if plan_count == 0:
+        st.info("📈 You need to generate your first 7-day plan to see progress.")
+
+        col1, col2 = st.columns(2)
+
+        with col1:
+            if st.button("⬅️ Back to Dashboard"):
+                st.session_state.show_progress = False
+                st.session_state.page = "dashboard"
+                st.rerun()
+
+        with col2:
+            
+            if st.button("🚀 Generate First Plan"):
+                st.session_state.show_progress = False
+                st.session_state.page = "dashboard"
+                st.rerun()
+
+        st.stop()   # ⛔ VERY IMPORTANT
+
+    st.subheader("📈 Your Progress Trends")
+
+    progress = get_user_progress(st.session_state.user_id)
+    
+    if len(progress) == 0:
+        st.info("📈 Track your weight after Week 2 to see progress trends.")
+        st.stop()
+
+    if not progress:
+        st.info("📈 Progress trends will appear after generating your next week plan.")
+    else:
+        dates = []
+        weights = []
+        # ✅ Week 1 baseline from user profile
+        if weight_db is not None:
+            dates.append("Week 1")
+            weights.append(weight_db)
+        
+        # Week-based progress (NO ENUMERATE)
+        for week,weight,_,ts in progress:
+            dates.append(f"Week {week}")
+            weights.append(weight)
+
+        df_weight = pd.DataFrame({
+        "Date": dates,
+        "Weight (kg)": weights
+})
+
+        st.line_chart(df_weight, x="Date", y="Weight (kg)")
+    
+    if st.button("❌ Close Progress"):
+        st.session_state.show_progress = False
+        st.rerun()
+
+
+    if st.button("➡️ Generate Next Week Plan", key="from_progress_trends"):
+        st.session_state.show_progress = False
+        st.session_state.show_history = False
+        st.session_state.page = "week2"
+        st.rerun()
+
+# -------- HISTORY --------
+
+if st.session_state.get("show_history"):
+    st.subheader("📜 Your Plan History")
+
+    if not render_plan_history(st.session_state.user_id, key="history"):
+        st.info("No plans generated yet.")
+
+
+    if st.button("❌ Close History"):
+        st.session_state.show_history = False
+        st.rerun()
+    
+    if st.button("➡️ Generate Next Week Plan", key="from_history"):
+        st.session_state.show_progress = False
+        st.session_state.show_history = False
+        st.session_state.page = "week2"
+        st.rerun()
+
+# -------- PLAN --------
+if "plan" not in st.session_state and plan_count == 0:
+    st.markdown("### 🧠 Personal Preferences (Optional)")
+
+    preferences = st.text_area(
+    "Any food, workout, or lifestyle preferences?",
+    placeholder="""
+Examples:
+- I hate burpees
+- Prefer South Indian breakfast
+- Knee pain – avoid jumping
+- Short workouts (30–40 mins)
+- Like yoga once a week
+""",
+    height=120
+)
+    if preferences and len(preferences) > 300:
+        st.warning("Please keep preferences short and clear (1–3 lines).")
+        st.stop()
+    # Only write when the text actually changed, not on every rerun
+    if preferences != user_state.preferences:
+        save_preferences(st.session_state.user_id, preferences)
+
+    if st.button("Generate 7-Day Plan"):
+        if not ai_available():
+            serve_degraded("⚠️ AI service is temporarily unavailable. "
+                           "Please try generating your plan again in a few minutes.")
+        if not state or not city:
+            st.error("Please select your fill all the details in the sidebar before generating the plan.")
+            st.stop()
+
+        uid = st.session_state.user_id
+        profile_row = (age, height, weight, state, city, goal, diet, workout_place, budget)
+        split = get_setting("AI_PLAN_MODE", "split") == "split"
+
+        if split:
+            # Workout and diet as two concurrent calls, each with the
+            # full output budget, stitched together locally
+            workout_prompt = f"""
+ROLE: Certified Indian fitness coach.
+
+CRITICAL INSTRUCTIONS:
+- Generate ONLY a COMPLETE 7-day WORKOUT plan (no diet)
+- Goal: {goal}
+- User Preferences: {preferences if preferences else "No specific preferences provided"}
+- Student-friendly, hostel/home suitable
+
+PREFERENCE RULE (NON-NEGOTIABLE):
+- Respect user preferences strictly
+- If a preference conflicts with safety, choose a safer alternative
+
+CRITICAL WORKOUT PLACE RULE (NON-NEGOTIABLE):
+- Workout place selected: {workout_place}
+
+IF workout place is "Gym":
+- Use ONLY gym-based exercises
+- MUST include gym equipment such as:
+  - Barbell
+  - Dumbbells
+  - Machines (leg press, lat pulldown, chest press)
+- DO NOT include:
+  - Brisk walking
+  - Jogging
+  - Yoga
+  - Bodyweight-only workouts
+  - Home cardio (jumping jacks, skipping)
+
+IF workout place is "Home":
+- Use ONLY bodyweight or minimal equipment exercises
+- DO NOT include gym machines or barbells
+
+FORMAT (USE BULLET POINTS EXACTLY LIKE THIS):
+- 7-Day Workout Plan
+  - Day 1:
+    - Exercise: sets × reps
+  ...
+  - Day 7:
+    - Rest / Light activity
+
+STRICT RULES:
+- NO title, NO diet, NO hydration note
+- NO explanations
+- Do NOT skip Day 7
+- Output ONLY the workout plan
+"""
+            diet_prompt = f"""
+ROLE: Certified Indian nutritionist.
+
+CRITICAL INSTRUCTIONS:
+- Generate ONLY a COMPLETE 7-day DIET plan (no workouts)
+- Goal: {goal}
+- Diet MUST use foods commonly eaten in {city}, {state}
+- Prefer local, seasonal, and culturally common foods of {city}
+- If a food is expensive or unavailable in {city}, suggest a cheaper local alternative
+- Budget limit: ₹{budget} per week
+- Diet preference: {diet}
+- User Preferences: {preferences if preferences else "No specific preferences provided"}
+- Student-friendly, hostel/home suitable
+- No supplements
+
+PREFERENCE RULE (NON-NEGOTIABLE):
+- Respect user preferences strictly
+- If a preference conflicts with safety, choose a safer alternative
+
+FORMAT (USE BULLET POINTS EXACTLY LIKE THIS):
+- 7-Day Diet Plan
+  - Day 1:
+    - Breakfast: ...
+    - Lunch: ...
+    - Dinner: ...
+  ...
+  - Day 7:
+    - Breakfast: ...
+    - Lunch: ...
+    - Dinner: ...
+
+STRICT RULES:
+- NO title, NO workouts, NO hydration note
+- NO explanations
+- Do NOT skip Day 7
+- Output ONLY the diet plan
+"""
+        else:
+            prompt = f"""
+ROLE: Certified Indian fitness coach and nutritionist.
+
+CRITICAL INSTRUCTIONS:
+- Generate a COMPLETE 7-day workout plan AND 7-day diet plan
+- Diet MUST use foods commonly eaten in {city}, {state}
+- Prefer local, seasonal, and culturally common foods of {city}
+- If a food is expensive or unavailable in {city}, suggest a cheaper local alternative
+- Budget limit: ₹{budget} per week
+- Diet preference: {diet}
+- User Preferences: {preferences if preferences else "No specific preferences provided"}
+- Student-friendly, hostel/home suitable
+- No supplements
+
+PREFERENCE RULE (NON-NEGOTIABLE):
+- Respect user preferences strictly
+- If a preference conflicts with safety, choose a safer alternative
+
+CRITICAL WORKOUT PLACE RULE (NON-NEGOTIABLE):
+- Workout place selected: {workout_place}
+
+IF workout place is "Gym":
+- Use ONLY gym-based exercises
+- MUST include gym equipment such as:
+  - Barbell
+  - Dumbbells
+  - Machines (leg press, lat pulldown, chest press)
+- DO NOT include:
+  - Brisk walking
+  - Jogging
+  - Yoga
+  - Bodyweight-only workouts
+  - Home cardio (jumping jacks, skipping)
+
+IF workout place is "Home":
+- Use ONLY bodyweight or minimal equipment exercises
+- DO NOT include gym machines or barbells
+
+FORMAT (JSON, FOLLOWING THE RESPONSE SCHEMA):
+- title: short plan title
+- workout: Day 1 to Day 7, each with its exercises (name + sets × reps or duration)
+  - A rest day lists one light activity
+- diet: Day 1 to Day 7, each with Breakfast, Lunch and Dinner (Snacks optional)
+
+STRICT RULES:
+- NO explanations
+- NO reviews
+- NO suggestions outside the plan
+- Do NOT skip Day 7
+"""
+
+        def generate_first(job):
+            # ✅ PART 5 — SAVE / UPDATE USER PROFILE (while the model streams)
+            saving = async_db.start(async_db.upsert_user_profile(uid, *profile_row))
+            job.update("Generating your plan...")
+
+            if split:
+                prompts = [workout_prompt, diet_prompt]
+                live = ["", ""]
+
+                def show(i, text):
+                    live[i] = text
+                    job.update(text="\n\n".join(filter(None, live)))
+
+                halves = generate_plans(prompts, sections=1,
+                                        sites=["first_plan_workout", "first_plan_diet"],
+                                        on_text=show)
+                saving.result()
+
+                # Only a half that went wrong is generated again
+                retry = [i for i, (_, problem) in enumerate(halves)
+                         if problem and not problem.startswith("⚠️")]
+                if retry:
+                    job.update("⚠️ Part of the plan was incomplete. Regenerating it...")
+                    redone = generate_plans([prompts[i] for i in retry],
+                                            sections=1, cache=False, sites="regenerate_half",
+                                            on_text=lambda j, text: show(retry[j], text))
+                    for i, half in zip(retry, redone):
+                        halves[i] = half
+
+                problem = next((problem for _, problem in halves if problem), None)
+                if problem:
+                    raise JobFailed(f"❌ Plan generation failed ({problem}). Please try again.")
+
+                validated = assemble_plan(
+                    f"Week 1 Fitness Plan ({workout_place}, {diet}, ₹{budget}/week, {city})",
+                    halves[0][0], halves[1][0],
+                )
+            else:
+                # One schema-constrained call: completeness is checked on
+                # the JSON and the markdown is rendered locally, so there
+                # is no second "fix the format" call. JSON keys cost
+                # tokens the markdown did not, hence the bigger budget.
+                config = json_config(PLAN_SCHEMA, max_output_tokens=2048)
+                answer = query_ai(prompt, site="first_plan", config=config)
+                saving.result()
+
+                plan, problem = read_plan_json(answer)
+                # ⚠️ Incomplete plan → regenerate ONCE
+                if problem and not problem.startswith("⚠️"):
+                    job.update(f"⚠️ Incomplete plan detected ({problem}). Regenerating...")
+                    invalidate_ai_cache(prompt, config)
+                    answer = query_ai(prompt, cache=False, site="regenerate", config=config)
+                    plan, problem = read_plan_json(answer)
+
+                if problem:
+                    raise JobFailed(f"❌ Plan generation failed ({problem}). Please try again.")
+
+                validated = render_plan(
+                    plan,
+                    f"Week 1 Fitness Plan ({workout_place}, {diet}, ₹{budget}/week, {city})",
+                )
+
+            save_plan(uid, 1, validated)
+            return validated
+
+        # Returns at once; the job section above follows it to the end
+        st.session_state.job_id = get_jobs().submit(uid, 1, "first_plan", generate_first).id
+        st.rerun()
+
+if "plan" in st.session_state:
+    st.markdown("<div class='card'>", unsafe_allow_html=True)
+    st.markdown(st.session_state.plan)
+    st.markdown("</div>", unsafe_allow_html=True)
+
+# -------- CHAT --------
+if "plan" in st.session_state:
+    st.info(
+    "💡 Pro Tip: Ask for small changes like:\n"
+    "- Modify Day 3 workout\n"
+    "- Change only diet\n"
+    "- Replace dinner options\n\n"
+    "This helps avoid incomplete updates."
+)
+
+    # 🕘 Every chat edit is kept as a version → preview / restore
+    versions = list_plan_versions(
+        st.session_state.user_id, st.session_state.current_week
+    )
+    if len(versions) > 1:
+        with st.expander(f"🕘 Plan versions ({len(versions)})"):
+            labels = {
+                f"v{v} — {note or 'edit'} — {(ts + timedelta(hours=5, minutes=30)).strftime('%d %b, %I:%M %p')}": v
+                for v, _, _, note, ts in versions
+            }
+            picked = labels[st.selectbox("Version", list(labels.keys()), key="version_pick")]
+
+            if st.toggle("Preview", key="version_preview"):
+                st.markdown(get_plan_version(
+                    st.session_state.user_id, st.session_state.current_week, picked
+                ) or "_Version not found._")
+
+            if picked != versions[0][0] and st.button(f"↩️ Restore v{picked}"):
+                restored = rollback_plan(
+                    st.session_state.user_id, st.session_state.current_week, picked
+                )
+                if restored:
+                    st.session_state.plan = restored
+                    st.success(f"✅ Restored version {picked}")
+                    st.rerun()
+
+    msg=st.chat_input("Modify plan / ask alternatives")
+    if msg:
+        if not ai_available():
+            serve_degraded("⚠️ AI service is temporarily unavailable. "
+                           "Your plan was not changed; please try again in a few minutes.")
+        edit_prompt = f"""
+You are updating an existing fitness plan.
+
+IMPORTANT CONTEXT (DO NOT IGNORE):
+- User location: {city}, {state}
+- Diet preference: {diet}
+- Weekly budget: ₹{budget}
+- Use foods commonly eaten and easily available in {city}
+- If a food is expensive or uncommon in {city}, replace it with a cheaper local alternative
+CRITICAL RULES (NON-NEGOTIABLE):
+- You MUST return the COMPLETE plan
+- Workout AND diet must include Day 1 through Day 7
+- Do NOT return partial plans
+- Do NOT stop mid-output
+- Do NOT summarize
+- Do NOT omit unchanged days
+- If content is long, CONTINUE until the full plan is complete
+
+FORMAT (USE BULLET POINTS):
+- Title
+- 7-Day Workout Plan (Day 1 to Day 7)
+- 7-Day Diet Plan (Day 1 to Day 7)
+- Hydration note
+
+CURRENT PLAN:
+{st.session_state.plan}
+
+USER REQUEST:
+{msg}
+
+OUTPUT:
+Return the FULL UPDATED PLAN ONLY.
+No explanations.
+"""
+        # Patch mode: the model names only what changes (see plan_patch.py)
+        # and the edit is applied here; anything it can't express as a
+        # patch falls through to the full rewrite below
+        patch_prompt = f"""
+You are editing an existing 7-day fitness plan for a user in {city}, {state}.
+Diet preference: {diet}. Weekly budget: ₹{budget}.
+Use foods commonly eaten and easily available in {city}.
+
+Return ONLY the changes the user asks for, as JSON operations:
+- set_workout: day, focus, exercises (replaces that day's whole workout)
+- replace_exercise: day, old (current exercise name), name, detail
+- add_exercise: day, name, detail
+- remove_exercise: day, old
+- set_meal: day, meal (Breakfast / Lunch / Dinner / Snacks), food
+- rewrite: only if the request changes most of the plan
+
+Do NOT repeat anything that stays the same.
+
+CURRENT PLAN:
+{st.session_state.plan}
+
+USER REQUEST:
+{msg}
+"""
+        uid = st.session_state.user_id
+        week = st.session_state.current_week
+        current_plan = st.session_state.plan
+        patch = get_setting("AI_EDIT_MODE", "patch") == "patch"
+        patch_config = json_config(
+            PATCH_SCHEMA, max_output_tokens=int(get_setting("AI_PATCH_MAX_TOKENS", 1024))
+        )
+
+        def edit_plan(job):
+            job.update("Updating plan...")
+            if patch:
+                answer = query_ai(patch_prompt, site="chat_patch", config=patch_config)
+                if answer.startswith("⚠️"):
+                    raise JobFailed(f"{answer} Existing plan kept safe.")
+                try:
+                    updated = apply_patch(current_plan, parse_patch(answer))
+                except RewriteNeeded:
+                    job.update("Rewriting the full plan...")
+                except PatchError as e:
+                    # Never replay an answer that could not be applied
+                    invalidate_ai_cache(patch_prompt, patch_config)
+                    job.update(f"⚠️ Could not apply the edit ({e}). Rewriting the full plan...")
+                else:
+                    update_plan(uid, week, updated, note="chat patch")
+                    return updated
+
+            updated, problem = generate_plan(edit_prompt, job, site="chat_edit")
+            if not updated and not problem:
+                raise JobFailed("❌ AI returned empty response. Plan not updated.")
+
+            # An AI error, not a bad plan: asking again right away would fail too
+            if problem and problem.startswith("⚠️"):
+                raise JobFailed(f"{problem} Existing plan kept safe.")
+
+            # ✅ SAFETY CHECK 1 — workout and diet for all 7 days
+            if problem or not parse_plan(updated).complete:
+                job.update("⚠️ Incomplete plan detected. Regenerating full plan...", "")
+                invalidate_ai_cache(edit_prompt)
+
+                updated, problem = generate_plan(f"""
+Regenerate the FULL 7-day fitness plan.
+
+CRITICAL RULES:
+- Workout AND diet MUST include Day 1 through Day 7
+- Do NOT omit any day
+- Do NOT summarize
+- Do NOT explain
+- Return the COMPLETE plan only
+
+CURRENT PLAN:
+{current_plan}
+""", job, cache=False, site="chat_regenerate")
+
+                # 🔐 Final validation after regeneration
+                if problem or not updated or not parse_plan(updated).complete:
+                    raise JobFailed("❌ Failed to regenerate a complete plan. Existing plan kept safe. "
+                                    "AI is busy now. Please try again later.")
+
+            # ✅ SAFETY CHECK 2 — prevent shorter/partial overwrite: an edit
+            # keeps (nearly) every exercise and meal it did not touch. Items
+            # are only counted when the parser reads the stored plan without
+            # loss; otherwise compare the stored text itself
+            before = parse_plan(current_plan)
+            if before.to_markdown() == current_plan.rstrip("\n"):
+                shrunk = parse_plan(updated).item_count() < before.item_count() * 0.7
+            else:
+                shrunk = len(updated) < len(current_plan) * 0.7
+            if shrunk:
+                invalidate_ai_cache(edit_prompt)
+                raise JobFailed("⚠️ Response looks incomplete. Existing plan kept safe.")
+
+            update_plan(uid, week, updated)
+            return updated
+
+        # Returns at once; the job section above follows it to the end
+        st.session_state.job_id = get_jobs().submit(uid, week, "chat_edit", edit_plan).id
+        st.rerun()
+
+# -------- DOWNLOAD --------
+if "plan" in st.session_state:
+    file=create_pdf(st.session_state.plan)
+    with open(file,"rb") as f:
+        st.download_button("Download PDF", f, "FitnessPlan.pdf")
+
+
@@ -0,0 +1,557 @@
+import asyncio
+import functools
+import threading
+import time
+
+import asyncpg
+import streamlit as st
+
+import auth
+import database
+from auth import hash_password
+from config import get_setting
+from database import PLAN_KINDS, backend_name, get_user_cache, invalidate_user, purge_flow
+from repository import (
+    PostgresRepository, UserState, GenerationJob, create_job_flow, stale_cutoff,
+)
+from statements import compile_statements
+from plan_codec import encode_plan, decode_plan
+from plan_delta import version_rows, replay
+from plan_model import Plan, parse_plan
+
+# asyncio-native mirror of database.py + auth.py on asyncpg.
+#
+# One event loop runs in a daemon thread per server process and owns the
+# asyncpg pool. Streamlit's script threads are synchronous, so they go
+# through run(...) / gather(...), which schedule coroutines on that loop:
+#
+#     state, plan = gather(
+#         async_db.load_user_state(uid),
+#         asyncio.to_thread(query_ai, prompt),
+#     )
+#
+# Reads share database.py's per-user cache and every write invalidates it,
+# so sync and async callers never see each other's stale data. With
+# DB_BACKEND other than postgres, each coroutine runs its database.py
+# counterpart in a worker thread instead.
+#
+# Every public data access function has a mirror here except the pool /
+# cache plumbing and compress_plans, a maintenance batch run from the
+# command line (python migrations.py compress-plans). Logic beyond single
+# statements is shared rather than copied: plan versions from plan_delta,
+# create_job / purge_users as flows from repository / database.py, run
+# here by _run_flow.
+
+# Statements come from the shared registry in their $n form; asyncpg
+# prepares each one per connection on first use and keeps it in its
+# statement cache, so every call after that is executed by name.
+_SQL = compile_statements(PostgresRepository.PLAN_BLOB, PostgresRepository.FOR_UPDATE)
+
+
+def _q(name):
+    return _SQL[name].numbered
+
+# ---------------- EVENT LOOP ----------------
+
+class _LoopThread:
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self.loop.run_forever, name="async-db", daemon=True
+        )
+        self._thread.start()
+
+
+@st.cache_resource
+def _get_loop():
+    return _LoopThread().loop
+
+
+def start(coro):
+    """Schedule a coroutine on the shared loop; returns a concurrent Future."""
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop())
+
+
+def run(coro, timeout=None):
+    """Run a coroutine on the shared loop from synchronous code."""
+    return start(coro).result(timeout)
+
+
+def gather(*coros, timeout=None):
+    """Run several coroutines concurrently; results in argument order."""
+    async def _all():
+        return await asyncio.gather(*coros)
+    return run(_all(), timeout)
+
+# ---------------- POOL ----------------
+
+_pool = None
+_pool_task = None
+_stats = {"acquisitions": 0, "wait_total": 0.0, "wait_max": 0.0}
+
+
+async def _create_pool():
+    return await asyncpg.create_pool(
+        host=get_setting("DB_HOST"),
+        database=get_setting("DB_NAME"),
+        user=get_setting("DB_USER"),
+        password=get_setting("DB_PASSWORD"),
+        port=int(get_setting("DB_PORT")),
+        ssl="require",
+        min_size=1,
+        max_size=int(get_setting("DB_ASYNC_POOL_SIZE", 10)),
+        # asyncpg can only retire idle connections, not old ones, so this
+        # is its own setting rather than the sync pool's DB_POOL_MAX_LIFETIME
+        max_inactive_connection_lifetime=float(
+            get_setting("DB_ASYNC_POOL_IDLE", 300)
+        ),
+    )
+
+
+async def get_pool():
+    # Only touched from the shared loop; concurrent first callers all
+    # await the same creation task instead of opening several pools
+    global _pool, _pool_task
+    if _pool is not None:
+        return _pool
+
+    if _pool_task is None:
+        _pool_task = asyncio.ensure_future(_create_pool())
+    try:
+        _pool = await _pool_task
+    except Exception:
+        _pool_task = None
+        raise
+    return _pool
+
+
+class _Acquire:
+    """pool.acquire() that also records how long callers waited."""
+
+    def __init__(self):
+        self._ctx = None
+
+    async def __aenter__(self):
+        pool = await get_pool()
+        start = time.monotonic()
+        self._ctx = pool.acquire(timeout=float(get_setting("DB_POOL_TIMEOUT", 10)))
+        conn = await self._ctx.__aenter__()
+
+        waited = time.monotonic() - start
+        _stats["acquisitions"] += 1
+        _stats["wait_total"] += waited
+        _stats["wait_max"] = max(_stats["wait_max"], waited)
+        return conn
+
+    async def __aexit__(self, *exc):
+        return await self._ctx.__aexit__(*exc)
+
+
+def acquire():
+    return _Acquire()
+
+
+def pool_stats():
+    if _pool is None:
+        return {"size": 0, "idle": 0, "checked_out": 0, "acquisitions": 0}
+
+    n = _stats["acquisitions"]
+    return {
+        "size": _pool.get_size(),
+        "max_size": _pool.get_max_size(),
+        "idle": _pool.get_idle_size(),
+        "checked_out": _pool.get_size() - _pool.get_idle_size(),
+        "acquisitions": n,
+        "wait_avg_ms": round(1000 * _stats["wait_total"] / n, 2) if n else 0.0,
+        "wait_max_ms": round(1000 * _stats["wait_max"], 2),
+    }
+
+# ---------------- BACKEND ----------------
+
+def _or_sync(sync_fn):
+    # asyncpg only speaks Postgres; any other backend goes through the
+    # synchronous repository in a worker thread
+    def wrap(async_fn):
+        @functools.wraps(async_fn)
+        async def call(*args, **kwargs):
+            if backend_name() != "postgres":
+                return await asyncio.to_thread(sync_fn, *args, **kwargs)
+            return await async_fn(*args, **kwargs)
+        return call
+    return wrap
+
+async def _run_flow(flow, ops):
+    # repository.run_flow for ops that return awaitables
+    send, value = flow.send, None
+    while True:
+        try:
+            op, *args = send(value)
+        except StopIteration as done:
+            return done.value
+        try:
+            send, value = flow.send, await ops[op](*args)
+        except Exception as e:
+            send, value = flow.throw, e
+
+
+async def _in_transaction(flow):
+    async with acquire() as conn, conn.transaction():
+        return await _run_flow(flow, {
+            "run": lambda name, params: conn.execute(_q(name), *params),
+            "value": lambda name, params: conn.fetchval(_q(name), *params),
+        })
+
+# ---------------- CACHE ----------------
+
+async def _cached(user_id, kind, loader, *args):
+    cache = get_user_cache()
+
+    found, value = cache.get(user_id, kind, args)
+    if found:
+        return value
+
+    generation = cache.generation(user_id)
+    value = await loader(user_id, *args)
+    cache.put(user_id, kind, args, value, generation)
+    return value
+
+# ---------------- AUTH ----------------
+
+@_or_sync(auth.signup)
+async def signup(username: str, password: str) -> bool:
+    async with acquire() as conn:
+        try:
+            await conn.execute(
+                _q("user_insert"), username, hash_password(password)
+            )
+            return True
+
+        except asyncpg.UniqueViolationError:
+            return False
+
+        except Exception as e:
+            return auth.signup_failed(e)
+
+
+@_or_sync(auth.login)
+async def login(username: str, password: str):
+    async with acquire() as conn:
+        row = await conn.fetchrow(
+            _q("login"), username, hash_password(password)
+        )
+        return tuple(row) if row else None
+
+
+@_or_sync(auth.user_exists)
+async def user_exists(username: str) -> bool:
+    async with acquire() as conn:
+        return await conn.fetchval(_q("user_exists"), username) is not None
+
+# ---------------- USERS ----------------
+
+@_or_sync(database.delete_user)
+async def delete_user(uid):
+    async with acquire() as conn:
+        await conn.execute(_q("user_delete"), uid)
+
+    invalidate_user(uid)
+
+
+@_or_sync(database.get_all_users)
+async def get_all_users():
+    async with acquire() as conn:
+        rows = await conn.fetch(_q("all_users"))
+        return [tuple(r) for r in rows]
+
+# ---------------- BULK PURGE ----------------
+
+@_or_sync(database.count_inactive_users)
+async def count_inactive_users(cutoff):
+    async with acquire() as conn:
+        return await conn.fetchval(_q("inactive_count"), cutoff)
+
+
+@_or_sync(database.find_inactive_users)
+async def find_inactive_users(cutoff, after_id=0, limit=500):
+    async with acquire() as conn:
+        rows = await conn.fetch(_q("inactive_users"), cutoff, after_id, limit)
+        return [r[0] for r in rows]
+
+
+async def _delete_users(user_ids):
+    async with acquire() as conn:
+        status = await conn.execute(_q("users_purge_chunk"), user_ids)
+    return int(status.split()[-1])
+
+
+@_or_sync(database.purge_users)
+async def purge_users(user_ids=None, inactive_before=None, batch_size=500,
+                      pause=0.0, on_progress=None):
+    return await _run_flow(purge_flow(user_ids, inactive_before, batch_size, pause, on_progress), {
+        "count": count_inactive_users,
+        "find": find_inactive_users,
+        "delete": _delete_users,
+        "pause": asyncio.sleep,
+    })
+
+# ---------------- PLANS ----------------
+
+async def _fetch_plan_history(user_id):
+    async with acquire() as conn:
+        rows = await conn.fetch(_q("plan_history"), user_id)
+
+    return tuple(
+        (plan_id, week, decode_plan(blob), ts)
+        for plan_id, week, blob, ts in rows
+    )
+
+
+@_or_sync(database.get_plan_history)
+async def get_plan_history(user_id):
+    return await _cached(user_id, "plan_history", _fetch_plan_history)
+
+
+async def _fetch_plan_index(user_id, before_week, limit):
+    async with acquire() as conn:
+        rows = await conn.fetch(_q("plan_index"), user_id, before_week, limit + 1)
+
+    more = len(rows) > limit
+    rows = tuple(tuple(r) for r in rows[:limit])
+    return rows, (rows[-1][1] if more else None)
+
+
+@_or_sync(database.get_plan_index)
+async def get_plan_index(user_id, before_week=None, limit=10):
+    if before_week is None:
+        before_week = 2 ** 31 - 1
+    return await _cached(user_id, "plan_index", _fetch_plan_index, before_week, limit)
+
+
+@_or_sync(database.get_plan_body)
+async def get_plan_body(plan_id):
+    async with acquire() as conn:
+        blob = await conn.fetchval(_q("plan_body"), plan_id)
+    return decode_plan(blob)
+
+
+@_or_sync(database.get_plan_model)
+async def get_plan_model(plan_id):
+    async with acquire() as conn:
+        row = await conn.fetchrow(_q("plan_model"), plan_id)
+    if row is None:
+        return None
+    if row[0] is not None:
+        return Plan.from_json(row[0])
+    return parse_plan(await get_plan_body(plan_id))
+
+
+async def _lock_plan(conn, user_id, week):
+    row = await conn.fetchrow(_q("plan_lock"), user_id, week)
+    return (row[0], decode_plan(row[1])) if row else (None, None)
+
+
+async def _write_plan(conn, plan_id, plan):
+    await conn.execute(_q("plan_write"), encode_plan(plan), len(plan),
+                       parse_plan(plan).to_json(), plan_id)
+
+
+@_or_sync(database.save_plan)
+async def save_plan(user_id, week, plan, note="generated"):
+    async with acquire() as conn, conn.transaction():
+        _, parent = await _lock_plan(conn, user_id, week)
+
+        plan_id = await conn.fetchval(
+            _q("plan_upsert"), user_id, week, encode_plan(plan), len(plan),
+            parse_plan(plan).to_json()
+        )
+
+        await _append_version(conn, plan_id, user_id, week, parent, plan, note)
+
+    invalidate_user(user_id, *PLAN_KINDS)
+
+
+@_or_sync(database.update_plan)
+async def update_plan(user_id, week, plan, note="chat edit"):
+    async with acquire() as conn, conn.transaction():
+        plan_id, parent = await _lock_plan(conn, user_id, week)
+
+        if plan_id is not None:
+            await _write_plan(conn, plan_id, plan)
+            await _append_version(conn, plan_id, user_id, week, parent, plan, note)
+
+    invalidate_user(user_id, *PLAN_KINDS)
+
+
+@_or_sync(database.delete_plan)
+async def delete_plan(plan_id):
+    async with acquire() as conn, conn.transaction():
+        row = await conn.fetchrow(_q("plan_delete"), plan_id)
+        if row:
+            await conn.execute(_q("progress_delete_week"), row[0], row[1])
+
+    if row:
+        invalidate_user(row[0], *PLAN_KINDS, "progress")
+
+# ---------------- PLAN VERSIONS ----------------
+
+async def _append_version(conn, plan_id, user_id, week, parent, plan, note):
+    head = await conn.fetchval(_q("version_head"), plan_id) or 0
+
+    for version, is_snapshot, payload, row_note in version_rows(head, parent, plan, note):
+        await conn.execute(
+            _q("version_insert"), plan_id, user_id, week, version, version - 1 or None,
+            is_snapshot, payload, len(payload), row_note
+        )
+
+
+async def _fetch_plan_versions(user_id, week):
+    async with acquire() as conn:
+        rows = await conn.fetch(_q("version_list"), user_id, week)
+    return tuple(tuple(r) for r in rows)
+
+
+@_or_sync(database.list_plan_versions)
+async def list_plan_versions(user_id, week):
+    return await _cached(user_id, "plan_versions", _fetch_plan_versions, week)
+
+
+async def _materialize(conn, plan_id, version):
+    rows = await conn.fetch(_q("version_replay"), plan_id, version)
+    return replay(rows, version)
+
+
+@_or_sync(database.get_plan_version)
+async def get_plan_version(user_id, week, version):
+    async with acquire() as conn:
+        plan_id = await conn.fetchval(_q("plan_id"), user_id, week)
+        return await _materialize(conn, plan_id, version) if plan_id else None
+
+
+@_or_sync(database.rollback_plan)
+async def rollback_plan(user_id, week, version):
+    async with acquire() as conn, conn.transaction():
+        plan_id, current = await _lock_plan(conn, user_id, week)
+        if plan_id is None:
+            return None
+
+        text = await _materialize(conn, plan_id, version)
+        if text is None:
+            return None
+
+        await _write_plan(conn, plan_id, text)
+        await _append_version(conn, plan_id, user_id, week, current, text,
+                              f"rolled back to v{version}")
+
+    invalidate_user(user_id, *PLAN_KINDS)
+    return text
+
+# ---------------- PROFILE ----------------
+
+async def _fetch_user_profile(user_id):
+    async with acquire() as conn:
+        row = await conn.fetchrow(_q("profile"), user_id)
+    return tuple(row) if row else None
+
+
+@_or_sync(database.get_user_profile)
+async def get_user_profile(user_id):
+    return await _cached(user_id, "profile", _fetch_user_profile)
+
+
+@_or_sync(database.upsert_user_profile)
+async def upsert_user_profile(
+    user_id, age, height, weight,
+    state, city, goal, diet, workout_place, budget
+):
+    async with acquire() as conn:
+        await conn.execute(
+            _q("profile_upsert"), user_id, age, height, weight,
+            state, city, goal, diet, workout_place, budget
+        )
+
+    invalidate_user(user_id, "profile", "state")
+
+# ---------------- PROGRESS ----------------
+
+async def _fetch_user_progress(user_id):
+    async with acquire() as conn:
+        rows = await conn.fetch(_q("progress"), user_id)
+    return tuple(tuple(r) for r in rows)
+
+
+@_or_sync(database.get_user_progress)
+async def get_user_progress(user_id):
+    return await _cached(user_id, "progress", _fetch_user_progress)
+
+
+@_or_sync(database.record_progress)
+async def record_progress(user_id, week, weight, difficulty):
+    async with acquire() as conn, conn.transaction():
+        await conn.execute(
+            _q("progress_insert"), user_id, week, weight, difficulty
+        )
+        await conn.execute(_q("weight_update"), weight, user_id)
+
+    invalidate_user(user_id, "progress", "profile", "state")
+
+# ---------------- PREFERENCES ----------------
+
+@_or_sync(database.save_preferences)
+async def save_preferences(user_id, preferences):
+    async with acquire() as conn:
+        await conn.execute(_q("preferences_upsert"), user_id, preferences)
+
+    invalidate_user(user_id, "state")
+
+# ---------------- GENERATION JOBS ----------------
+
+@_or_sync(database.create_job)
+async def create_job(user_id, week, kind, stale_after=600):
+    flow = create_job_flow(user_id, week, kind, stale_cutoff(stale_after),
+                           asyncpg.UniqueViolationError)
+    return await _run_flow(flow, {"transaction": _in_transaction})
+
+
+@_or_sync(database.update_job)
+async def update_job(job_id, status, result=None, error=None):
+    async with acquire() as conn:
+        await conn.execute(_q("job_update"), status, result, error, job_id)
+
+
+@_or_sync(database.touch_jobs)
+async def touch_jobs(job_ids):
+    async with acquire() as conn:
+        await conn.executemany(_q("job_touch"), [(job_id,) for job_id in job_ids])
+
+
+@_or_sync(database.get_job)
+async def get_job(job_id):
+    async with acquire() as conn:
+        row = await conn.fetchrow(_q("job_get"), job_id)
+    return GenerationJob(*row) if row else None
+
+
+@_or_sync(database.get_latest_job)
+async def get_latest_job(user_id, week):
+    async with acquire() as conn:
+        row = await conn.fetchrow(_q("job_latest"), user_id, week)
+    return GenerationJob(*row) if row else None
+
+# ---------------- SESSION STATE ----------------
+
+async def _fetch_user_state(user_id):
+    async with acquire() as conn:
+        row = await conn.fetchrow(_q("user_state"), user_id)
+
+    return UserState(
+        profile=tuple(row[:9]) if row[9] else None,
+        plan_count=row[10],
+        latest_week=row[11],
+        latest_plan=decode_plan(row[12]),
+        preferences=row[13] or "",
+    )
+
+
+@_or_sync(database.load_user_state)
+async def load_user_state(user_id) -> UserState:
+    return await _cached(user_id, "state", _fetch_user_state)
@@ -0,0 +1,123 @@
+import argparse
+import os
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from plan_check import PlanStreamCheck
+from profile_options import STATE_CITY_MAP, DIETS, WORKOUT_PLACES
+
+# Offline load test of the AI generation pipeline: response cache, rate
+# limiter, retries and request coalescing in front of a model backend.
+#
+#   python -m benchmarks.ai_pipeline                          stub backend
+#   python -m benchmarks.ai_pipeline --sessions 200 --concurrency 40
+#   python -m benchmarks.ai_pipeline --profiles 5 --failure-rate 0.2
+#   AI_BACKEND=replay AI_RECORD_DIR=ai_recordings python -m benchmarks.ai_pipeline
+#
+# Each session streams one first-plan prompt; --profiles controls how many
+# distinct prompts the sessions share, i.e. how much the cache and the
+# single-flight layer can save. AI_BACKEND defaults to stub here.
+
+
+def _prompt(rng):
+    state = rng.choice(list(STATE_CITY_MAP))
+    city = rng.choice(STATE_CITY_MAP[state])
+    return f"""
+ROLE: Certified Indian fitness coach and nutritionist.
+- Generate a COMPLETE 7-day workout plan AND 7-day diet plan
+- Diet MUST use foods commonly eaten in {city}, {state}
+- Budget limit: ₹{rng.randrange(100, 1001, 50)} per week
+- Diet preference: {rng.choice(DIETS)}
+- Workout place selected: {rng.choice(WORKOUT_PLACES)}
+"""
+
+
+def _session(prompt):
+    from ai_api import stream_ai
+
+    check = PlanStreamCheck()
+    start = time.perf_counter()
+    first = None
+    problem = None
+
+    for chunk in stream_ai(prompt, site="load_test"):
+        if first is None:
+            first = time.perf_counter() - start
+        if chunk.startswith("⚠️"):
+            problem = chunk
+            break
+        problem = check.feed(chunk)
+        if problem:
+            break
+    else:
+        problem = check.finish()
+
+    return first, time.perf_counter() - start, problem
+
+
+def _pct(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline AI pipeline load test")
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--profiles", type=int, default=20,
+                        help="distinct prompts shared by the sessions")
+    parser.add_argument("--latency", type=float, help="stub: seconds to first chunk")
+    parser.add_argument("--chunk-delay", type=float, help="stub: seconds between chunks")
+    parser.add_argument("--failure-rate", type=float, help="stub: share of calls that fail")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--metrics", action="store_true",
+                        help="also print the Prometheus text export")
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault("AI_BACKEND", "stub")
+    for name, value in (("AI_STUB_LATENCY", args.latency),
+                        ("AI_STUB_CHUNK_DELAY", args.chunk_delay),
+                        ("AI_STUB_FAILURE_RATE", args.failure_rate)):
+        if value is not None:
+            os.environ[name] = str(value)
+
+    import ai_api
+
+    rng = random.Random(args.seed)
+    profiles = [_prompt(rng) for _ in range(args.profiles)]
+    prompts = [rng.choice(profiles) for _ in range(args.sessions)]
+
+    print(f"== {ai_api.backend_name()} backend, {args.sessions} sessions, "
+          f"{args.concurrency} at a time, {args.profiles} distinct prompts ==")
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(_session, prompts))
+    elapsed = time.perf_counter() - start
+
+    firsts = [first for first, _, _ in results if first is not None]
+    totals = [total for _, total, _ in results]
+    failed = [problem for _, _, problem in results if problem]
+
+    print(f"wall time        {elapsed:8.2f} s   ({args.sessions / elapsed:,.1f} sessions/s)")
+    print(f"first chunk      p50 {_pct(firsts, 0.5):6.2f} s   p95 {_pct(firsts, 0.95):6.2f} s")
+    print(f"complete plan    p50 {_pct(totals, 0.5):6.2f} s   p95 {_pct(totals, 0.95):6.2f} s"
+          f"   mean {statistics.mean(totals):6.2f} s")
+    print(f"failed sessions  {len(failed)}")
+    for problem in sorted(set(failed)):
+        print(f"  {failed.count(problem):4d} × {problem}")
+
+    print("cache   ", ai_api.ai_cache_stats())
+    print("limiter ", ai_api.limiter_stats())
+    print("shared  ", ai_api.coalesce_stats())
+    print("breaker ", ai_api.breaker_stats())
+    if args.metrics:
+        print(ai_api.metrics_text())
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,117 @@
+import argparse
+import statistics
+import time
+
+from plan_codec import encode_plan, decode_plan
+from sample_plans import make_corpus
+
+# Size / latency report: raw TEXT plans vs plan_codec (zlib) BYTEA.
+#
+#   python -m benchmarks.plan_storage                 codec only, offline
+#   python -m benchmarks.plan_storage --db            + table size & fetch time
+#   python -m benchmarks.plan_storage -n 5000 --db
+
+
+def _timeit(fn, items, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            fn(item)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def codec_report(corpus, repeat):
+    raw = [p.encode("utf-8") for p in corpus]
+    packed = [encode_plan(p) for p in corpus]
+
+    raw_bytes = sum(len(b) for b in raw)
+    packed_bytes = sum(len(b) for b in packed)
+    ratios = [len(z) / len(r) for r, z in zip(raw, packed)]
+
+    enc = _timeit(encode_plan, corpus, repeat)
+    dec = _timeit(decode_plan, packed, repeat)
+    n = len(corpus)
+
+    print(f"plans:               {n}")
+    print(f"avg plan size:       {raw_bytes / n:,.0f} B raw -> {packed_bytes / n:,.0f} B stored")
+    print(f"total:               {raw_bytes / 1024:,.1f} KiB -> {packed_bytes / 1024:,.1f} KiB "
+          f"({packed_bytes / raw_bytes:.1%})")
+    print(f"per-plan ratio:      median {statistics.median(ratios):.1%}, "
+          f"worst {max(ratios):.1%}")
+    print(f"encode:              {1e6 * enc / n:,.1f} µs/plan")
+    print(f"decode:              {1e6 * dec / n:,.1f} µs/plan")
+
+
+def db_report(corpus, repeat):
+    import psycopg2
+    import psycopg2.extras
+    from database import get_connection
+
+    with get_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            CREATE TEMP TABLE bench_text (id SERIAL PRIMARY KEY, plan TEXT);
+            CREATE TEMP TABLE bench_z (id SERIAL PRIMARY KEY, plan_z BYTEA);
+            ALTER TABLE bench_z ALTER COLUMN plan_z SET STORAGE EXTERNAL;
+        """)
+        psycopg2.extras.execute_values(
+            cur, "INSERT INTO bench_text (plan) VALUES %s",
+            [(p,) for p in corpus]
+        )
+        psycopg2.extras.execute_values(
+            cur, "INSERT INTO bench_z (plan_z) VALUES %s",
+            [(psycopg2.Binary(encode_plan(p)),) for p in corpus]
+        )
+        cur.execute("ANALYZE bench_text; ANALYZE bench_z;")
+
+        for table, column, decode in (
+            ("bench_text", "plan", lambda v: v),
+            ("bench_z", "plan_z", decode_plan),
+        ):
+            cur.execute(
+                f"SELECT pg_total_relation_size('{table}'), "
+                f"SUM(pg_column_size({column})) FROM {table}"
+            )
+            total, stored = cur.fetchone()
+
+            def fetch_all():
+                cur.execute(f"SELECT {column} FROM {table}")
+                for (value,) in cur.fetchall():
+                    decode(value)
+
+            fetch = _timeit(lambda _: fetch_all(), [None], repeat)
+
+            print(f"{table:<12} table {total / 1024:,.0f} KiB, "
+                  f"column {stored / 1024:,.0f} KiB, "
+                  f"fetch+decode all {1000 * fetch:,.1f} ms")
+
+        # TEMP tables vanish with the rollback
+        conn.rollback()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plan storage size / latency report")
+    parser.add_argument("-n", type=int, default=2000, help="plans in the corpus")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db", action="store_true",
+                        help="also measure table size and fetch time in Postgres")
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.n, args.seed)
+
+    print("== codec ==")
+    codec_report(corpus, args.repeat)
+
+    if args.db:
+        from database import backend_name
+        if backend_name() != "postgres":
+            print(f"\n--db measures Postgres storage; DB_BACKEND is {backend_name()!r}")
+            return
+        print("\n== postgres ==")
+        db_report(corpus, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
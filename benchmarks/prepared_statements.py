@@ -0,0 +1,110 @@
+import argparse
+import random
+import time
+
+from plan_codec import encode_plan
+from plan_model import plan_to_json
+from repository import SQLiteRepository
+from sample_plans import make_plan
+
+# Per-call cost of ad-hoc statement text vs the prepared registry
+# (statements.py) on the hottest request-path statements.
+#
+#   python -m benchmarks.prepared_statements             current DB_BACKEND
+#   python -m benchmarks.prepared_statements -n 5000
+#   python -m benchmarks.prepared_statements --sqlite    offline, in memory
+#
+# Postgres: one pooled connection, cursor.execute(text) (parse + plan on
+# every call) vs PREPARE once + EXECUTE by name; everything runs in one
+# transaction that is rolled back. SQLite: a connection with its statement
+# cache disabled vs one that keeps the whole registry compiled.
+
+CASES = ["login", "profile_upsert", "plan_upsert", "progress_insert"]
+
+
+def _setup(repo, cur):
+    repo.execute(cur, "user_insert", ("bench-user", "x"))
+    repo.execute(cur, "login", ("bench-user", "x"))
+    uid = cur.fetchone()[0]
+    plan = make_plan(random.Random(1))
+
+    return {
+        "login": ("bench-user", "x"),
+        "profile_upsert": (uid, 25, 170.0, 70.0, "Goa", "Panaji", "Fat Loss",
+                           "Vegetarian", "Home", 500),
+        "plan_upsert": (uid, 1, encode_plan(plan), len(plan), plan_to_json(plan)),
+        "progress_insert": (uid, 2, 70.0, "Just Right"),
+    }
+
+
+def _time(cur, call, n):
+    for _ in range(min(50, n)):
+        call()
+        if cur.description:
+            cur.fetchall()
+
+    start = time.perf_counter()
+    for _ in range(n):
+        call()
+        if cur.description:
+            cur.fetchall()
+    return (time.perf_counter() - start) / n
+
+
+def _report(name, adhoc, prepared):
+    saved = adhoc - prepared
+    print(f"{name:<16} ad-hoc {1e6 * adhoc:8.1f} µs   prepared {1e6 * prepared:8.1f} µs"
+          f"   saved {1e6 * saved:7.1f} µs/call ({saved / adhoc:.0%})")
+
+
+def run_postgres(repo, n):
+    # Never committed: the pool rolls the transaction back on return
+    with repo.transaction() as cur:
+        params = _setup(repo, cur)
+
+        for name in CASES:
+            text = repo.statements[name].text
+            adhoc = _time(cur, lambda: cur.execute(text, params[name]), n)
+            prepared = _time(cur, lambda: repo.execute(cur, name, params[name]), n)
+            _report(name, adhoc, prepared)
+
+        print(f"prepared on this connection: {sorted(cur.connection.prepared)}")
+
+
+def run_sqlite(n):
+    results = {}
+    for label, repo in (("adhoc", SQLiteRepository(":memory:", cached_statements=0)),
+                        ("prepared", SQLiteRepository(":memory:"))):
+        with repo.transaction(write=True) as cur:
+            params = _setup(repo, cur)
+            for name in CASES:
+                results[label, name] = _time(
+                    cur, lambda: repo.execute(cur, name, params[name]), n
+                )
+        repo.close()
+
+    for name in CASES:
+        _report(name, results["adhoc", name], results["prepared", name])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prepared statement micro-benchmark")
+    parser.add_argument("-n", type=int, default=2000, help="calls per statement")
+    parser.add_argument("--sqlite", action="store_true",
+                        help="use an in-memory SQLite database, whatever DB_BACKEND says")
+    args = parser.parse_args()
+
+    if not args.sqlite:
+        from database import get_repository
+        repo = get_repository()
+        if repo.name == "postgres":
+            print(f"== postgres, {args.n} calls each ==")
+            run_postgres(repo, args.n)
+            return
+
+    print(f"== sqlite (in memory), {args.n} calls each ==")
+    run_sqlite(args.n)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+import argparse
+import statistics
+import time
+
+from plan_summary import estimate_tokens, summarize_plans
+from sample_plans import make_corpus
+
+# Week-N prompt input: whole previous plans vs the plan_summary list of
+# exercises and meals they used (~4 characters per token, as ai_api
+# estimates quota).
+#
+#   python -m benchmarks.prompt_tokens
+#   python -m benchmarks.prompt_tokens -n 1000 --weeks 3
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Week-N prompt token estimate")
+    parser.add_argument("-n", type=int, default=500, help="users to simulate")
+    parser.add_argument("--weeks", type=int, default=3,
+                        help="report for 1..weeks previous plans")
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.n * args.weeks)
+    users = [corpus[i:i + args.weeks] for i in range(0, len(corpus), args.weeks)]
+
+    print(f"{'plans':>5} {'full plans':>12} {'summary':>9} {'saved':>7} {'summarize':>11}")
+    for k in range(1, args.weeks + 1):
+        full, short, took = [], [], []
+        for plans in users:
+            start = time.perf_counter()
+            summary = summarize_plans(plans[:k])
+            took.append(time.perf_counter() - start)
+
+            full.append(estimate_tokens("\n\n".join(plans[:k])))
+            short.append(estimate_tokens(summary))
+
+        before, after = statistics.mean(full), statistics.mean(short)
+        print(f"{k:>5} {before:>8,.0f} tok {after:>5,.0f} tok {1 - after / before:>6.0%}"
+              f" {1e6 * statistics.mean(took):>8.0f} µs")
+
+
+if __name__ == "__main__":
+    main()
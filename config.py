@@ -0,0 +1,27 @@
+import os
+
+import streamlit as st
+
+# Settings: environment variable first, then .streamlit/secrets.toml.
+# The environment wins so a load test or benchmark can switch e.g.
+# DB_BACKEND=sqlite on one machine without editing the secrets file.
+
+_REQUIRED = object()
+
+
+def get_setting(name, default=_REQUIRED):
+    value = os.environ.get(name)
+    if value is not None:
+        return value
+
+    try:
+        value = st.secrets.get(name)
+    except Exception:
+        # No secrets.toml at all (CLI tools, offline runs)
+        value = None
+
+    if value is not None:
+        return value
+    if default is _REQUIRED:
+        raise KeyError(f"Missing setting: {name}")
+    return default
@@ -1,154 +1,602 @@
-import psycopg2
-import streamlit as st
-
-# ---------------- CONNECTION ----------------
-
-def get_connection():
-    return psycopg2.connect(
-        host=st.secrets["DB_HOST"],
-        database=st.secrets["DB_NAME"],
-        user=st.secrets["DB_USER"],
-        password=st.secrets["DB_PASSWORD"],
-        port=st.secrets["DB_PORT"],
-        sslmode="require"
-    )
-
-# ---------------- USERS ----------------
-
-def delete_user(uid):
-    conn = get_connection()
-    cur = conn.cursor()
-
-    tables = ["plans", "plan_versions", "chats", "progress", "preferences"]
-
-    for t in tables:
-        cur.execute(f"DELETE FROM {t} WHERE user_id=%s", (uid,))
-
-    cur.execute("DELETE FROM users WHERE id=%s", (uid,))
-    conn.commit()
-
-    cur.close()
-    conn.close()
-
-# ---------------- PLANS ----------------
-
-def get_plan_history(user_id):
-    conn = get_connection()
-    cur = conn.cursor()
-
-    cur.execute("""
-        SELECT id, week, plan, timestamp
-        FROM plans
-        WHERE user_id=%s
-        ORDER BY week DESC
-    """, (user_id,))
-
-    rows = cur.fetchall()
-
-    cur.close()
-    conn.close()
-    return rows
-
-def delete_plan(plan_id):
-    conn = get_connection()
-    cur = conn.cursor()
-
-    cur.execute("SELECT user_id, week FROM plans WHERE id=%s", (plan_id,))
-    row = cur.fetchone()
-
-    if row:
-        user_id, week = row
-        cur.execute("DELETE FROM plans WHERE id=%s", (plan_id,))
-        cur.execute(
-            "DELETE FROM progress WHERE user_id=%s AND week=%s",
-            (user_id, week)
-        )
-        conn.commit()
-
-    cur.close()
-    conn.close()
-
-# ---------------- USERS LIST ----------------
-
-def get_all_users():
-    conn = get_connection()
-    cur = conn.cursor()
-
-    cur.execute("SELECT id, username FROM users ORDER BY username")
-    rows = cur.fetchall()
-
-    cur.close()
-    conn.close()
-    return rows
-
-# ---------------- PROFILE ----------------
-
-def get_user_profile(user_id):
-    conn = get_connection()
-    cur = conn.cursor()
-
-    cur.execute("""
-        SELECT age, height, weight, state, city, goal,
-               diet, workout_place, budget
-        FROM user_profile
-        WHERE user_id=%s
-    """, (user_id,))
-
-    row = cur.fetchone()
-
-    cur.close()
-    conn.close()
-    return row
-
-def upsert_user_profile(
-    user_id, age, height, weight,
-    state, city, goal, diet, workout_place, budget
-):
-    conn = get_connection()
-    cur = conn.cursor()
-
-    cur.execute("""
-        INSERT INTO user_profile
-        (user_id, age, height, weight, state, city,
-         goal, diet, workout_place, budget)
-        VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
-        ON CONFLICT (user_id)
-        DO UPDATE SET
-            age=EXCLUDED.age,
-            height=EXCLUDED.height,
-            weight=EXCLUDED.weight,
-            state=EXCLUDED.state,
-            city=EXCLUDED.city,
-            goal=EXCLUDED.goal,
-            diet=EXCLUDED.diet,
-            workout_place=EXCLUDED.workout_place,
-            budget=EXCLUDED.budget
-    """, (
-        user_id, age, height, weight,
-        state, city, goal, diet, workout_place, budget
-    ))
-
-    conn.commit()
-    cur.close()
-    conn.close()
-
-# ---------------- PROGRESS ----------------
-
-def get_user_progress(user_id):
-    conn = get_connection()
-    cur = conn.cursor()
-
-    cur.execute("""
-        SELECT week, weight, difficulty, timestamp
-        FROM progress
-        WHERE user_id=%s
-        ORDER BY week ASC
-    """, (user_id,))
-
-    rows = cur.fetchall()
-
-    cur.close()
-    conn.close()
-    return rows
-
-
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.extensions
+import streamlit as st
+from config import get_setting
+from repository import (
+    PostgresRepository, SQLiteRepository, UserState, GenerationJob, run_flow, stale_cutoff,
+)
+
+# ---------------- CONNECTION POOL ----------------
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool shared by every session of the server.
+
+    Idle connections are re-used LIFO, pinged after `idle_check` seconds
+    of inactivity and recycled once they are older than `max_lifetime`.
+    """
+
+    def __init__(self, connect, maxconn=10, max_lifetime=1800,
+                 idle_check=30, timeout=10):
+        self._connect = connect
+        self.maxconn = maxconn
+        self.max_lifetime = max_lifetime
+        self.idle_check = idle_check
+        self.timeout = timeout
+
+        self._cond = threading.Condition()
+        self._idle = deque()      # (conn, created_at, last_used)
+        self._born = {}           # id(conn) -> created_at, checked-out only
+        self._size = 0
+
+        self._created = 0
+        self._recycled = 0
+        self._broken = 0
+        self._acquired = 0
+        self._timeouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def getconn(self):
+        start = time.monotonic()
+        deadline = start + self.timeout
+        conn = born = last_used = None
+
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn, born, last_used = self._idle.pop()
+                    break
+                if self._size < self.maxconn:
+                    self._size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(
+                        f"No database connection free after {self.timeout}s"
+                    )
+                self._cond.wait(remaining)
+
+        # Health check / creation happen outside the lock, the slot is ours
+        if conn is not None and not self._healthy(conn, born, last_used):
+            self._close(conn)
+            conn = None
+
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            born = time.monotonic()
+            with self._cond:
+                self._created += 1
+
+        waited = time.monotonic() - start
+        with self._cond:
+            self._born[id(conn)] = born
+            self._acquired += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+
+        return conn
+
+    def putconn(self, conn, discard=False):
+        now = time.monotonic()
+
+        if not discard and not conn.closed:
+            status = conn.get_transaction_status()
+            if status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    discard = True
+
+        with self._cond:
+            born = self._born.pop(id(conn), None)
+            expired = born is None or now - born > self.max_lifetime
+            if expired and not discard:
+                self._recycled += 1
+
+            if discard or expired or conn.closed:
+                self._size -= 1
+                keep = False
+            else:
+                self._idle.append((conn, born, now))
+                keep = True
+            self._cond.notify()
+
+        if not keep:
+            self._close(conn)
+
+    def _healthy(self, conn, born, last_used):
+        now = time.monotonic()
+
+        if conn.closed:
+            self._count("_broken")
+            return False
+
+        if now - born > self.max_lifetime:
+            self._count("_recycled")
+            return False
+
+        if now - last_used > self.idle_check:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                conn.rollback()
+            except psycopg2.Error:
+                self._count("_broken")
+                return False
+
+        return True
+
+    def _count(self, name):
+        with self._cond:
+            setattr(self, name, getattr(self, name) + 1)
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def stats(self):
+        with self._cond:
+            idle = len(self._idle)
+            return {
+                "size": self._size,
+                "max_size": self.maxconn,
+                "idle": idle,
+                "checked_out": self._size - idle,
+                "connections_created": self._created,
+                "connections_recycled": self._recycled,
+                "connections_broken": self._broken,
+                "acquisitions": self._acquired,
+                "timeouts": self._timeouts,
+                "wait_avg_ms": round(
+                    1000 * self._wait_total / self._acquired, 2
+                ) if self._acquired else 0.0,
+                "wait_max_ms": round(1000 * self._wait_max, 2),
+            }
+
+    def closeall(self):
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+            self._size -= len(idle)
+        for conn, _, _ in idle:
+            self._close(conn)
+
+
+class PreparedConnection(psycopg2.extensions.connection):
+    """Connection that remembers which registry statements its session
+    has PREPAREd (see statements.py / PostgresRepository)."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+
+def _connect():
+    return psycopg2.connect(
+        connection_factory=PreparedConnection,
+        host=get_setting("DB_HOST"),
+        database=get_setting("DB_NAME"),
+        user=get_setting("DB_USER"),
+        password=get_setting("DB_PASSWORD"),
+        port=get_setting("DB_PORT"),
+        sslmode="require"
+    )
+
+
+@st.cache_resource
+def get_pool():
+    return ConnectionPool(
+        _connect,
+        maxconn=int(get_setting("DB_POOL_SIZE", 10)),
+        max_lifetime=int(get_setting("DB_POOL_MAX_LIFETIME", 1800)),
+        idle_check=int(get_setting("DB_POOL_IDLE_CHECK", 30)),
+        timeout=float(get_setting("DB_POOL_TIMEOUT", 10)),
+    )
+
+# ---------------- CONNECTION ----------------
+
+@contextmanager
+def get_connection():
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        yield conn
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        # Connection-level failure: never hand this one out again
+        pool.putconn(conn, discard=True)
+        raise
+    except BaseException:
+        pool.putconn(conn)
+        raise
+    else:
+        pool.putconn(conn)
+
+
+def pool_stats():
+    return get_pool().stats()
+
+# ---------------- BACKEND ----------------
+
+@st.cache_resource
+def get_repository():
+    # DB_BACKEND = "postgres" (default) or "sqlite" for a local file
+    backend = get_setting("DB_BACKEND", "postgres")
+    if backend == "sqlite":
+        return SQLiteRepository(get_setting("SQLITE_PATH", "fitai.db"))
+    if backend == "postgres":
+        # DB_PREPARE=0 behind a transaction-pooling PgBouncer
+        prepare = str(get_setting("DB_PREPARE", "1")).lower() not in ("0", "false", "no")
+        return PostgresRepository(get_connection, prepare=prepare)
+    raise ValueError(f"Unknown DB_BACKEND: {backend!r}")
+
+
+def backend_name():
+    return get_repository().name
+
+# ---------------- READ-THROUGH CACHE ----------------
+
+class UserCache:
+    """Per-user TTL + LRU cache for read paths that Streamlit reruns hit.
+
+    Entries are keyed by (user_id, kind, args). Writers drop exactly the
+    kinds they change; a per-user generation stops a slow read from
+    re-populating data that was invalidated while it was in flight.
+    """
+
+    def __init__(self, maxsize=2048, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        self._data = OrderedDict()   # key -> (expires_at, value)
+        self._by_user = {}           # user_id -> set(keys)
+        self._gen = {}               # user_id -> generation
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._invalidations = 0
+
+    def get(self, user_id, kind, args=()):
+        key = (user_id, kind, args)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self._misses += 1
+                return False, None
+
+            expires_at, value = entry
+            if expires_at <= now:
+                self._drop(key)
+                self._expirations += 1
+                self._misses += 1
+                return False, None
+
+            self._data.move_to_end(key)
+            self._hits += 1
+            return True, value
+
+    def generation(self, user_id):
+        with self._lock:
+            return self._gen.get(user_id, 0)
+
+    def put(self, user_id, kind, args, value, generation):
+        key = (user_id, kind, args)
+
+        with self._lock:
+            if self._gen.get(user_id, 0) != generation:
+                return
+
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            self._by_user.setdefault(user_id, set()).add(key)
+
+            while len(self._data) > self.maxsize:
+                oldest = next(iter(self._data))
+                self._drop(oldest)
+                self._evictions += 1
+
+    def invalidate(self, user_id, *kinds):
+        # No kinds means everything cached for this user
+        with self._lock:
+            self._gen[user_id] = self._gen.get(user_id, 0) + 1
+
+            for key in list(self._by_user.get(user_id, ())):
+                if not kinds or key[1] in kinds:
+                    self._drop(key)
+                    self._invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            for user_id in self._by_user:
+                self._gen[user_id] = self._gen.get(user_id, 0) + 1
+            self._data.clear()
+            self._by_user.clear()
+
+    def _drop(self, key):
+        self._data.pop(key, None)
+        keys = self._by_user.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[key[0]]
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._data),
+                "max_entries": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 3) if lookups else 0.0,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+                "invalidations": self._invalidations,
+            }
+
+
+@st.cache_resource
+def get_user_cache():
+    return UserCache(
+        maxsize=int(get_setting("DB_CACHE_SIZE", 2048)),
+        ttl=float(get_setting("DB_CACHE_TTL", 300)),
+    )
+
+
+def _cached(user_id, kind, loader, *args):
+    cache = get_user_cache()
+
+    found, value = cache.get(user_id, kind, args)
+    if found:
+        return value
+
+    generation = cache.generation(user_id)
+    value = loader(user_id, *args)
+    cache.put(user_id, kind, args, value, generation)
+    return value
+
+
+def invalidate_user(user_id, *kinds):
+    get_user_cache().invalidate(user_id, *kinds)
+
+
+def cache_stats():
+    return get_user_cache().stats()
+
+# ---------------- USERS ----------------
+
+def delete_user(uid):
+    get_repository().delete_user(uid)
+    invalidate_user(uid)
+
+def get_all_users():
+    return get_repository().get_all_users()
+
+# ---------------- BULK PURGE ----------------
+
+def count_inactive_users(cutoff):
+    return get_repository().count_inactive_users(cutoff)
+
+def find_inactive_users(cutoff, after_id=0, limit=500):
+    # Keyset page over users with no plan or progress since `cutoff`
+    return get_repository().find_inactive_users(cutoff, after_id, limit)
+
+def purge_flow(user_ids, inactive_before, batch_size, pause, on_progress):
+    """purge_users as a shared flow (see repository.run_flow).
+
+    Yields "count", "find" (a keyset page of inactive ids), "delete" and
+    "pause" ops; returns the number of users deleted.
+    """
+    if (user_ids is None) == (inactive_before is None):
+        raise ValueError("pass exactly one of user_ids or inactive_before")
+
+    if user_ids is not None:
+        ids = sorted(set(user_ids))
+        total = len(ids)
+        chunks = (ids[i:i + batch_size] for i in range(0, total, batch_size))
+    else:
+        total = yield "count", inactive_before
+        chunks = None
+
+    deleted = 0
+    after_id = 0
+    while True:
+        if chunks is not None:
+            chunk = next(chunks, None)
+        else:
+            chunk = yield "find", inactive_before, after_id, batch_size
+        if not chunk:
+            return deleted
+        after_id = chunk[-1]
+
+        deleted += yield "delete", chunk
+
+        for uid in chunk:
+            invalidate_user(uid)
+
+        if on_progress:
+            on_progress(deleted, total)
+        if pause:
+            yield "pause", pause
+
+def purge_users(user_ids=None, inactive_before=None, batch_size=500,
+                pause=0.0, on_progress=None):
+    """Delete many users in short, bounded transactions.
+
+    Pass either an id list or an inactivity cutoff. Each chunk of
+    `batch_size` users is one DELETE + COMMIT, so locks are held briefly
+    and WAL is flushed incrementally; `pause` seconds between chunks lets
+    replicas / autovacuum keep up. `on_progress(deleted, total)` is
+    called after every chunk. Returns the number of users deleted.
+    """
+    return run_flow(purge_flow(user_ids, inactive_before, batch_size, pause, on_progress), {
+        "count": count_inactive_users,
+        "find": find_inactive_users,
+        "delete": get_repository().delete_users,
+        "pause": time.sleep,
+    })
+
+# ---------------- PLANS ----------------
+
+PLAN_KINDS = ("plan_history", "plan_index", "plan_versions", "state")
+
+def get_plan_history(user_id):
+    return _cached(user_id, "plan_history", get_repository().get_plan_history)
+
+def get_plan_index(user_id, before_week=None, limit=10):
+    """One page of (id, week, timestamp, length) rows, newest week first.
+
+    Keyset paginated on week: pass the returned cursor as `before_week`
+    to get the next page; the cursor is None on the last page.
+    """
+    if before_week is None:
+        before_week = 2 ** 31 - 1
+    return _cached(user_id, "plan_index", get_repository().get_plan_index,
+                   before_week, limit)
+
+def get_plan_body(plan_id):
+    return get_repository().get_plan_body(plan_id)
+
+def get_plan_model(plan_id):
+    """The plan as a plan_model.Plan (days, exercises, meals), or None."""
+    return get_repository().get_plan_model(plan_id)
+
+def save_plan(user_id, week, plan, note="generated"):
+    # Insert or replace the plan for the SAME week
+    get_repository().save_plan(user_id, week, plan, note)
+    invalidate_user(user_id, *PLAN_KINDS)
+
+def update_plan(user_id, week, plan, note="chat edit"):
+    get_repository().update_plan(user_id, week, plan, note)
+    invalidate_user(user_id, *PLAN_KINDS)
+
+def delete_plan(plan_id):
+    row = get_repository().delete_plan(plan_id)
+    if row:
+        invalidate_user(row[0], *PLAN_KINDS, "progress")
+
+def compress_plans(batch_size=200, pause=0.0, on_progress=None):
+    """Background migration: move legacy text plans into plan_z.
+
+    Works in small id-ordered batches, one short transaction each, and
+    skips rows a live write has already converted. Returns rows converted.
+    """
+    repo = get_repository()
+    total = repo.count_legacy_plans()
+
+    done = 0
+    after_id = 0
+    while True:
+        ids = repo.compress_legacy_plans(after_id, batch_size)
+        if not ids:
+            break
+
+        done += len(ids)
+        after_id = ids[-1]
+
+        if on_progress:
+            on_progress(done, total)
+        if pause:
+            time.sleep(pause)
+
+    # Cached histories may still hold the pre-migration rows; bodies are
+    # identical, so there is nothing to invalidate.
+    return done
+
+# ---------------- PLAN VERSIONS ----------------
+
+def list_plan_versions(user_id, week):
+    """(version, is_snapshot, stored_bytes, note, timestamp), newest first."""
+    return _cached(user_id, "plan_versions", get_repository().list_plan_versions, week)
+
+def get_plan_version(user_id, week, version):
+    return get_repository().get_plan_version(user_id, week, version)
+
+def rollback_plan(user_id, week, version):
+    """Make `version` current again, recorded as a new version on top."""
+    text = get_repository().rollback_plan(user_id, week, version)
+    invalidate_user(user_id, *PLAN_KINDS)
+    return text
+
+# ---------------- PROFILE ----------------
+
+def get_user_profile(user_id):
+    return _cached(user_id, "profile", get_repository().get_user_profile)
+
+def upsert_user_profile(
+    user_id, age, height, weight,
+    state, city, goal, diet, workout_place, budget
+):
+    get_repository().upsert_user_profile(
+        user_id, age, height, weight,
+        state, city, goal, diet, workout_place, budget
+    )
+    invalidate_user(user_id, "profile", "state")
+
+# ---------------- PROGRESS ----------------
+
+def get_user_progress(user_id):
+    return _cached(user_id, "progress", get_repository().get_user_progress)
+
+def record_progress(user_id, week, weight, difficulty):
+    # Weekly check-in also moves the profile weight forward
+    get_repository().record_progress(user_id, week, weight, difficulty)
+    invalidate_user(user_id, "progress", "profile", "state")
+
+# ---------------- PREFERENCES ----------------
+
+def save_preferences(user_id, preferences):
+    get_repository().save_preferences(user_id, preferences)
+    invalidate_user(user_id, "state")
+
+# ---------------- GENERATION JOBS ----------------
+
+def create_job(user_id, week, kind, stale_after=600):
+    """Queue a job unless one is active for (user_id, week); (job_id, created).
+
+    An active job untouched for `stale_after` seconds was left behind by a
+    process that died and no longer blocks a new one.
+    """
+    return get_repository().create_job(user_id, week, kind, stale_cutoff(stale_after))
+
+def update_job(job_id, status, result=None, error=None):
+    get_repository().update_job(job_id, status, result, error)
+
+def touch_jobs(job_ids):
+    # Keeps queued / running jobs from being expired as stale
+    get_repository().touch_jobs(job_ids)
+
+def get_job(job_id) -> GenerationJob:
+    return get_repository().get_job(job_id)
+
+def get_latest_job(user_id, week) -> GenerationJob:
+    return get_repository().get_latest_job(user_id, week)
+
+# ---------------- SESSION STATE ----------------
+
+def load_user_state(user_id) -> UserState:
+    # Everything a dashboard rerun needs, in one round trip (or none)
+    return _cached(user_id, "state", get_repository().load_user_state)
@@ -0,0 +1,62 @@
+import streamlit as st
+from datetime import timedelta
+from database import get_plan_index, get_plan_body
+
+PAGE_SIZE = 10
+
+# ---------------- PLAN BODIES (PER SESSION) ----------------
+
+def _plan_body(plan_id, ts):
+    # Keyed on timestamp too: chat edits bump it, so stale bodies miss
+    bodies = st.session_state.setdefault("plan_bodies", {})
+    key = (plan_id, ts)
+
+    if key not in bodies:
+        bodies[key] = get_plan_body(plan_id)
+
+    return bodies[key]
+
+# ---------------- HISTORY LIST ----------------
+
+def render_plan_history(user_id, key, actions=None, page_size=PAGE_SIZE):
+    """Lazily rendered, keyset-paginated plan history.
+
+    Only the lightweight index is fetched per rerun; a plan body is
+    loaded the first time its "Show plan" toggle is switched on.
+    `actions(plan_id, week)` renders extra controls inside each entry.
+    Returns False when the user has no plans at all.
+    """
+    cursors = st.session_state.setdefault(f"{key}_cursors_{user_id}", [None])
+    rows, next_cursor = get_plan_index(user_id, cursors[-1], page_size)
+
+    if not rows:
+        if len(cursors) > 1:
+            # Current page emptied (e.g. deletions) → step back
+            cursors.pop()
+            st.rerun()
+        return False
+
+    for plan_id, week, ts, length in rows:
+        ist_time = ts + timedelta(hours=5, minutes=30)
+        size = f" · {length:,} chars" if length else ""
+
+        with st.expander(f"🗓️ Week {week} — {ist_time.strftime('%d %b %Y, %I:%M %p')}{size}"):
+            if st.toggle("Show plan", key=f"{key}_show_{plan_id}"):
+                st.markdown(_plan_body(plan_id, ts) or "_Plan not found._")
+
+            if actions:
+                actions(plan_id, week)
+
+    col1, col2 = st.columns(2)
+
+    with col1:
+        if len(cursors) > 1 and st.button("⬅️ Newer weeks", key=f"{key}_newer"):
+            cursors.pop()
+            st.rerun()
+
+    with col2:
+        if next_cursor is not None and st.button("Older weeks ➡️", key=f"{key}_older"):
+            cursors.append(next_cursor)
+            st.rerun()
+
+    return True
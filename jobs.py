@@ -0,0 +1,231 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+from config import get_setting
+from database import create_job, update_job, touch_jobs, get_job
+
+# Plan generation off the Streamlit script thread.
+#
+# A button press submits a job and returns at once; a worker from a
+# fixed-size pool makes the model calls, saves the plan and records the
+# outcome in generation_jobs, and the page polls until it is finished.
+#
+# One job per (user_id, week) is queued or running at a time: submitting
+# again returns the job already under way, so a double click or a
+# reconnecting browser never pays for a second plan. The work itself
+# lives in this process; rows a dead process left queued / running are
+# failed as "interrupted" once they go stale (see database.create_job).
+# A live process keeps its rows fresh: every stage change and a periodic
+# heartbeat over all of its queued / running jobs touch updated_at, so a
+# long queue or a slow model call is never mistaken for a dead process.
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+ACTIVE = (QUEUED, RUNNING)
+
+
+def _touch(job_ids):
+    try:
+        touch_jobs(job_ids)
+    except Exception as e:
+        # A missed beat only matters if every later one fails too
+        print("Job heartbeat error:", e)
+
+
+class JobFailed(Exception):
+    """Raised by a job body; the message is shown to the user as-is."""
+
+
+class Job:
+    """A job as seen by the page: its status plus live progress.
+
+    `stage` and `text` (the plan streamed so far) exist only in the
+    process running it; a job loaded from the database has neither.
+    """
+
+    def __init__(self, id, user_id, week, kind, status=QUEUED,
+                 result=None, error=None):
+        self.id = id
+        self.user_id = user_id
+        self.week = week
+        self.kind = kind
+        self.status = status
+        self.result = result
+        self.error = error
+        self.stage = "Waiting for a free worker..."
+        self.text = ""
+
+    @classmethod
+    def from_row(cls, row):
+        job = cls(row.id, row.user_id, row.week, row.kind, row.status,
+                  row.result, row.error)
+        job.stage = ""
+        return job
+
+    @property
+    def active(self):
+        return self.status in ACTIVE
+
+    def update(self, stage=None, text=None):
+        # Called from the worker; the page only ever reads
+        if stage is not None and stage != self.stage:
+            self.stage = stage
+            _touch([self.id])
+        if text is not None:
+            self.text = text
+
+
+class JobQueue:
+    def __init__(self, workers=4, stale_after=600, keep=500, heartbeat=None):
+        self.workers = workers
+        self.stale_after = stale_after
+        self.keep = keep
+        # Several beats per stale_after, so one slow write can't expire a job
+        self.heartbeat = heartbeat or stale_after / 4
+
+        self._pool = ThreadPoolExecutor(max_workers=workers,
+                                        thread_name_prefix="plan-job")
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()   # job_id -> Job, finished ones trimmed to `keep`
+        self._active = {}            # (user_id, week) -> Job
+        self._beating = None         # heartbeat thread, started with the first job
+
+        self._submitted = 0
+        self._deduplicated = 0
+        self._done = 0
+        self._failed = 0
+        self._run_total = 0.0
+        self._run_max = 0.0
+
+    def submit(self, user_id, week, kind, body):
+        """Run body(job) on a worker; returns the Job for (user_id, week).
+
+        body returns the finished plan or raises JobFailed. If a job for
+        the same week is already queued or running, that job is returned
+        and `body` is dropped.
+        """
+        key = (user_id, week)
+
+        with self._lock:
+            job = self._active.get(key)
+            if job is not None:
+                self._deduplicated += 1
+                return job
+
+        # Outside the lock: one slow insert must not hold up every other
+        # submission. Two racing submits for the same week are settled by
+        # the database's one-active-job-per-week index.
+        job_id, created = create_job(user_id, week, kind, self.stale_after)
+        if not created:
+            # Another session or server process is generating this week
+            with self._lock:
+                self._deduplicated += 1
+            return self.get(job_id)
+
+        job = Job(job_id, user_id, week, kind)
+        with self._lock:
+            self._jobs[job_id] = job
+            self._active[key] = job
+            self._submitted += 1
+            if self._beating is None:
+                self._beating = threading.Thread(target=self._beat, daemon=True,
+                                                 name="plan-job-heartbeat")
+                self._beating.start()
+
+        self._pool.submit(self._run, job, body)
+        return job
+
+    def _run(self, job, body):
+        start = time.monotonic()
+        try:
+            job.status = RUNNING
+            update_job(job.id, RUNNING)
+            job.result = body(job)
+            job.status = DONE
+        except JobFailed as e:
+            job.error = str(e)
+            job.status = FAILED
+        except Exception as e:
+            job.error = f"❌ Plan generation failed ({type(e).__name__}). Please try again."
+            job.status = FAILED
+
+        try:
+            update_job(job.id, job.status, job.result, job.error)
+        finally:
+            elapsed = time.monotonic() - start
+            with self._lock:
+                self._active.pop((job.user_id, job.week), None)
+                if job.status == DONE:
+                    self._done += 1
+                else:
+                    self._failed += 1
+                self._run_total += elapsed
+                self._run_max = max(self._run_max, elapsed)
+                self._trim()
+
+    def _beat(self):
+        while True:
+            time.sleep(self.heartbeat)
+            with self._lock:
+                job_ids = [job.id for job in self._active.values()]
+            if job_ids:
+                _touch(job_ids)
+
+    def _trim(self):
+        extra = len(self._jobs) - self.keep
+        for job_id in list(self._jobs):
+            if extra <= 0:
+                break
+            if not self._jobs[job_id].active:
+                del self._jobs[job_id]
+                extra -= 1
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job
+        row = get_job(job_id)
+        return Job.from_row(row) if row else None
+
+    def active_for(self, user_id):
+        """The job this process is running for a user, if any."""
+        with self._lock:
+            return next((job for (uid, _), job in self._active.items()
+                         if uid == user_id), None)
+
+    def stats(self):
+        with self._lock:
+            finished = self._done + self._failed
+            running = sum(job.status == RUNNING for job in self._active.values())
+            return {
+                "workers": self.workers,
+                "queued": len(self._active) - running,
+                "running": running,
+                "submitted": self._submitted,
+                "deduplicated": self._deduplicated,
+                "done": self._done,
+                "failed": self._failed,
+                "run_avg_s": round(self._run_total / finished, 2) if finished else 0.0,
+                "run_max_s": round(self._run_max, 2),
+            }
+
+
+@st.cache_resource
+def get_jobs():
+    # JOB_WORKERS bounds how many plans are generated at once per process;
+    # each job may itself stream two halves in parallel
+    return JobQueue(
+        workers=int(get_setting("JOB_WORKERS", 4)),
+        stale_after=float(get_setting("JOB_STALE_AFTER", 600)),
+    )
+
+
+def job_stats():
+    return get_jobs().stats()
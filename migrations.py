@@ -0,0 +1,396 @@
+import argparse
+import sys
+
+from database import get_connection, compress_plans, backend_name
+from repository import PostgresRepository
+from statements import compile_statements
+
+# Usage:
+#   python migrations.py upgrade   apply pending migrations
+#   python migrations.py status    list applied / pending versions
+#   python migrations.py check     EXPLAIN every hot query, fail on Seq Scan
+#   python migrations.py compress-plans   background-convert text plans
+
+# ---------------- MIGRATIONS ----------------
+
+# (version, name, sql). Append only: never edit a migration once shipped.
+# Every statement is idempotent so a partially migrated database
+# (e.g. one created by hand before this file existed) upgrades cleanly.
+MIGRATIONS = [
+    (1, "core tables", """
+        CREATE TABLE IF NOT EXISTS users (
+            id SERIAL PRIMARY KEY,
+            username TEXT NOT NULL UNIQUE,
+            password_hash TEXT NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS user_profile (
+            user_id INTEGER PRIMARY KEY REFERENCES users(id),
+            age INTEGER,
+            height REAL,
+            weight REAL,
+            state TEXT,
+            city TEXT,
+            goal TEXT,
+            diet TEXT,
+            workout_place TEXT,
+            budget INTEGER
+        );
+
+        CREATE TABLE IF NOT EXISTS plans (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER NOT NULL REFERENCES users(id),
+            week INTEGER NOT NULL,
+            plan TEXT,
+            timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (user_id, week)
+        );
+
+        CREATE TABLE IF NOT EXISTS progress (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER NOT NULL REFERENCES users(id),
+            week INTEGER NOT NULL,
+            weight REAL,
+            difficulty TEXT,
+            timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+
+        CREATE TABLE IF NOT EXISTS preferences (
+            user_id INTEGER NOT NULL REFERENCES users(id),
+            key TEXT NOT NULL,
+            value TEXT,
+            PRIMARY KEY (user_id, key)
+        );
+
+        CREATE TABLE IF NOT EXISTS chats (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER NOT NULL REFERENCES users(id),
+            role TEXT NOT NULL,
+            message TEXT NOT NULL,
+            timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+
+        CREATE TABLE IF NOT EXISTS plan_versions (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER NOT NULL REFERENCES users(id),
+            week INTEGER NOT NULL,
+            plan TEXT,
+            timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+    """),
+
+    (2, "hot query indexes", """
+        -- plans UNIQUE (user_id, week) already arbitrates ON CONFLICT and
+        -- serves COUNT(*), MAX(week) and ORDER BY week DESC; preferences'
+        -- primary key does the same for its upsert and lookup.
+
+        -- "latest plan": ORDER BY timestamp DESC LIMIT 1
+        CREATE INDEX IF NOT EXISTS plans_user_timestamp_idx
+            ON plans (user_id, timestamp DESC);
+
+        -- get_user_progress (covering) + delete_plan's progress cleanup
+        CREATE INDEX IF NOT EXISTS progress_user_week_idx
+            ON progress (user_id, week) INCLUDE (weight, difficulty, timestamp);
+
+        -- per-user deletes on the remaining child tables
+        CREATE INDEX IF NOT EXISTS chats_user_idx
+            ON chats (user_id);
+        CREATE INDEX IF NOT EXISTS plan_versions_user_week_idx
+            ON plan_versions (user_id, week);
+    """),
+
+    (3, "cascade user deletes", """
+        -- Orphans from the old one-table-at-a-time delete would block
+        -- the constraints below
+        DELETE FROM user_profile WHERE user_id NOT IN (SELECT id FROM users);
+        DELETE FROM plans WHERE user_id NOT IN (SELECT id FROM users);
+        DELETE FROM progress WHERE user_id NOT IN (SELECT id FROM users);
+        DELETE FROM preferences WHERE user_id NOT IN (SELECT id FROM users);
+        DELETE FROM chats WHERE user_id NOT IN (SELECT id FROM users);
+        DELETE FROM plan_versions WHERE user_id NOT IN (SELECT id FROM users);
+
+        ALTER TABLE user_profile
+            DROP CONSTRAINT IF EXISTS user_profile_user_id_fkey,
+            ADD CONSTRAINT user_profile_user_id_fkey FOREIGN KEY (user_id)
+                REFERENCES users(id) ON DELETE CASCADE;
+        ALTER TABLE plans
+            DROP CONSTRAINT IF EXISTS plans_user_id_fkey,
+            ADD CONSTRAINT plans_user_id_fkey FOREIGN KEY (user_id)
+                REFERENCES users(id) ON DELETE CASCADE;
+        ALTER TABLE progress
+            DROP CONSTRAINT IF EXISTS progress_user_id_fkey,
+            ADD CONSTRAINT progress_user_id_fkey FOREIGN KEY (user_id)
+                REFERENCES users(id) ON DELETE CASCADE;
+        ALTER TABLE preferences
+            DROP CONSTRAINT IF EXISTS preferences_user_id_fkey,
+            ADD CONSTRAINT preferences_user_id_fkey FOREIGN KEY (user_id)
+                REFERENCES users(id) ON DELETE CASCADE;
+        ALTER TABLE chats
+            DROP CONSTRAINT IF EXISTS chats_user_id_fkey,
+            ADD CONSTRAINT chats_user_id_fkey FOREIGN KEY (user_id)
+                REFERENCES users(id) ON DELETE CASCADE;
+        ALTER TABLE plan_versions
+            DROP CONSTRAINT IF EXISTS plan_versions_user_id_fkey,
+            ADD CONSTRAINT plan_versions_user_id_fkey FOREIGN KEY (user_id)
+                REFERENCES users(id) ON DELETE CASCADE;
+
+        -- Inactivity cutoff for the bulk purge; existing rows count as new
+        ALTER TABLE users
+            ADD COLUMN IF NOT EXISTS created_at TIMESTAMP NOT NULL
+                DEFAULT CURRENT_TIMESTAMP;
+    """),
+
+    (4, "plan history index", """
+        -- Stored so the history list never has to read (or detoast) plan
+        ALTER TABLE plans ADD COLUMN IF NOT EXISTS plan_length INTEGER;
+        UPDATE plans SET plan_length = char_length(plan)
+        WHERE plan_length IS NULL AND plan IS NOT NULL;
+
+        -- Keyset-paginated history list as an index-only scan
+        CREATE INDEX IF NOT EXISTS plans_history_idx
+            ON plans (user_id, week DESC) INCLUDE (id, timestamp, plan_length);
+    """),
+
+    (5, "compressed plan storage", """
+        -- plan_codec format byte + payload; legacy `plan` text is moved
+        -- over by `python migrations.py compress-plans`
+        ALTER TABLE plans ADD COLUMN IF NOT EXISTS plan_z BYTEA;
+
+        -- Already compressed: keep TOAST from trying pglz on it again
+        ALTER TABLE plans ALTER COLUMN plan_z SET STORAGE EXTERNAL;
+    """),
+
+    (6, "delta-encoded plan versions", """
+        -- One row per revision: a plan_codec snapshot or a plan_delta
+        -- against version - 1 (see plan_delta.SNAPSHOT_EVERY)
+        ALTER TABLE plan_versions
+            ADD COLUMN IF NOT EXISTS plan_id INTEGER
+                REFERENCES plans(id) ON DELETE CASCADE,
+            ADD COLUMN IF NOT EXISTS version INTEGER,
+            ADD COLUMN IF NOT EXISTS parent_version INTEGER,
+            ADD COLUMN IF NOT EXISTS is_snapshot BOOLEAN NOT NULL DEFAULT FALSE,
+            ADD COLUMN IF NOT EXISTS payload BYTEA,
+            ADD COLUMN IF NOT EXISTS payload_size INTEGER,
+            ADD COLUMN IF NOT EXISTS note TEXT;
+
+        ALTER TABLE plan_versions ALTER COLUMN payload SET STORAGE EXTERNAL;
+
+        -- head lookup, snapshot search and ordered replay
+        CREATE UNIQUE INDEX IF NOT EXISTS plan_versions_plan_version_idx
+            ON plan_versions (plan_id, version) INCLUDE (is_snapshot);
+    """),
+
+    (7, "generation jobs", """
+        -- Background plan generation (jobs.py): status and result of
+        -- every job, so a reconnecting browser can pick up the outcome
+        CREATE TABLE IF NOT EXISTS generation_jobs (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            week INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            result TEXT,
+            error TEXT,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+
+        -- At most one queued / running job per (user, week), whichever
+        -- server process submitted it
+        CREATE UNIQUE INDEX IF NOT EXISTS generation_jobs_active_idx
+            ON generation_jobs (user_id, week)
+            WHERE status IN ('queued', 'running');
+
+        -- latest job for a week + per-user cascade deletes
+        CREATE INDEX IF NOT EXISTS generation_jobs_user_week_idx
+            ON generation_jobs (user_id, week, id DESC);
+    """),
+
+    (8, "parsed plan model", """
+        -- plan_model.Plan as JSON, written with every plan so history,
+        -- PDF export and analytics read days / exercises / meals without
+        -- parsing the markdown; NULL on rows older than this column
+        ALTER TABLE plans ADD COLUMN IF NOT EXISTS plan_json JSONB;
+    """),
+]
+
+# ---------------- RUNNER ----------------
+
+LOCK_KEY = 727274  # pg_advisory_xact_lock key, serialises concurrent deploys
+
+
+def _ensure_version_table(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def applied_versions():
+    with get_connection() as conn, conn.cursor() as cur:
+        _ensure_version_table(cur)
+        conn.commit()
+        cur.execute("SELECT version FROM schema_migrations")
+        return {row[0] for row in cur.fetchall()}
+
+
+def upgrade(target=None, log=print):
+    applied = applied_versions()
+
+    for version, name, sql in sorted(MIGRATIONS):
+        if target is not None and version > target:
+            break
+        if version in applied:
+            continue
+
+        with get_connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (LOCK_KEY,))
+
+            # Another process may have applied it while we waited
+            cur.execute(
+                "SELECT 1 FROM schema_migrations WHERE version=%s", (version,)
+            )
+            if cur.fetchone():
+                conn.rollback()
+                continue
+
+            cur.execute(sql)
+            cur.execute(
+                "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                (version, name)
+            )
+            conn.commit()
+
+        log(f"applied {version:04d} {name}")
+
+
+def status(log=print):
+    applied = applied_versions()
+
+    for version, name, _ in sorted(MIGRATIONS):
+        mark = "applied" if version in applied else "pending"
+        log(f"{version:04d} {mark:8} {name}")
+
+# ---------------- EXPLAIN CHECK ----------------
+
+# Representative parameters for every registry statement on a request
+# path (statements.py). Background maintenance (legacy_plan_*) scans by
+# design and is left out.
+HOT_QUERIES = {
+    "user_insert": ("someone", "x"),
+    "login": ("someone", "x"),
+    "user_exists": ("someone",),
+    "all_users": (),
+    "user_delete": (1,),
+    "users_purge_chunk": ([1, 2, 3],),
+    "inactive_count": {"cutoff": "2024-01-01"},
+    "inactive_users": {"cutoff": "2024-01-01", "after": 0, "limit": 500},
+    "plan_history": (1,),
+    "plan_index": (1, 2 ** 31 - 1, 11),
+    "plan_body": (1,),
+    "plan_model": (1,),
+    "plan_id": (1, 1),
+    "plan_lock": (1, 1),
+    "plan_write": (b"\x01", 4, "{}", 1),
+    "plan_upsert": (1, 1, b"\x01", 4, "{}"),
+    "plan_delete": (1,),
+    "version_head": (1,),
+    "version_insert": (1, 1, 1, 2, 1, False, b"\x00", 1, "note"),
+    "version_list": (1, 1),
+    "version_replay": {"pid": 1, "v": 5},
+    "profile": (1,),
+    "profile_upsert": (1, 20, 170, 70, "Goa", "Panaji", "Fat Loss",
+                       "Vegetarian", "Home", 500),
+    "progress": (1,),
+    "progress_insert": (1, 2, 70, "Just Right"),
+    "progress_delete_week": (1, 1),
+    "weight_update": (70, 1),
+    "preferences_upsert": (1, "none"),
+    "user_state": {"uid": 1},
+    "job_expire": (1, 1, "2024-01-01"),
+    "job_active": (1, 1),
+    "job_insert": (1, 1, "week_n"),
+    "job_update": ("done", "plan", None, 1),
+    "job_get": (1,),
+    "job_latest": (1, 1),
+}
+
+
+def _seq_scans(node, found):
+    if node.get("Node Type") == "Seq Scan":
+        found.append(node.get("Relation Name"))
+    for child in node.get("Plans", []):
+        _seq_scans(child, found)
+    return found
+
+
+def check(log=print):
+    failures = []
+    statements = compile_statements(PostgresRepository.PLAN_BLOB,
+                                     PostgresRepository.FOR_UPDATE)
+
+    with get_connection() as conn, conn.cursor() as cur:
+        # With seq scans priced out, any Seq Scan left means no usable
+        # index exists, regardless of how small the tables are today.
+        cur.execute("SET LOCAL enable_seqscan = off")
+
+        for name, params in HOT_QUERIES.items():
+            sql = statements[name].text
+            cur.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+            plan = cur.fetchone()[0][0]["Plan"]
+            scans = _seq_scans(plan, [])
+
+            if scans:
+                failures.append(name)
+                log(f"FAIL {name}: Seq Scan on {', '.join(scans)}")
+            else:
+                log(f"ok   {name}")
+
+        conn.rollback()
+
+    return failures
+
+# ---------------- CLI ----------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="FitAI schema migrations")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    up = sub.add_parser("upgrade", help="apply pending migrations")
+    up.add_argument("--to", type=int, default=None, help="stop at this version")
+    sub.add_parser("status", help="show applied / pending migrations")
+    sub.add_parser("check", help="fail if a hot query uses a Seq Scan")
+    comp = sub.add_parser("compress-plans", help="convert text plans to plan_z")
+    comp.add_argument("--batch", type=int, default=200)
+    comp.add_argument("--pause", type=float, default=0.0,
+                      help="seconds to sleep between batches")
+
+    args = parser.parse_args(argv)
+
+    if args.command != "compress-plans" and backend_name() != "postgres":
+        # SQLiteRepository applies its own schema when it opens the file
+        print(f"Nothing to do: DB_BACKEND is {backend_name()!r}")
+        return 0
+
+    if args.command == "upgrade":
+        upgrade(args.to)
+    elif args.command == "status":
+        status()
+    elif args.command == "check":
+        if check():
+            return 1
+    elif args.command == "compress-plans":
+        done = compress_plans(
+            batch_size=args.batch,
+            pause=args.pause,
+            on_progress=lambda done, total: print(f"compressed {done}/{total}")
+        )
+        print(f"done: {done} plans converted")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
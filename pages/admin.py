@@ -1,152 +1,284 @@
-import streamlit as st
-from database import get_connection, delete_user
-from database import get_user_profile
-from database import get_all_users, get_plan_history
-from datetime import datetime, timedelta
-from database import get_user_progress,delete_plan
-import pandas as pd
-
-ADMIN_USER = st.secrets["ADMIN_USER"]
-ADMIN_PASS = st.secrets["ADMIN_PASS"]
-
-st.set_page_config("Admin", "📊")
-
-if "admin" not in st.session_state:
-    st.session_state.admin = False
-
-if not st.session_state.admin:
-    st.title("🔐 Admin Login")
-
-    u = st.text_input("Admin Username")
-    p = st.text_input("Admin Password", type="password")
-
-    if st.button("Login"):
-        if u == ADMIN_USER and p == ADMIN_PASS:
-            st.session_state.admin = True
-            st.session_state.admin_username = u
-            st.success("✅ Admin login successful")
-            st.rerun()
-        else:
-            st.error("❌ Invalid admin username or password")
-
-    st.stop()
-
-if st.sidebar.button("Logout"):
-    st.session_state.admin = False
-    st.session_state.pop("admin_id", None)
-    st.session_state.pop("admin_username", None)
-    st.rerun()
-
-st.title("Admin Dashboard")
-conn = get_connection()
-cursor = conn.cursor()
-cursor.execute("SELECT id, username FROM users")
-users = cursor.fetchall()
-cursor.close()
-conn.close()
-for uid, u in users:
-    c1, c2, c3 = st.columns([4,2,2])
-    c1.write(u)
-    if c2.checkbox("Confirm", key=uid) and c3.button("Delete", key=f"d{uid}"):
-        delete_user(uid)
-        st.rerun()
-
-selected_profile_user = None
-
-st.subheader("👤 User Profile Details")
-
-users = get_all_users()
-
-if not users:
-    st.info("No users found.")
-else:
-    user_map = {u[1]: u[0] for u in users}
-
-    selected_profile_user = st.selectbox(
-        "Select a user to view profile",
-        list(user_map.keys()),
-        key="profile_viewer"
-    )
-
-    profile_uid = user_map[selected_profile_user]
-
-    profile = get_user_profile(profile_uid)
-
-    if not profile:
-        st.warning("No profile data available for this user.")
-    else:
-        age, height, weight, state, city, goal, diet, workout_place, budget = profile
-
-        c1, c2, c3 = st.columns(3)
-
-        c1.metric("Age", age)
-        c1.metric("Height (cm)", height)
-        c1.metric("Weight (kg)", weight)
-
-        c2.metric("State", state)
-        c2.metric("City", city)
-        c2.metric("Goal", goal)
-
-        c3.metric("Diet", diet)
-        c3.metric("Workout Place", workout_place)
-        c3.metric("Budget (₹)", budget)
-
-
-st.subheader("📈 User Progress Trends")
-
-# ---- ISSUE 5 FIX: guard before showing progress ----
-if not selected_profile_user:
-    st.info("👆 Please select a user to view progress and history.")
-    st.stop()
-
-progress = get_user_progress(profile_uid)
-dates = []
-weights = []
-
-# ✅ ADD WEEK 1 BASELINE FROM PROFILE
-profile = get_user_profile(profile_uid)
-if profile:
-    _, _, weight, *_ = profile
-    if weight:
-        dates.append("Current")
-        weights.append(weight)
-
-# ✅ ADD WEEK 2+ PROGRESS
-for week, weight,_, ts in progress:
-    dates.append(f"Week {week}")
-    weights.append(weight)
-
-
-df_weight = pd.DataFrame({
-    "Date": dates,
-    "Weight (kg)": weights
-})
-
-if len(weights) < 2:
-    st.info("Not enough data to show progress trend.")
-else:
-    st.line_chart(df_weight, x="Date", y="Weight (kg)")
-
-
-st.subheader("📜 User Plan History")
-
-history = get_plan_history(profile_uid)
-
-if not history:
-    st.info("No plans generated by this user.")
-else:
-    for plan_id, week, plan, ts in history:
-        ist_time = ts + timedelta(hours=5, minutes=30)
-
-        with st.expander(f"🗓️ Week {week} — {ist_time.strftime('%d %b %Y, %I:%M %p')}"):
-            st.markdown(plan)
-
-            col1, col2 = st.columns([4,1])
-
-            with col2:
-                if st.checkbox("Confirm delete", key=f"confirm_{plan_id}"):
-                    if st.button("🗑️ Delete Plan", key=f"delete_{plan_id}"):
-                        delete_plan(plan_id)
-                        st.success(f"✅ Week {week} plan deleted")
-
-                        st.rerun()
+import streamlit as st
+from async_db import pool_stats as async_pool_stats
+from database import delete_user, pool_stats, cache_stats, backend_name
+from database import get_user_profile, purge_users, count_inactive_users
+from database import get_all_users
+from ai_api import ai_cache_stats, invalidate_ai_cache, limiter_stats, coalesce_stats
+from ai_api import breaker_stats
+from jobs import job_stats
+from ai_api import metrics_snapshot, metrics_text, metrics_json
+from history_view import render_plan_history
+from datetime import datetime, timedelta
+from database import get_user_progress,delete_plan
+import pandas as pd
+
+ADMIN_USER = st.secrets["ADMIN_USER"]
+ADMIN_PASS = st.secrets["ADMIN_PASS"]
+
+st.set_page_config("Admin", "📊")
+
+if "admin" not in st.session_state:
+    st.session_state.admin = False
+
+if not st.session_state.admin:
+    st.title("🔐 Admin Login")
+
+    u = st.text_input("Admin Username")
+    p = st.text_input("Admin Password", type="password")
+
+    if st.button("Login"):
+        if u == ADMIN_USER and p == ADMIN_PASS:
+            st.session_state.admin = True
+            st.session_state.admin_username = u
+            st.success("✅ Admin login successful")
+            st.rerun()
+        else:
+            st.error("❌ Invalid admin username or password")
+
+    st.stop()
+
+if st.sidebar.button("Logout"):
+    st.session_state.admin = False
+    st.session_state.pop("admin_id", None)
+    st.session_state.pop("admin_username", None)
+    st.rerun()
+
+st.title("Admin Dashboard")
+
+with st.expander("🔌 Database Pool"):
+    st.caption(f"Backend: {backend_name()}")
+    if backend_name() == "postgres":
+        stats = pool_stats()
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("Checked out", f"{stats['checked_out']} / {stats['max_size']}")
+        c2.metric("Idle", stats["idle"])
+        c3.metric("Connections created", stats["connections_created"])
+        c4.metric("Avg wait (ms)", stats["wait_avg_ms"])
+        st.json(stats)
+        st.caption("Async (asyncpg) pool")
+        st.json(async_pool_stats())
+
+with st.expander("🗃️ Read Cache"):
+    stats = cache_stats()
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Hits (saved queries)", stats["hits"])
+    c2.metric("Misses", stats["misses"])
+    c3.metric("Hit rate", f"{stats['hit_rate']:.0%}")
+    c4.metric("Entries", f"{stats['entries']} / {stats['max_entries']}")
+    st.json(stats)
+
+with st.expander("🤖 AI Response Cache"):
+    stats = ai_cache_stats()
+    if stats is None:
+        st.caption("Disabled (AI_CACHE=0)")
+    else:
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("Hits (saved AI calls)", stats["hits"])
+        c2.metric("Misses", stats["misses"])
+        c3.metric("Hit rate", f"{stats['hit_rate']:.0%}")
+        c4.metric("Disk (MB)", f"{stats['disk_bytes'] / 2**20:.1f}")
+        st.json(stats)
+        if st.button("🗑️ Clear AI cache"):
+            invalidate_ai_cache()
+            st.success("AI cache cleared")
+
+with st.expander("🚦 AI Rate Limiter"):
+    stats = limiter_stats()
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Queued calls", f"{stats['queued']} / {stats['admitted']}")
+    c2.metric("Avg queue wait (ms)", stats["wait_avg_ms"])
+    c3.metric("Retries", stats["retries"])
+    c4.metric("Gave up", stats["gave_up"] + stats["timeouts"])
+    st.json(stats)
+
+with st.expander("🛑 AI Circuit Breaker"):
+    stats = breaker_stats()
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("State", stats["state"].replace("_", "-"))
+    c2.metric("Failures in a row", f"{stats['consecutive_failures']} / {stats['threshold']}")
+    c3.metric("Times opened", stats["times_opened"])
+    c4.metric("Calls refused", stats["rejected"])
+    if stats["state"] == "open":
+        st.warning(f"AI calls fail fast; next probe in {stats['retry_in_s']:.0f}s.")
+    st.json(stats)
+
+with st.expander("🔗 Shared AI Calls"):
+    stats = coalesce_stats()
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Calls made", stats["calls"])
+    c2.metric("Calls saved", stats["calls_saved"])
+    c3.metric("In flight", stats["in_flight"])
+    st.json(stats)
+
+with st.expander("🧵 Plan Generation Jobs"):
+    stats = job_stats()
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Running", f"{stats['running']} / {stats['workers']}")
+    c2.metric("Queued", stats["queued"])
+    c3.metric("Duplicates joined", stats["deduplicated"])
+    c4.metric("Avg run (s)", stats["run_avg_s"])
+    st.json(stats)
+
+with st.expander("📈 AI Calls"):
+    snapshot = metrics_snapshot()
+    if not snapshot["ai_calls_total"]:
+        st.caption("No AI calls yet in this server process.")
+    else:
+        st.caption("Calls by flow, source (model / cache / shared) and outcome")
+        st.dataframe(pd.DataFrame(snapshot["ai_calls_total"]), use_container_width=True)
+        st.caption("Wall time (s)")
+        st.dataframe(pd.DataFrame(snapshot["ai_call_seconds"]).drop(columns="buckets"),
+                     use_container_width=True)
+        st.caption("Most recent calls")
+        st.dataframe(pd.DataFrame(snapshot["recent_calls"]), use_container_width=True)
+
+    c1, c2 = st.columns(2)
+    c1.download_button("⬇️ Prometheus text", metrics_text(), "fitai_ai_metrics.prom")
+    c2.download_button("⬇️ JSON", metrics_json(), "fitai_ai_metrics.json")
+
+for uid, u in get_all_users():
+    c1, c2, c3 = st.columns([4,2,2])
+    c1.write(u)
+    if c2.checkbox("Confirm", key=uid) and c3.button("Delete", key=f"d{uid}"):
+        delete_user(uid)
+        st.rerun()
+
+with st.expander("🧹 Bulk Purge Users"):
+    mode = st.radio(
+        "Select users by",
+        ["Inactivity", "User IDs"],
+        horizontal=True,
+        key="purge_mode"
+    )
+
+    purge_ids = None
+    purge_cutoff = None
+
+    if mode == "Inactivity":
+        cutoff_date = st.date_input(
+            "No plans or progress since",
+            value=datetime.now().date() - timedelta(days=180),
+            key="purge_cutoff"
+        )
+        purge_cutoff = datetime.combine(cutoff_date, datetime.min.time())
+        st.caption(f"{count_inactive_users(purge_cutoff)} users match")
+    else:
+        raw_ids = st.text_area(
+            "User IDs (comma / space / newline separated)",
+            key="purge_ids"
+        )
+        purge_ids = [int(x) for x in raw_ids.replace(",", " ").split() if x.isdigit()]
+        st.caption(f"{len(purge_ids)} user IDs entered")
+
+    batch_size = st.number_input("Batch size", 50, 5000, 500, step=50, key="purge_batch")
+
+    if st.checkbox("I understand this permanently deletes these users", key="purge_confirm"):
+        if st.button("🧹 Purge", key="purge_run"):
+            bar = st.progress(0.0, text="Starting purge...")
+
+            def report(done, total):
+                frac = done / total if total else 1.0
+                bar.progress(min(frac, 1.0), text=f"Deleted {done} / {total} users")
+
+            deleted = purge_users(
+                user_ids=purge_ids,
+                inactive_before=purge_cutoff,
+                batch_size=int(batch_size),
+                on_progress=report
+            )
+            bar.progress(1.0, text=f"Deleted {deleted} users")
+            st.success(f"✅ Purged {deleted} users")
+
+selected_profile_user = None
+
+st.subheader("👤 User Profile Details")
+
+users = get_all_users()
+
+if not users:
+    st.info("No users found.")
+else:
+    user_map = {u[1]: u[0] for u in users}
+
+    selected_profile_user = st.selectbox(
+        "Select a user to view profile",
+        list(user_map.keys()),
+        key="profile_viewer"
+    )
+
+    profile_uid = user_map[selected_profile_user]
+
+    profile = get_user_profile(profile_uid)
+
+    if not profile:
+        st.warning("No profile data available for this user.")
+    else:
+        age, height, weight, state, city, goal, diet, workout_place, budget = profile
+
+        c1, c2, c3 = st.columns(3)
+
+        c1.metric("Age", age)
+        c1.metric("Height (cm)", height)
+        c1.metric("Weight (kg)", weight)
+
+        c2.metric("State", state)
+        c2.metric("City", city)
+        c2.metric("Goal", goal)
+
+        c3.metric("Diet", diet)
+        c3.metric("Workout Place", workout_place)
+        c3.metric("Budget (₹)", budget)
+
+
+st.subheader("📈 User Progress Trends")
+
+# ---- ISSUE 5 FIX: guard before showing progress ----
+if not selected_profile_user:
+    st.info("👆 Please select a user to view progress and history.")
+    st.stop()
+
+progress = get_user_progress(profile_uid)
+dates = []
+weights = []
+
+# ✅ ADD WEEK 1 BASELINE FROM PROFILE
+profile = get_user_profile(profile_uid)
+if profile:
+    _, _, weight, *_ = profile
+    if weight:
+        dates.append("Current")
+        weights.append(weight)
+
+# ✅ ADD WEEK 2+ PROGRESS
+for week, weight,_, ts in progress:
+    dates.append(f"Week {week}")
+    weights.append(weight)
+
+
+df_weight = pd.DataFrame({
+    "Date": dates,
+    "Weight (kg)": weights
+})
+
+if len(weights) < 2:
+    st.info("Not enough data to show progress trend.")
+else:
+    st.line_chart(df_weight, x="Date", y="Weight (kg)")
+
+
+st.subheader("📜 User Plan History")
+
+def plan_actions(plan_id, week):
+    col1, col2 = st.columns([4,1])
+
+    with col2:
+        if st.checkbox("Confirm delete", key=f"confirm_{plan_id}"):
+            if st.button("🗑️ Delete Plan", key=f"delete_{plan_id}"):
+                delete_plan(plan_id)
+                st.success(f"✅ Week {week} plan deleted")
+
+                st.rerun()
+
+
+if not render_plan_history(profile_uid, key="admin_history", actions=plan_actions):
+    st.info("No plans generated by this user.")
@@ -1,22 +1,34 @@
-from fpdf import FPDF
-import os
-
-FONT_PATH = "DejaVuSans.ttf"
-
-def create_pdf(text):
-    pdf = FPDF()
-    pdf.add_page()
-
-    # ✅ Unicode font
-    pdf.add_font("DejaVu", "", FONT_PATH, uni=True)
-    pdf.set_font("DejaVu", size=11)
-
-    # Normalize line endings
-    text = text.replace("\r\n", "\n")
-
-    pdf.multi_cell(0, 8, text)
-
-    output_path = "FitnessPlan.pdf"
-    pdf.output(output_path)
-
-    return output_path
+from fpdf import FPDF
+import os
+
+from plan_model import scan_plan
+
+FONT_PATH = "DejaVuSans.ttf"
+
+# Font size per kind of line (plan_model.scan_plan); only the regular
+# DejaVu face is installed, so headings differ by size alone
+SIZES = {"title": 16, "section": 14, "day": 12}
+
+def create_pdf(text):
+    pdf = FPDF()
+    pdf.add_page()
+
+    # ✅ Unicode font
+    pdf.add_font("DejaVu", "", FONT_PATH, uni=True)
+    pdf.set_font("DejaVu", size=11)
+
+    # Normalize line endings
+    text = text.replace("\r\n", "\n")
+
+    # Every line is printed as written; the parsed plan only picks the
+    # size, so text the parser can't place is never lost
+    kinds = {line.index: line.kind for line in scan_plan(text)}
+    for index, line in enumerate(text.splitlines()):
+        size = SIZES.get(kinds.get(index), 11)
+        pdf.set_font("DejaVu", size=size)
+        pdf.multi_cell(0, size * 0.7 + 1, line.rstrip() or " ")
+
+    output_path = "FitnessPlan.pdf"
+    pdf.output(output_path)
+
+    return output_path
@@ -0,0 +1,86 @@
+import re
+
+# Incremental structure check for a plan that is still streaming in.
+#
+# A plan is a workout and a diet section that each run
+# "Day 1:" .. "Day 7:" in order. Only complete lines are looked at, so a
+# chunk boundary inside "Day 1" never matters. feed() returns a reason as
+# soon as the output can no longer become a complete plan; finish()
+# returns one if the finished text is still incomplete.
+
+DAYS = 7
+
+# "Day 3:", "- **Day 3 (Wed):**", "### Day 3 – Legs" at the start of a line
+DAY_LINE = re.compile(r"^[\s\-*#>•]*day\s*(\d+)\b", re.IGNORECASE)
+
+REFUSALS = ("i'm sorry", "i am sorry", "i cannot", "i can't", "as an ai")
+
+
+class PlanStreamCheck:
+    def __init__(self, sections=2, first_day_within=1500):
+        self.expected_sections = sections
+        self.first_day_within = first_day_within
+        self.chars = 0
+        self.sections = 0        # sections that reached Day 7
+        self.last_day = None     # last day number seen in the current section
+        self.seen = set()
+        self._partial = ""
+
+    def feed(self, chunk):
+        self.chars += len(chunk)
+        lines = (self._partial + chunk).split("\n")
+        self._partial = lines.pop()
+
+        for line in lines:
+            problem = self._line(line)
+            if problem:
+                return problem
+
+        if self.last_day is None and self.chars > self.first_day_within:
+            return "No Day 1 in the first part of the response"
+        return None
+
+    def finish(self):
+        if self._partial:
+            problem = self._line(self._partial)
+            self._partial = ""
+            if problem:
+                return problem
+
+        missing = [d for d in range(1, DAYS + 1) if d not in self.seen]
+        if missing:
+            return f"Missing Day {missing[0]}"
+        if self.last_day != DAYS:
+            return f"Plan stops after Day {self.last_day}"
+        if self.sections < self.expected_sections:
+            return f"Only {self.sections} of {self.expected_sections} sections (workout, diet)"
+        return None
+
+    def _line(self, line):
+        if self.last_day is None:
+            lowered = line.strip().lower()
+            if lowered.startswith(REFUSALS):
+                return "Model declined to write the plan"
+
+        match = DAY_LINE.match(line)
+        if not match:
+            return None
+
+        day = int(match.group(1))
+        last = self.last_day
+
+        if not 1 <= day <= DAYS:
+            return f"Unexpected Day {day}"
+
+        if last is None:
+            if day != 1:
+                return f"Plan starts at Day {day}"
+        elif day not in (last, last + 1) and not (day == 1 and last == DAYS):
+            # A skipped day, or a section restarting before Day 7
+            return f"Day {last + 1} missing (jumped from Day {last} to Day {day})"
+
+        if day == DAYS and last != DAYS:
+            self.sections += 1
+        self.last_day = day
+        self.seen.add(day)
+        return None
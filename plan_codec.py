@@ -0,0 +1,30 @@
+import zlib
+
+# Stored plan format: 1 version byte + payload.
+#   0x00  raw UTF-8 (legacy rows read through COALESCE in SQL)
+#   0x01  zlib-compressed UTF-8
+# New formats get a new byte; old rows keep decoding forever.
+
+FORMAT_RAW = 0
+FORMAT_ZLIB = 1
+
+ZLIB_LEVEL = 6
+
+
+def encode_plan(text: str) -> bytes:
+    return bytes([FORMAT_ZLIB]) + zlib.compress(text.encode("utf-8"), ZLIB_LEVEL)
+
+
+def decode_plan(blob) -> str:
+    if blob is None:
+        return None
+
+    blob = bytes(blob)  # psycopg2 hands back memoryview for BYTEA
+    fmt, payload = blob[0], blob[1:]
+
+    if fmt == FORMAT_ZLIB:
+        return zlib.decompress(payload).decode("utf-8")
+    if fmt == FORMAT_RAW:
+        return payload.decode("utf-8")
+
+    raise ValueError(f"Unknown plan storage format: {fmt}")
@@ -0,0 +1,124 @@
+import json
+import zlib
+from difflib import SequenceMatcher
+
+from plan_codec import encode_plan, decode_plan
+
+# Line-based deltas between two plan texts.
+#
+# A delta is a list of ops applied to the parent's lines in order:
+#   ["=", n]        copy the next n parent lines
+#   ["-", n]        skip the next n parent lines
+#   ["+", [lines]]  insert these lines
+# so its size tracks the edit, not the plan.
+
+FORMAT_JSON = 0
+FORMAT_ZLIB = 1
+
+# Every revision of a week's plan is a delta against the one before it;
+# every SNAPSHOT_EVERY-th version is stored whole so rebuilding any
+# version applies at most SNAPSHOT_EVERY - 1 deltas.
+SNAPSHOT_EVERY = 10
+
+
+def make_delta(parent: str, child: str) -> list:
+    a = parent.split("\n")
+    b = child.split("\n")
+    ops = []
+
+    matcher = SequenceMatcher(None, a, b, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append(["=", i2 - i1])
+            continue
+        if i2 > i1:
+            ops.append(["-", i2 - i1])
+        if j2 > j1:
+            ops.append(["+", b[j1:j2]])
+
+    return ops
+
+
+def apply_delta(parent: str, ops) -> str:
+    lines = parent.split("\n")
+    out = []
+    pos = 0
+
+    for op, arg in ops:
+        if op == "=":
+            out.extend(lines[pos:pos + arg])
+            pos += arg
+        elif op == "-":
+            pos += arg
+        elif op == "+":
+            out.extend(arg)
+        else:
+            raise ValueError(f"Unknown delta op: {op!r}")
+
+    if pos != len(lines):
+        raise ValueError("Delta does not match its parent text")
+
+    return "\n".join(out)
+
+
+def encode_delta(ops) -> bytes:
+    raw = json.dumps(ops, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    packed = zlib.compress(raw, 6)
+
+    # Tiny edits often come out larger after zlib; keep whichever is smaller
+    if len(packed) < len(raw):
+        return bytes([FORMAT_ZLIB]) + packed
+    return bytes([FORMAT_JSON]) + raw
+
+
+def decode_delta(blob) -> list:
+    blob = bytes(blob)
+    fmt, payload = blob[0], blob[1:]
+
+    if fmt == FORMAT_ZLIB:
+        payload = zlib.decompress(payload)
+    elif fmt != FORMAT_JSON:
+        raise ValueError(f"Unknown delta format: {fmt}")
+
+    return json.loads(payload.decode("utf-8"))
+
+# ---------------- VERSION ROWS ----------------
+
+# The storage-independent half of plan versioning; repository.py and
+# async_db.py only fetch and insert the rows.
+
+def version_rows(head, parent, plan, note):
+    """plan_versions rows for writing `plan` over `parent`.
+
+    `head` is the newest stored version (0 if none). Returns
+    (version, is_snapshot, payload, note) tuples to insert in order.
+    """
+    rows = []
+    if head == 0 and parent is not None:
+        # Plan predates versioning: keep what it was before this write
+        rows.append((1, True, encode_plan(parent), "original"))
+        head = 1
+
+    version = head + 1
+    snapshot = encode_plan(plan)
+    payload, is_snapshot = snapshot, True
+
+    if parent is not None and version % SNAPSHOT_EVERY != 1:
+        delta = encode_delta(make_delta(parent, plan))
+        if len(delta) < len(snapshot):
+            payload, is_snapshot = delta, False
+
+    rows.append((version, is_snapshot, payload, note))
+    return rows
+
+
+def replay(rows, version):
+    """Text of `version` from version_replay rows (version, is_snapshot,
+    payload), nearest snapshot first; None if the version doesn't exist."""
+    if not rows or rows[-1][0] != version:
+        return None
+
+    text = decode_plan(rows[0][2])
+    for row in rows[1:]:
+        text = apply_delta(text, decode_delta(row[2]))
+    return text
@@ -0,0 +1,394 @@
+import json
+import re
+
+from plan_check import DAYS, DAY_LINE
+from plan_parts import WORKOUT_HEADER, DIET_HEADER, HYDRATION
+
+# Typed form of a plan, parsed once and stored next to the markdown.
+#
+#   Plan
+#     title
+#     workout   [WorkoutDay(day, focus, [Exercise(name, detail)], notes)]
+#     diet      [DietDay(day, [Meal(meal, food)], notes)]
+#     hydration [str]
+#     notes     [str]  lines outside the days, kept verbatim
+#
+# parse_plan() reads the markdown layout the app stores (and the looser
+# variants the model sometimes returns) in one pass over its lines;
+# Plan.to_markdown() writes the canonical layout back. Text the parser
+# can't place (an intro, a warm-up note before Day 1, a "Tips" section)
+# lands in `notes` rather than being dropped or filed as meals. The dict /
+# JSON form matches plan_schema's, and is what plans.plan_json holds, so
+# readers get days, exercises and meals without scanning text again.
+#
+# Every class uses __slots__: a plan is ~60 small records, and history /
+# analytics code may hold many of them at once.
+
+
+def _with_notes(data, notes):
+    # Only written when present, so plan_json for a clean plan stays small
+    if notes:
+        data["notes"] = list(notes)
+    return data
+
+
+class Exercise:
+    __slots__ = ("name", "detail")
+
+    def __init__(self, name, detail=""):
+        self.name = name
+        self.detail = detail
+
+    def to_markdown(self):
+        return f"{self.name}: {self.detail}" if self.detail else self.name
+
+
+class Meal:
+    __slots__ = ("meal", "food")
+
+    def __init__(self, meal, food):
+        self.meal = meal      # Breakfast, Lunch, Dinner, Snacks, ... or ""
+        self.food = food
+
+    def to_markdown(self):
+        return f"{self.meal}: {self.food}" if self.meal else self.food
+
+
+class WorkoutDay:
+    __slots__ = ("day", "focus", "exercises", "notes")
+
+    def __init__(self, day, focus="", exercises=None, notes=None):
+        self.day = day
+        self.focus = focus
+        self.exercises = exercises if exercises is not None else []
+        self.notes = notes if notes is not None else []
+
+    @property
+    def items(self):
+        return self.exercises
+
+    def to_markdown(self):
+        lines = [f"  - Day {self.day}:" + (f" {self.focus}" if self.focus else "")]
+        lines += [f"    - {e.to_markdown()}" for e in self.exercises]
+        lines += [f"    - {note}" for note in self.notes]
+        return lines
+
+
+class DietDay:
+    __slots__ = ("day", "meals", "notes")
+
+    def __init__(self, day, meals=None, notes=None):
+        self.day = day
+        self.meals = meals if meals is not None else []
+        self.notes = notes if notes is not None else []
+
+    @property
+    def items(self):
+        return self.meals
+
+    def to_markdown(self):
+        lines = [f"  - Day {self.day}:"]
+        lines += [f"    - {m.to_markdown()}" for m in self.meals]
+        lines += [f"    - {note}" for note in self.notes]
+        return lines
+
+    def meal(self, name):
+        return next((m for m in self.meals if m.meal.lower() == name.lower()), None)
+
+
+class Plan:
+    __slots__ = ("title", "workout", "diet", "hydration", "notes")
+
+    def __init__(self, title="", workout=None, diet=None, hydration=None, notes=None):
+        self.title = title
+        self.workout = workout if workout is not None else []
+        self.diet = diet if diet is not None else []
+        self.hydration = hydration if hydration is not None else []
+        self.notes = notes if notes is not None else []
+
+    # ---------------- QUERIES ----------------
+
+    def workout_day(self, day):
+        return next((d for d in self.workout if d.day == day), None)
+
+    def diet_day(self, day):
+        return next((d for d in self.diet if d.day == day), None)
+
+    def missing_days(self):
+        """(section, day) pairs a complete plan would have but this lacks."""
+        # "Day 7: Rest" has a focus and nothing under it; that is a day too
+        workout = {d.day for d in self.workout if d.exercises or d.focus}
+        diet = {d.day for d in self.diet if d.meals}
+        return ([("workout", day) for day in range(1, DAYS + 1) if day not in workout]
+                + [("diet", day) for day in range(1, DAYS + 1) if day not in diet])
+
+    @property
+    def complete(self):
+        return not self.missing_days()
+
+    def item_count(self):
+        return (sum(len(d.exercises) for d in self.workout)
+                + sum(len(d.meals) for d in self.diet))
+
+    def exercise_names(self):
+        return [e.name for d in self.workout for e in d.exercises]
+
+    def foods(self):
+        return [m.food for d in self.diet for m in d.meals]
+
+    # ---------------- MARKDOWN ----------------
+
+    def to_markdown(self):
+        lines = [f"- Title: {self.title or '7-Day Fitness Plan'}", "", WORKOUT_HEADER]
+        for day in self.workout:
+            lines += day.to_markdown()
+
+        lines += ["", DIET_HEADER]
+        for day in self.diet:
+            lines += day.to_markdown()
+
+        lines.append("")
+        if self.hydration:
+            lines.append(HYDRATION[0])
+            lines += [f"  - {note}" for note in self.hydration]
+        else:
+            lines += HYDRATION
+
+        if self.notes:
+            lines += [""] + self.notes
+        return "\n".join(lines)
+
+    # ---------------- DICT / JSON ----------------
+
+    def to_dict(self):
+        data = {
+            "title": self.title,
+            "workout": [
+                _with_notes({"day": d.day, "focus": d.focus,
+                             "exercises": [{"name": e.name, "detail": e.detail}
+                                           for e in d.exercises]}, d.notes)
+                for d in self.workout
+            ],
+            "diet": [
+                _with_notes({"day": d.day,
+                             "meals": [{"meal": m.meal, "food": m.food} for m in d.meals]},
+                            d.notes)
+                for d in self.diet
+            ],
+        }
+        if self.hydration:
+            data["hydration"] = list(self.hydration)
+        return _with_notes(data, self.notes)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            title=data.get("title") or "",
+            workout=[
+                WorkoutDay(d["day"], d.get("focus") or "",
+                           [Exercise(e["name"], e.get("detail") or "")
+                            for e in d.get("exercises") or ()],
+                           list(d.get("notes") or ()))
+                for d in data.get("workout") or ()
+            ],
+            diet=[
+                DietDay(d["day"], [Meal(m.get("meal") or "", m["food"])
+                                   for m in d.get("meals") or ()],
+                        list(d.get("notes") or ()))
+                for d in data.get("diet") or ()
+            ],
+            hydration=list(data.get("hydration") or ()),
+            notes=list(data.get("notes") or ()),
+        )
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), ensure_ascii=False, separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, value):
+        # psycopg2 hands JSONB back already decoded; asyncpg / SQLite as text
+        return cls.from_dict(json.loads(value) if isinstance(value, (str, bytes)) else value)
+
+# ---------------- PARSER ----------------
+
+_BULLET = "-*•>#+ \t"
+# The whole line names the section: "7-Day Workout Plan", "Diet Plan:",
+# "Hydration"; "Meal prep on Sunday" is text
+_SECTION = re.compile(
+    r"^\W*(?:\d+\s*-?\s*days?\s+)?(workout|exercise|training|diet|meal|nutrition|hydration)s?"
+    r"(?:\s+(?:plan|schedule|routine|chart|guide))?(?:\s+for\s+[^:]+)?(?:\s*\([^)]*\))?\s*:?$",
+    re.IGNORECASE,
+)
+_SECTIONS = {"workout": "workout", "exercise": "workout", "training": "workout",
+             "diet": "diet", "meal": "diet", "nutrition": "diet",
+             "hydration": "hydration"}
+_DAYS = ("workout", "diet")
+_TITLE = re.compile(r"^title\s*[:\-–]\s*(.*)", re.IGNORECASE)
+# A "Title:" line anywhere, before _clean() strips bullets and bold
+_HAS_TITLE = re.compile(r"^[-*•>#+ \t]*title\s*(?:\*\*)?\s*[:\-–]", re.IGNORECASE | re.MULTILINE)
+_DAY_REST = re.compile(r"^[\s\-*#>•]*day\s*\d+\b\s*[:.\-–—)]*\s*", re.IGNORECASE)
+_MEAL = re.compile(
+    r"^(breakfast|lunch|dinner|snacks?|mid-morning(?: snack)?|evening snack|pre-workout|post-workout)"
+    r"\s*(?:\([^)]*\))?\s*[:\-–]\s*(.*)",
+    re.IGNORECASE,
+)
+_NOTE = re.compile(r"^(?:notes?|tips?)\b", re.IGNORECASE)
+# "## Tips", "**Tips**" or a bullet starting with either
+_HEADING = re.compile(r"^\s*(?:[-*•>]\s+)?(?:#+|\*\*)")
+# Where an exercise name ends when there is no ":" — "Squats – 3 × 10",
+# "Plank (3 × 30 sec)", "Push-ups 3x12"
+_NAME_END = re.compile(r"\s+[–—-]\s+|\s*\(|\s+(?=\d+\s*[×x]\s*\d)")
+
+
+class PlanLine:
+    """One non-blank line of a plan as parse_plan() read it.
+
+    kind is "title", "section" (a known header), "day", "item" (an
+    Exercise / Meal in `value`), "note" (free text inside a day),
+    "hydration" or "other" (kept verbatim in Plan.notes).
+    """
+
+    __slots__ = ("index", "kind", "section", "day", "value")
+
+    def __init__(self, index, kind, section, day, value):
+        self.index = index
+        self.kind = kind
+        self.section = section
+        self.day = day
+        self.value = value
+
+
+def _clean(line):
+    return line.strip().lstrip(_BULLET).replace("**", "").strip()
+
+
+def _indent(line):
+    return len(line) - len(line.lstrip())
+
+
+def _exercise(item):
+    name, sep, detail = item.partition(":")
+    if not sep:
+        match = _NAME_END.search(item)
+        if match:
+            name, detail = item[:match.start()], item[match.end():]
+            detail = detail.rstrip(")")
+    return Exercise(name.strip(" ."), detail.strip())
+
+
+def _meal(item):
+    match = _MEAL.match(item)
+    if not match:
+        return Meal("", item)
+    name = match.group(1).title()
+    return Meal("Snacks" if name == "Snack" else name, match.group(2).strip())
+
+
+def _heading(line, item):
+    # Short, nothing after a colon, and set apart as a heading or ending
+    # in ":" — "Tips:", "## Notes", "**Warm-up**"; "Tip: sleep 8h" is text
+    if len(item) >= 40 or ":" in item.rstrip(":"):
+        return False
+    return item.endswith(":") or bool(_HEADING.match(line))
+
+
+def scan_plan(text):
+    """PlanLine for every non-blank line of `text`, in one pass."""
+    section = None      # workout / diet / hydration / other
+    known = None        # the last workout / diet section seen
+    day = None
+    day_indent = 0
+    titled = False
+    # A first heading or line is only taken as the title when the model
+    # wrote no "Title:" of its own; "Sure! Here is your plan" then is text
+    guess = not _HAS_TITLE.search(text or "")
+
+    for index, line in enumerate((text or "").splitlines()):
+        item = _clean(line)
+        if not item:
+            continue
+        indent = _indent(line)
+
+        found = DAY_LINE.match(line)
+        if found and (section in _DAYS or (section == "other" and known)):
+            section = section if section in _DAYS else known
+            day, day_indent = int(found.group(1)), indent
+            yield PlanLine(index, "day", section, day, _clean(_DAY_REST.sub("", line, count=1)))
+            continue
+
+        # Anything indented under a day belongs to it; a header at the
+        # day's level or above ends the day
+        if day is None or indent <= day_indent:
+            header = _SECTION.match(item)
+            if header:
+                section, day = _SECTIONS[header.group(1).lower()], None
+                if section in _DAYS:
+                    known = section
+                yield PlanLine(index, "section", section, None, item)
+                continue
+
+            title = _TITLE.match(item)
+            if title and not titled:
+                titled = True
+                yield PlanLine(index, "title", section, None, title.group(1).strip())
+                continue
+
+            if not (section == "diet" and _MEAL.match(item)) and _heading(line, item):
+                if guess and not titled and known is None and not item.endswith(":"):
+                    titled = True
+                    yield PlanLine(index, "title", section, None, item)
+                    continue
+                section, day = "other", None
+                yield PlanLine(index, "other", section, None, line.rstrip())
+                continue
+
+        if section == "hydration":
+            yield PlanLine(index, "hydration", section, None, item)
+        elif day is None:
+            if guess and section is None and not titled:
+                titled = True
+                yield PlanLine(index, "title", section, None, item)
+            else:
+                yield PlanLine(index, "other", section, None, line.rstrip())
+        elif _NOTE.match(item):
+            yield PlanLine(index, "note", section, day, item)
+        elif section == "workout":
+            yield PlanLine(index, "item", section, day, _exercise(item))
+        else:
+            yield PlanLine(index, "item", section, day, _meal(item))
+
+
+def parse_plan(text):
+    """Plan from markdown, in a single pass over its lines."""
+    plan = Plan()
+    day = None
+
+    for line in scan_plan(text):
+        kind = line.kind
+        if kind == "day":
+            if line.section == "workout":
+                day = WorkoutDay(line.day, line.value.strip("():. "))
+                plan.workout.append(day)
+            else:
+                day = DietDay(line.day)
+                plan.diet.append(day)
+                # "Day 2: Breakfast: ..." on one line
+                if line.value:
+                    day.meals.append(_meal(line.value))
+        elif kind == "item":
+            day.items.append(line.value)
+        elif kind == "note":
+            day.notes.append(line.value)
+        elif kind == "title":
+            plan.title = line.value
+        elif kind == "hydration":
+            plan.hydration.append(line.value)
+        elif kind == "other":
+            plan.notes.append(line.value)
+
+    return plan
+
+
+def plan_to_json(text):
+    """plans.plan_json for a markdown plan."""
+    return parse_plan(text).to_json()
@@ -0,0 +1,63 @@
+from plan_check import DAY_LINE
+
+# Plans generated as two independent halves (workout, diet) and stitched
+# back together locally in the layout every stored plan uses:
+#
+#   - Title: ...
+#
+#   - 7-Day Workout Plan
+#     - Day 1:
+#       - Exercise: sets × reps
+#   ...
+#   - 7-Day Diet Plan
+#     - Day 1:
+#       - Breakfast: ...
+#   ...
+#   - Hydration:
+#     - Drink 2.5–3 liters of water daily
+
+WORKOUT_HEADER = "- 7-Day Workout Plan"
+DIET_HEADER = "- 7-Day Diet Plan"
+HYDRATION = ["- Hydration:", "  - Drink 2.5–3 liters of water daily"]
+
+
+def _indent(line):
+    return len(line) - len(line.lstrip())
+
+
+def section_days(text):
+    """The Day 1..7 lines of one half, re-indented to sit under a header.
+
+    Whatever the model put before Day 1 (its own title or header) or
+    after the days (hydration, notes) is dropped.
+    """
+    lines = text.strip().splitlines()
+    start = next((i for i, line in enumerate(lines) if DAY_LINE.match(line)), None)
+    if start is None:
+        return []
+
+    base = _indent(lines[start])
+    out = []
+    for line in lines[start:]:
+        if not line.strip():
+            continue
+
+        indent = _indent(line)
+        item = line.strip().lstrip("-*•> ").strip()
+        if indent < base or item.lower().lstrip("#* ").startswith(("hydration", "note")):
+            break
+
+        if DAY_LINE.match(line):
+            out.append(f"  - {item}")
+        else:
+            out.append(" " * max(4, indent - base + 2) + f"- {item}")
+    return out
+
+
+def assemble_plan(title, workout, diet):
+    lines = [f"- Title: {title}", "", WORKOUT_HEADER]
+    lines += section_days(workout)
+    lines += ["", DIET_HEADER]
+    lines += section_days(diet)
+    lines += [""] + HYDRATION
+    return "\n".join(lines)
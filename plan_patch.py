@@ -0,0 +1,248 @@
+import json
+import re
+
+from plan_model import Exercise, parse_plan, scan_plan
+from plan_schema import DAYS, MEALS
+
+# Chat edits as a few targeted operations instead of a rewritten plan.
+#
+# The model answers "replace Day 3 dinner" with
+#
+#   {"ops": [{"op": "set_meal", "day": 3, "meal": "Dinner", "food": "..."}]}
+#
+# which is validated here and applied to the stored markdown itself:
+# only the lines of the targeted day / meal / exercise change, everything
+# else (intros, tips, the model's own formatting) is left as it was. The
+# answer is as long as the change rather than the whole plan, and one cut
+# off mid-way can't silently drop days. A request that really is a new
+# plan ("make it all vegan") comes back as a single "rewrite" op and the
+# caller falls back to a full rewrite.
+#
+#   set_workout       day, focus, exercises   replace a day's workout
+#   replace_exercise  day, old, name, detail  swap one exercise
+#   add_exercise      day, name, detail
+#   remove_exercise   day, old
+#   set_meal          day, meal, food         replace (or add) one meal
+#   rewrite                                   not expressible as patches
+
+OPS = ("set_workout", "replace_exercise", "add_exercise", "remove_exercise",
+       "set_meal", "rewrite")
+
+_EXERCISE = {
+    "type": "OBJECT",
+    "properties": {
+        "name": {"type": "STRING"},
+        "detail": {"type": "STRING", "description": "sets × reps, or duration"},
+    },
+    "required": ["name"],
+}
+
+# Gemini schemas have no oneOf: one flat op object, fields used per op
+PATCH_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "ops": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "op": {"type": "STRING", "enum": list(OPS)},
+                    "day": {"type": "INTEGER", "description": "1 to 7"},
+                    "focus": {"type": "STRING"},
+                    "exercises": {"type": "ARRAY", "items": _EXERCISE},
+                    "old": {"type": "STRING", "description": "name of the exercise to change"},
+                    "name": {"type": "STRING"},
+                    "detail": {"type": "STRING"},
+                    "meal": {"type": "STRING", "enum": list(MEALS)},
+                    "food": {"type": "STRING"},
+                },
+                "required": ["op"],
+            },
+        },
+    },
+    "required": ["ops"],
+}
+
+
+class PatchError(ValueError):
+    """The answer can't be applied as a patch; the message says why."""
+
+
+class RewriteNeeded(PatchError):
+    """The model asked for a full rewrite instead of patching."""
+
+
+def _text(value):
+    return " ".join(str(value or "").split())
+
+
+def _day(op):
+    try:
+        day = int(op.get("day"))
+    except (TypeError, ValueError):
+        raise PatchError(f"{op['op']} has no day") from None
+    if not 1 <= day <= DAYS:
+        raise PatchError(f"{op['op']} targets Day {day}")
+    return day
+
+
+def _need(op, *fields):
+    for field in fields:
+        if not op[field]:
+            raise PatchError(f"{op['op']} on Day {op['day']} has no {field}")
+
+
+def _normalise(op):
+    if not isinstance(op, dict) or op.get("op") not in OPS:
+        raise PatchError(f"unknown operation {op.get('op') if isinstance(op, dict) else op!r}")
+
+    kind = op["op"]
+    if kind == "rewrite":
+        raise RewriteNeeded("the change needs a full rewrite")
+
+    out = {"op": kind, "day": _day(op)}
+
+    if kind == "set_workout":
+        out["focus"] = _text(op.get("focus"))
+        out["exercises"] = [
+            Exercise(_text(e.get("name")), _text(e.get("detail")))
+            for e in op.get("exercises") or () if isinstance(e, dict) and _text(e.get("name"))
+        ]
+        if not out["exercises"] and not out["focus"]:
+            raise PatchError(f"set_workout on Day {out['day']} is empty")
+
+    elif kind == "set_meal":
+        meal = _text(op.get("meal")).title()
+        out["meal"] = "Snacks" if meal == "Snack" else meal
+        out["food"] = _text(op.get("food"))
+        _need(out, "meal", "food")
+
+    else:
+        out["old"] = _text(op.get("old"))
+        out["name"] = _text(op.get("name"))
+        out["detail"] = _text(op.get("detail"))
+        _need(out, *{"replace_exercise": ("old", "name"),
+                     "add_exercise": ("name",),
+                     "remove_exercise": ("old",)}[kind])
+    return out
+
+
+def parse_patch(text):
+    """Validated operations from the model's JSON answer.
+
+    Raises RewriteNeeded when the model asked for a full rewrite and
+    PatchError when the answer is not a usable patch.
+    """
+    try:
+        data = json.loads(text)
+    except (TypeError, ValueError):
+        raise PatchError("answer is not valid JSON") from None
+
+    ops = data.get("ops") if isinstance(data, dict) else None
+    if not isinstance(ops, list) or not ops:
+        raise PatchError("answer has no operations")
+    return [_normalise(op) for op in ops]
+
+
+# Indentation and bullet of a line, reused for the lines written next to it
+_PREFIX = re.compile(r"^\s*(?:[-*•]\s+)?")
+
+
+def _find(names, old, day):
+    key = old.lower()
+    for i, name in enumerate(names):
+        if name.lower() == key:
+            return i
+    # "Squats" for "Bodyweight Squats" and the like
+    matches = [i for i, name in enumerate(names)
+               if key in name.lower() or name.lower() in key]
+    if len(matches) == 1:
+        return matches[0]
+    raise PatchError(f"Day {day} has no exercise {old!r}")
+
+
+def _day_block(text, section, day):
+    """(day PlanLine, its item / note PlanLines) for one day of a section."""
+    head, body = None, []
+    for line in scan_plan(text):
+        if head is None:
+            if line.kind == "day" and line.section == section and line.day == day:
+                head = line
+        elif line.kind in ("item", "note") and line.day == day:
+            body.append(line)
+        else:
+            break
+    if head is None:
+        raise PatchError(f"the plan has no {section} for Day {day}")
+    return head, body
+
+
+def _apply(text, op):
+    lines = text.splitlines()
+    kind, number = op["op"], op["day"]
+    head, body = _day_block(text, "diet" if kind == "set_meal" else "workout", number)
+    items = [line for line in body if line.kind == "item"]
+
+    if body:
+        prefix = _PREFIX.match(lines[body[0].index]).group()
+    else:
+        prefix = " " * (len(lines[head.index]) - len(lines[head.index].lstrip()) + 2) + "- "
+    after = (items or [head])[-1].index    # new items go below the last one
+
+    if kind == "set_meal":
+        meal = f"{op['meal']}: {op['food']}"
+        match = next((line for line in items if line.value.meal == op["meal"]), None)
+        # "Day 2: Breakfast: ..." keeps its first meal on the Day line
+        if head.value and parse_plan(text).diet_day(number).meals[0].meal == op["meal"]:
+            lines[head.index] = _PREFIX.match(lines[head.index]).group() + f"Day {number}: {meal}"
+        elif match is not None:
+            lines[match.index] = _PREFIX.match(lines[match.index]).group() + meal
+        else:
+            # Breakfast, Lunch, Dinner, Snacks order
+            order = {name: i for i, name in enumerate(MEALS)}
+            later = next((line for line in items
+                          if order.get(line.value.meal, len(MEALS)) > order[op["meal"]]), None)
+            at = later.index if later is not None else after + 1
+            lines.insert(at, prefix + meal)
+
+    elif kind == "set_workout":
+        day = _PREFIX.match(lines[head.index]).group() + f"Day {number}:"
+        lines[head.index] = day + (f" {op['focus']}" if op["focus"] else "")
+        new = [prefix + e.to_markdown() for e in op["exercises"]]
+        if body:
+            lines[body[0].index:body[-1].index + 1] = new
+        else:
+            lines[head.index + 1:head.index + 1] = new
+
+    elif kind == "add_exercise":
+        lines.insert(after + 1, prefix + Exercise(op["name"], op["detail"]).to_markdown())
+
+    else:
+        at = items[_find([line.value.name for line in items], op["old"], number)].index
+        if kind == "replace_exercise":
+            lines[at] = (_PREFIX.match(lines[at]).group()
+                         + Exercise(op["name"], op["detail"]).to_markdown())
+        else:
+            del lines[at]
+
+    return "\n".join(lines)
+
+
+def apply_patch(text, ops):
+    """The plan markdown `text` with `ops` (from parse_patch) applied.
+
+    Only the lines an operation targets are rewritten. Raises PatchError
+    when an operation doesn't fit the plan (a day or exercise that isn't
+    there) or the result is missing a day.
+    """
+    patched = text
+    for op in ops:
+        patched = _apply(patched, op)
+    if text.endswith("\n"):
+        patched += "\n"
+
+    missing = parse_plan(patched).missing_days()
+    if missing:
+        section, day = missing[0]
+        raise PatchError(f"the patched plan has no {section} for Day {day}")
+    return patched
@@ -0,0 +1,165 @@
+import json
+
+from plan_model import Plan
+
+# Plans generated as schema-constrained JSON instead of free text.
+#
+# The model is held to PLAN_SCHEMA (Gemini's response_schema), the answer
+# is checked here against the rules the schema cannot express (days 1..7
+# each exactly once, every main meal present), and the markdown every
+# stored plan uses is rendered locally, so no second "fix the format"
+# call is needed and completeness is exact rather than guessed from text.
+
+DAYS = 7
+MEALS = ("Breakfast", "Lunch", "Dinner", "Snacks")
+REQUIRED_MEALS = ("Breakfast", "Lunch", "Dinner")
+
+_DAY = {"type": "INTEGER", "description": "1 to 7"}
+
+PLAN_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "title": {"type": "STRING"},
+        "workout": {
+            "type": "ARRAY",
+            "min_items": DAYS,
+            "max_items": DAYS,
+            "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "day": _DAY,
+                    "focus": {"type": "STRING"},
+                    "exercises": {
+                        "type": "ARRAY",
+                        "min_items": 1,
+                        "items": {
+                            "type": "OBJECT",
+                            "properties": {
+                                "name": {"type": "STRING"},
+                                "detail": {"type": "STRING",
+                                           "description": "sets × reps, or duration"},
+                            },
+                            "required": ["name"],
+                        },
+                    },
+                },
+                "required": ["day", "exercises"],
+            },
+        },
+        "diet": {
+            "type": "ARRAY",
+            "min_items": DAYS,
+            "max_items": DAYS,
+            "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "day": _DAY,
+                    "meals": {
+                        "type": "ARRAY",
+                        "min_items": len(REQUIRED_MEALS),
+                        "items": {
+                            "type": "OBJECT",
+                            "properties": {
+                                "meal": {"type": "STRING", "enum": list(MEALS)},
+                                "food": {"type": "STRING"},
+                            },
+                            "required": ["meal", "food"],
+                        },
+                    },
+                },
+                "required": ["day", "meals"],
+            },
+        },
+    },
+    "required": ["title", "workout", "diet"],
+}
+
+
+class PlanSchemaError(ValueError):
+    """The model's JSON is not a complete plan; the message says why."""
+
+
+def _text(value):
+    return " ".join(str(value or "").split())
+
+
+def _days(items, section, check):
+    if not isinstance(items, list):
+        raise PlanSchemaError(f"{section} is not a list of days")
+
+    days = {}
+    for item in items:
+        if not isinstance(item, dict):
+            raise PlanSchemaError(f"{section} has a day that is not an object")
+        try:
+            day = int(item.get("day"))
+        except (TypeError, ValueError):
+            raise PlanSchemaError(f"{section} has a day without a number") from None
+        if not 1 <= day <= DAYS:
+            raise PlanSchemaError(f"{section} has Day {day}")
+        if day in days:
+            raise PlanSchemaError(f"{section} repeats Day {day}")
+        days[day] = check(day, item)
+
+    missing = [day for day in range(1, DAYS + 1) if day not in days]
+    if missing:
+        raise PlanSchemaError(f"{section} is missing Day {missing[0]}")
+    return [days[day] for day in range(1, DAYS + 1)]
+
+
+def _workout_day(day, item):
+    exercises = []
+    for exercise in item.get("exercises") or ():
+        name = _text(exercise.get("name") if isinstance(exercise, dict) else exercise)
+        if name:
+            detail = _text(exercise.get("detail")) if isinstance(exercise, dict) else ""
+            exercises.append({"name": name, "detail": detail})
+    if not exercises:
+        raise PlanSchemaError(f"workout Day {day} has no exercises")
+    return {"day": day, "focus": _text(item.get("focus")), "exercises": exercises}
+
+
+def _diet_day(day, item):
+    meals = []
+    for meal in item.get("meals") or ():
+        if not isinstance(meal, dict):
+            continue
+        name = _text(meal.get("meal")).title()
+        food = _text(meal.get("food"))
+        if name == "Snack":
+            name = "Snacks"
+        if name in MEALS and food:
+            meals.append({"meal": name, "food": food})
+
+    have = {meal["meal"] for meal in meals}
+    for name in REQUIRED_MEALS:
+        if name not in have:
+            raise PlanSchemaError(f"diet Day {day} has no {name.lower()}")
+    return {"day": day, "meals": meals}
+
+
+def parse_plan_json(text):
+    """Validated, normalised plan dict from the model's JSON answer.
+
+    Raises PlanSchemaError when the answer is not complete.
+    """
+    try:
+        data = json.loads(text)
+    except (TypeError, ValueError):
+        raise PlanSchemaError("answer is not valid JSON") from None
+    if not isinstance(data, dict):
+        raise PlanSchemaError("answer is not a JSON object")
+
+    return {
+        "title": _text(data.get("title")) or "7-Day Fitness Plan",
+        "workout": _days(data.get("workout"), "workout", _workout_day),
+        "diet": _days(data.get("diet"), "diet", _diet_day),
+    }
+
+
+def render_plan(plan, title=None):
+    """The stored markdown layout for a parse_plan_json() result."""
+    model = Plan.from_dict(plan)
+    if title:
+        model.title = title
+    return model.to_markdown()
@@ -0,0 +1,55 @@
+from plan_model import Plan, parse_plan
+
+# Compact "already used" list for the week-N prompt.
+#
+# The model only needs last week's plan to avoid repeating it, so instead
+# of pasting whole plans we pass the exercise names and meal items they
+# used, deduplicated across the last few weeks:
+#
+#   Exercises: Push-ups, Goblet Squat, Plank, ...
+#   Meals: Poha with peanuts; Idli with sambar; Rajma chawal; ...
+
+_REST = ("rest", "active recovery", "light activity", "recovery")
+
+
+def estimate_tokens(text):
+    # Same ~4 characters per token rule ai_api uses for its quota
+    return len(text or "") // 4
+
+
+def extract_items(plan):
+    """(exercise names, meal items) used by a plan, in order of appearance.
+
+    `plan` is markdown or an already parsed plan_model.Plan.
+    """
+    if not isinstance(plan, Plan):
+        plan = parse_plan(plan)
+
+    exercises, meals = {}, {}
+    for name in plan.exercise_names():
+        if name and not name.lower().startswith(_REST):
+            exercises.setdefault(name.lower(), name)
+    for food in plan.foods():
+        food = food.strip(" .")
+        if food:
+            meals.setdefault(food.lower(), food)
+
+    return list(exercises.values()), list(meals.values())
+
+
+def summarize_plans(plans, max_items=40):
+    """One compact block for any number of plans, newest first."""
+    exercises, meals = {}, {}
+    for plan in plans:
+        names, foods = extract_items(plan)
+        for name in names:
+            exercises.setdefault(name.lower(), name)
+        for food in foods:
+            meals.setdefault(food.lower(), food)
+
+    exercises = list(exercises.values())[:max_items]
+    meals = list(meals.values())[:max_items]
+    return (
+        f"Exercises: {', '.join(exercises) or 'none'}\n"
+        f"Meals: {'; '.join(meals) or 'none'}"
+    )
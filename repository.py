@@ -0,0 +1,745 @@
+import csv
+import functools
+import io
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from plan_codec import encode_plan, decode_plan
+from plan_delta import version_rows, replay
+from plan_model import Plan, parse_plan
+from statements import compile_statements
+
+# Every query the app runs, behind one interface.
+#
+#   PostgresRepository  the hosted database, through database.py's pool
+#   SQLiteRepository    one local file; no server, no network
+#
+# database.py picks one from the DB_BACKEND setting and layers the
+# per-user read cache on top, so pages never issue SQL themselves.
+# Statements come from the named registry in statements.py; a backend
+# only supplies transactions, how a named statement is executed and the
+# few dialect differences (PLAN_BLOB, row locks, array parameters).
+
+
+@dataclass(frozen=True)
+class UserState:
+    profile: Optional[tuple]
+    plan_count: int
+    latest_week: int
+    latest_plan: Optional[str]
+    preferences: str
+
+
+@dataclass(frozen=True)
+class GenerationJob:
+    id: int
+    user_id: int
+    week: int
+    kind: str
+    status: str                 # queued, running, done or failed
+    result: Optional[str]
+    error: Optional[str]
+    created_at: datetime
+    updated_at: datetime
+
+
+# ---------------- SHARED FLOWS ----------------
+# Multi-step operations written once, as generators that yield
+# (op, *args) and are sent each op's result (an op's exception is thrown
+# back in). Repository / database.py drive them with run_flow and
+# async_db with its awaiting twin, so a fix can't reach only one backend.
+
+def run_flow(flow, ops):
+    """Run `flow` to its return value; `ops` maps op names to callables."""
+    send, value = flow.send, None
+    while True:
+        try:
+            op, *args = send(value)
+        except StopIteration as done:
+            return done.value
+        try:
+            send, value = flow.send, ops[op](*args)
+        except Exception as e:
+            send, value = flow.throw, e
+
+
+def stale_cutoff(stale_after):
+    # Stored timestamps are UTC (CURRENT_TIMESTAMP)
+    return datetime.utcnow() - timedelta(seconds=stale_after)
+
+
+def _queue_job(user_id, week, kind, stale_before):
+    yield "run", "job_expire", (user_id, week, stale_before)
+    job_id = yield "value", "job_active", (user_id, week)
+    if job_id is not None:
+        return job_id, False
+    return (yield "value", "job_insert", (user_id, week, kind)), True
+
+
+def create_job_flow(user_id, week, kind, stale_before, duplicate):
+    """Queue a job unless one is active for (user_id, week).
+
+    Yields "transaction" ops whose statements are "run" / "value" ops;
+    returns (job_id, created). `duplicate` is the backend's unique
+    violation.
+    """
+    while True:
+        try:
+            return (yield "transaction", _queue_job(user_id, week, kind, stale_before))
+        except duplicate:
+            # Another process queued it between our check and insert;
+            # the next pass finds it active
+            continue
+
+
+class Repository:
+    name = None
+
+    # Raised by the driver when an INSERT hits a UNIQUE constraint
+    DuplicateError = Exception
+
+    # Plan body as plan_codec bytes
+    PLAN_BLOB = "plan_z"
+
+    # Row lock taken before a read-modify-write of one plan
+    FOR_UPDATE = ""
+
+    def __init__(self):
+        self.statements = compile_statements(self.PLAN_BLOB, self.FOR_UPDATE)
+
+    # ---------------- BACKEND HOOKS ----------------
+
+    @contextmanager
+    def transaction(self, write=False):
+        """Yield a cursor; commit on success if `write`, roll back on error."""
+        raise NotImplementedError
+
+    def execute(self, cur, name, params=()):
+        """Run registry statement `name` (see statements.py)."""
+        cur.execute(self.statements[name].text, params)
+
+    def executemany(self, cur, name, rows):
+        cur.executemany(self.statements[name].text, rows)
+
+    def close(self):
+        pass
+
+    def _in_transaction(self, flow):
+        # A shared flow's statements, in one write transaction
+        def value(name, params):
+            self.execute(cur, name, params)
+            row = cur.fetchone()
+            return row[0] if row else None
+
+        with self.transaction(write=True) as cur:
+            return run_flow(flow, {
+                "run": lambda name, params: self.execute(cur, name, params),
+                "value": value,
+            })
+
+    # ---------------- USERS ----------------
+
+    def create_user(self, username, password_hash) -> bool:
+        try:
+            with self.transaction(write=True) as cur:
+                self.execute(cur, "user_insert", (username, password_hash))
+            return True
+        except self.DuplicateError:
+            return False
+
+    def find_user(self, username, password_hash):
+        with self.transaction() as cur:
+            self.execute(cur, "login", (username, password_hash))
+            row = cur.fetchone()
+        return tuple(row) if row else None
+
+    def user_exists(self, username) -> bool:
+        with self.transaction() as cur:
+            self.execute(cur, "user_exists", (username,))
+            return cur.fetchone() is not None
+
+    def get_all_users(self):
+        with self.transaction() as cur:
+            self.execute(cur, "all_users")
+            return [tuple(row) for row in cur.fetchall()]
+
+    def delete_user(self, uid):
+        # Child rows go with it through ON DELETE CASCADE
+        with self.transaction(write=True) as cur:
+            self.execute(cur, "user_delete", (uid,))
+
+    def delete_users(self, user_ids) -> int:
+        with self.transaction(write=True) as cur:
+            self.execute(cur, "users_purge_chunk", (list(user_ids),))
+            return cur.rowcount
+
+    def count_inactive_users(self, cutoff):
+        with self.transaction() as cur:
+            self.execute(cur, "inactive_count", {"cutoff": cutoff})
+            return cur.fetchone()[0]
+
+    def find_inactive_users(self, cutoff, after_id=0, limit=500):
+        # Keyset page over users with no plan or progress since `cutoff`
+        with self.transaction() as cur:
+            self.execute(cur, "inactive_users",
+                         {"cutoff": cutoff, "after": after_id, "limit": limit})
+            return [row[0] for row in cur.fetchall()]
+
+    # ---------------- PLANS ----------------
+
+    def get_plan_history(self, user_id):
+        with self.transaction() as cur:
+            self.execute(cur, "plan_history", (user_id,))
+
+            return tuple(
+                (plan_id, week, decode_plan(blob), ts)
+                for plan_id, week, blob, ts in cur.fetchall()
+            )
+
+    def get_plan_index(self, user_id, before_week, limit):
+        with self.transaction() as cur:
+            self.execute(cur, "plan_index", (user_id, before_week, limit + 1))
+            rows = cur.fetchall()
+
+        more = len(rows) > limit
+        rows = tuple(tuple(row) for row in rows[:limit])
+        return rows, (rows[-1][1] if more else None)
+
+    def get_plan_body(self, plan_id):
+        with self.transaction() as cur:
+            self.execute(cur, "plan_body", (plan_id,))
+            row = cur.fetchone()
+
+        return decode_plan(row[0]) if row else None
+
+    def get_plan_model(self, plan_id) -> Optional[Plan]:
+        """The parsed plan_model.Plan for a plan, without reading its text.
+
+        Rows written before plan_json existed are parsed from the text.
+        """
+        with self.transaction() as cur:
+            self.execute(cur, "plan_model", (plan_id,))
+            row = cur.fetchone()
+
+        if not row:
+            return None
+        if row[0] is not None:
+            return Plan.from_json(row[0])
+        return parse_plan(self.get_plan_body(plan_id))
+
+    def _lock_plan(self, cur, user_id, week):
+        self.execute(cur, "plan_lock", (user_id, week))
+        row = cur.fetchone()
+        return (row[0], decode_plan(row[1])) if row else (None, None)
+
+    def _write_plan(self, cur, plan_id, plan):
+        self.execute(cur, "plan_write",
+                     (encode_plan(plan), len(plan), parse_plan(plan).to_json(), plan_id))
+
+    def save_plan(self, user_id, week, plan, note="generated"):
+        # Insert or replace the plan for the SAME week
+        with self.transaction(write=True) as cur:
+            _, parent = self._lock_plan(cur, user_id, week)
+
+            self.execute(cur, "plan_upsert",
+                         (user_id, week, encode_plan(plan), len(plan),
+                          parse_plan(plan).to_json()))
+            plan_id = cur.fetchone()[0]
+
+            self._append_version(cur, plan_id, user_id, week, parent, plan, note)
+
+    def update_plan(self, user_id, week, plan, note="chat edit") -> bool:
+        with self.transaction(write=True) as cur:
+            plan_id, parent = self._lock_plan(cur, user_id, week)
+            if plan_id is None:
+                return False
+
+            self._write_plan(cur, plan_id, plan)
+            self._append_version(cur, plan_id, user_id, week, parent, plan, note)
+            return True
+
+    def delete_plan(self, plan_id):
+        """Delete a plan and that week's check-in; returns (user_id, week)."""
+        with self.transaction(write=True) as cur:
+            self.execute(cur, "plan_delete", (plan_id,))
+            row = cur.fetchone()
+            if not row:
+                return None
+
+            user_id, week = row
+            self.execute(cur, "progress_delete_week", (user_id, week))
+            return user_id, week
+
+    def count_legacy_plans(self):
+        with self.transaction() as cur:
+            self.execute(cur, "legacy_plan_count")
+            return cur.fetchone()[0]
+
+    def compress_legacy_plans(self, after_id, limit):
+        """Move one id-ordered batch of text plans into plan_z; returns its ids."""
+        with self.transaction(write=True) as cur:
+            self.execute(cur, "legacy_plan_batch", (after_id, limit))
+            rows = cur.fetchall()
+
+            # Rows a live write converted meanwhile are skipped by plan_z IS NULL
+            self.executemany(cur, "legacy_plan_compress", [
+                (encode_plan(plan), len(plan), parse_plan(plan).to_json(), plan_id)
+                for plan_id, plan in rows
+            ])
+
+        return [plan_id for plan_id, _ in rows]
+
+    # ---------------- PLAN VERSIONS ----------------
+
+    def _append_version(self, cur, plan_id, user_id, week, parent, plan, note):
+        self.execute(cur, "version_head", (plan_id,))
+        head = cur.fetchone()[0] or 0
+
+        for version, is_snapshot, payload, row_note in version_rows(head, parent, plan, note):
+            self.execute(cur, "version_insert", (
+                plan_id, user_id, week, version, version - 1 or None,
+                is_snapshot, payload, len(payload), row_note
+            ))
+
+    def list_plan_versions(self, user_id, week):
+        with self.transaction() as cur:
+            self.execute(cur, "version_list", (user_id, week))
+            return tuple(tuple(row) for row in cur.fetchall())
+
+    def _materialize(self, cur, plan_id, version):
+        self.execute(cur, "version_replay", {"pid": plan_id, "v": version})
+        return replay(cur.fetchall(), version)
+
+    def get_plan_version(self, user_id, week, version):
+        with self.transaction() as cur:
+            self.execute(cur, "plan_id", (user_id, week))
+            row = cur.fetchone()
+            return self._materialize(cur, row[0], version) if row else None
+
+    def rollback_plan(self, user_id, week, version):
+        with self.transaction(write=True) as cur:
+            plan_id, current = self._lock_plan(cur, user_id, week)
+            if plan_id is None:
+                return None
+
+            text = self._materialize(cur, plan_id, version)
+            if text is None:
+                return None
+
+            self._write_plan(cur, plan_id, text)
+            self._append_version(cur, plan_id, user_id, week, current, text,
+                                 f"rolled back to v{version}")
+            return text
+
+    # ---------------- PROFILE ----------------
+
+    def get_user_profile(self, user_id):
+        with self.transaction() as cur:
+            self.execute(cur, "profile", (user_id,))
+            row = cur.fetchone()
+        return tuple(row) if row else None
+
+    def upsert_user_profile(self, user_id, age, height, weight,
+                            state, city, goal, diet, workout_place, budget):
+        with self.transaction(write=True) as cur:
+            self.execute(cur, "profile_upsert", (
+                user_id, age, height, weight,
+                state, city, goal, diet, workout_place, budget
+            ))
+
+    # ---------------- PROGRESS ----------------
+
+    def get_user_progress(self, user_id):
+        with self.transaction() as cur:
+            self.execute(cur, "progress", (user_id,))
+            return tuple(tuple(row) for row in cur.fetchall())
+
+    def record_progress(self, user_id, week, weight, difficulty):
+        # Weekly check-in also moves the profile weight forward
+        with self.transaction(write=True) as cur:
+            self.execute(cur, "progress_insert", (user_id, week, weight, difficulty))
+            self.execute(cur, "weight_update", (weight, user_id))
+
+    # ---------------- PREFERENCES ----------------
+
+    def save_preferences(self, user_id, preferences):
+        with self.transaction(write=True) as cur:
+            self.execute(cur, "preferences_upsert", (user_id, preferences))
+
+    # ---------------- GENERATION JOBS ----------------
+
+    def create_job(self, user_id, week, kind, stale_before):
+        """Queue a job unless one is active for (user_id, week).
+
+        Returns (job_id, created). Active jobs last touched before
+        `stale_before` belonged to a process that died and are failed first.
+        """
+        flow = create_job_flow(user_id, week, kind, stale_before, self.DuplicateError)
+        return run_flow(flow, {"transaction": self._in_transaction})
+
+    def update_job(self, job_id, status, result=None, error=None):
+        with self.transaction(write=True) as cur:
+            self.execute(cur, "job_update", (status, result, error, job_id))
+
+    def touch_jobs(self, job_ids):
+        with self.transaction(write=True) as cur:
+            self.executemany(cur, "job_touch", [(job_id,) for job_id in job_ids])
+
+    def get_job(self, job_id) -> Optional[GenerationJob]:
+        with self.transaction() as cur:
+            self.execute(cur, "job_get", (job_id,))
+            row = cur.fetchone()
+        return GenerationJob(*row) if row else None
+
+    def get_latest_job(self, user_id, week) -> Optional[GenerationJob]:
+        with self.transaction() as cur:
+            self.execute(cur, "job_latest", (user_id, week))
+            row = cur.fetchone()
+        return GenerationJob(*row) if row else None
+
+    # ---------------- SESSION STATE ----------------
+
+    def load_user_state(self, user_id) -> UserState:
+        with self.transaction() as cur:
+            self.execute(cur, "user_state", {"uid": user_id})
+            row = cur.fetchone()
+
+        return UserState(
+            profile=tuple(row[:9]) if row[9] else None,
+            plan_count=row[10],
+            latest_week=row[11],
+            latest_plan=decode_plan(row[12]),
+            preferences=row[13] or "",
+        )
+
+    # ---------------- BULK LOAD ----------------
+
+    def max_id(self, table):
+        with self.transaction() as cur:
+            cur.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}")
+            return cur.fetchone()[0]
+
+    def copy_rows(self, cur, table, columns, rows):
+        """Bulk insert inside an open transaction."""
+        marks = ", ".join(["%s"] * len(columns))
+        cur.executemany(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({marks})", rows
+        )
+
+    def sync_id_sequence(self, table):
+        # After rows were loaded with explicit ids; AUTOINCREMENT follows them
+        pass
+
+    def analyze(self):
+        with self.transaction(write=True) as cur:
+            cur.execute("ANALYZE")
+
+# ---------------- POSTGRES ----------------
+
+def _copy_value(value):
+    # COPY csv: unquoted empty field is NULL, bytea goes in as hex
+    if isinstance(value, (bytes, memoryview)):
+        return "\\x" + bytes(value).hex()
+    if isinstance(value, datetime):
+        return value.isoformat(" ")
+    return value
+
+
+class PostgresRepository(Repository):
+    name = "postgres"
+
+    # Compressed body when present, else the legacy text column tagged as
+    # raw UTF-8 (plan_codec format 0) so decode_plan handles both.
+    PLAN_BLOB = "COALESCE(plan_z, '\\x00'::bytea || convert_to(plan, 'UTF8'))"
+    FOR_UPDATE = "FOR UPDATE"
+
+    def __init__(self, get_connection, prepare=True):
+        import psycopg2.errors
+        import psycopg2.extras
+
+        super().__init__()
+        self._get_connection = get_connection
+        self._prepare = prepare
+        self._execute_batch = psycopg2.extras.execute_batch
+        self._not_prepared = psycopg2.errors.InvalidSqlStatementName
+        self.DuplicateError = psycopg2.errors.UniqueViolation
+
+    @contextmanager
+    def transaction(self, write=False):
+        # Reads are left to the pool, which rolls back on return
+        with self._get_connection() as conn, conn.cursor() as cur:
+            yield cur
+            if write:
+                conn.commit()
+
+    def _prepared(self, cur, name):
+        """EXECUTE text for `name`, PREPAREd on first use on this connection.
+
+        Connections from database.PreparedConnection carry the set of names
+        their session has prepared; any other connection (or prepare=False,
+        e.g. behind a transaction-mode PgBouncer) runs the plain text.
+        """
+        stmt = self.statements[name]
+        prepared = getattr(cur.connection, "prepared", None)
+        if not self._prepare or prepared is None:
+            return stmt.text, False
+
+        if name not in prepared:
+            cur.execute(f"PREPARE {name} AS {stmt.numbered}")
+            prepared.add(name)
+
+        args = f"({', '.join(['%s'] * stmt.arity)})" if stmt.arity else ""
+        return f"EXECUTE {name}{args}", True
+
+    def execute(self, cur, name, params=()):
+        sql, by_name = self._prepared(cur, name)
+        if not by_name:
+            cur.execute(sql, params)
+            return
+
+        try:
+            cur.execute(sql, self.statements[name].positional(params))
+        except self._not_prepared:
+            # Session lost it (DISCARD ALL, server-side reset): re-prepare next time
+            cur.connection.prepared.clear()
+            raise
+
+    def executemany(self, cur, name, rows):
+        sql, _ = self._prepared(cur, name)
+        self._execute_batch(cur, sql, rows)
+
+    def copy_rows(self, cur, table, columns, rows):
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        for row in rows:
+            writer.writerow([_copy_value(v) for v in row])
+        buf.seek(0)
+
+        cur.copy_expert(
+            f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buf
+        )
+
+    def sync_id_sequence(self, table):
+        with self.transaction(write=True) as cur:
+            cur.execute(f"""
+                SELECT setval(pg_get_serial_sequence('{table}', 'id'),
+                              (SELECT COALESCE(MAX(id), 1) FROM {table}))
+            """)
+
+# ---------------- SQLITE ----------------
+
+# Same tables, constraints and cascades as migrations.py, in SQLite's
+# dialect. Append only, applied in order and tracked in PRAGMA user_version.
+SQLITE_MIGRATIONS = [
+    (1, """
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL UNIQUE,
+            password_hash TEXT NOT NULL,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+
+        CREATE TABLE IF NOT EXISTS user_profile (
+            user_id INTEGER PRIMARY KEY
+                REFERENCES users(id) ON DELETE CASCADE,
+            age INTEGER,
+            height REAL,
+            weight REAL,
+            state TEXT,
+            city TEXT,
+            goal TEXT,
+            diet TEXT,
+            workout_place TEXT,
+            budget INTEGER
+        );
+
+        CREATE TABLE IF NOT EXISTS plans (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            week INTEGER NOT NULL,
+            plan TEXT,
+            plan_z BLOB,
+            plan_length INTEGER,
+            timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (user_id, week)
+        );
+        CREATE INDEX IF NOT EXISTS plans_user_timestamp_idx
+            ON plans (user_id, timestamp DESC);
+        CREATE INDEX IF NOT EXISTS plans_history_idx
+            ON plans (user_id, week DESC, id, timestamp, plan_length);
+
+        CREATE TABLE IF NOT EXISTS progress (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            week INTEGER NOT NULL,
+            weight REAL,
+            difficulty TEXT,
+            timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE INDEX IF NOT EXISTS progress_user_week_idx
+            ON progress (user_id, week);
+
+        CREATE TABLE IF NOT EXISTS preferences (
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            key TEXT NOT NULL,
+            value TEXT,
+            PRIMARY KEY (user_id, key)
+        );
+
+        CREATE TABLE IF NOT EXISTS chats (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            role TEXT NOT NULL,
+            message TEXT NOT NULL,
+            timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE INDEX IF NOT EXISTS chats_user_idx ON chats (user_id);
+
+        CREATE TABLE IF NOT EXISTS plan_versions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            plan_id INTEGER REFERENCES plans(id) ON DELETE CASCADE,
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            week INTEGER NOT NULL,
+            version INTEGER,
+            parent_version INTEGER,
+            is_snapshot BOOLEAN NOT NULL DEFAULT 0,
+            payload BLOB,
+            payload_size INTEGER,
+            note TEXT,
+            timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE INDEX IF NOT EXISTS plan_versions_user_week_idx
+            ON plan_versions (user_id, week);
+        CREATE UNIQUE INDEX IF NOT EXISTS plan_versions_plan_version_idx
+            ON plan_versions (plan_id, version);
+    """),
+
+    (2, """
+        CREATE TABLE IF NOT EXISTS generation_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            week INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            result TEXT,
+            error TEXT,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS generation_jobs_active_idx
+            ON generation_jobs (user_id, week)
+            WHERE status IN ('queued', 'running');
+        CREATE INDEX IF NOT EXISTS generation_jobs_user_week_idx
+            ON generation_jobs (user_id, week, id DESC);
+    """),
+
+    (3, """
+        ALTER TABLE plans ADD COLUMN plan_json TEXT
+    """),
+]
+
+# CURRENT_TIMESTAMP is stored as 'YYYY-MM-DD HH:MM:SS' text; read it back
+# as datetime and write Python datetimes in the same sortable shape.
+sqlite3.register_adapter(datetime, lambda d: d.isoformat(" "))
+sqlite3.register_adapter(date, lambda d: d.isoformat())
+sqlite3.register_converter(
+    "TIMESTAMP", lambda b: datetime.fromisoformat(b.decode())
+)
+sqlite3.register_converter("BOOLEAN", lambda b: b not in (b"0", b""))
+
+_NAMED_PARAM = re.compile(r"%\((\w+)\)s")
+
+
+@functools.lru_cache(maxsize=256)
+def _to_sqlite(sql):
+    # %(name)s -> :name, %s -> ?
+    return _NAMED_PARAM.sub(r":\1", sql).replace("%s", "?")
+
+
+class _SQLiteCursor:
+    def __init__(self, cur):
+        self._cur = cur
+
+    def execute(self, sql, params=()):
+        self._cur.execute(_to_sqlite(sql), params)
+
+    def executemany(self, sql, rows):
+        self._cur.executemany(_to_sqlite(sql), rows)
+
+    def __getattr__(self, name):
+        return getattr(self._cur, name)
+
+
+class SQLiteRepository(Repository):
+    """Embedded backend for local runs, load tests and benchmarks.
+
+    One connection shared by every thread behind a lock: SQLite serialises
+    writers anyway, and explicit BEGIN IMMEDIATE gives the same
+    read-modify-write safety that FOR UPDATE gives on Postgres.
+    """
+
+    name = "sqlite"
+    DuplicateError = sqlite3.IntegrityError
+
+    def __init__(self, path="fitai.db", cached_statements=None):
+        super().__init__()
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(
+            path,
+            isolation_level=None,           # we issue BEGIN / COMMIT ourselves
+            check_same_thread=False,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            # Room for the whole registry: each statement is compiled once
+            cached_statements=(len(self.statements) + 32
+                               if cached_statements is None else cached_statements),
+        )
+        self._conn.execute("PRAGMA foreign_keys = ON")
+        self._conn.execute("PRAGMA busy_timeout = 10000")
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode = WAL")
+        self._migrate()
+
+    def _migrate(self):
+        with self._lock:
+            current = self._conn.execute("PRAGMA user_version").fetchone()[0]
+            for version, sql in SQLITE_MIGRATIONS:
+                if version <= current:
+                    continue
+                self._conn.executescript(f"BEGIN; {sql}; PRAGMA user_version = {version}; COMMIT;")
+
+    @contextmanager
+    def transaction(self, write=False):
+        with self._lock:
+            cur = self._conn.cursor()
+            try:
+                if write:
+                    cur.execute("BEGIN IMMEDIATE")
+                yield _SQLiteCursor(cur)
+                if write:
+                    cur.execute("COMMIT")
+            except BaseException:
+                if self._conn.in_transaction:
+                    self._conn.rollback()
+                raise
+            finally:
+                cur.close()
+
+    def delete_users(self, user_ids) -> int:
+        # No array parameters in SQLite: one placeholder per id
+        ids = list(user_ids)
+        with self.transaction(write=True) as cur:
+            cur.execute(
+                "DELETE FROM users WHERE id IN (" + ",".join(["%s"] * len(ids)) + ")",
+                ids
+            )
+            return cur.rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
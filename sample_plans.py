@@ -0,0 +1,147 @@
+import random
+
+# Realistic plan text in the same markdown shape the AI returns.
+# Used by benchmarks and seeding; not imported by the app itself.
+
+# ---------------- EXERCISES ----------------
+
+HOME_EXERCISES = [
+    "Push-ups", "Incline Push-ups", "Diamond Push-ups", "Pike Push-ups",
+    "Bodyweight Squats", "Jump Squats", "Bulgarian Split Squats",
+    "Walking Lunges", "Reverse Lunges", "Glute Bridges",
+    "Single-leg Glute Bridges", "Wall Sit", "Plank", "Side Plank",
+    "Mountain Climbers", "Burpees", "Bicycle Crunches", "Leg Raises",
+    "Superman Hold", "Chair Dips", "Step-ups", "Calf Raises",
+    "Skipping", "High Knees", "Bear Crawl", "Tempo Squats",
+    "Isometric Lunge Hold", "Hollow Body Hold", "Inchworms",
+    "Surya Namaskar",
+]
+
+GYM_EXERCISES = [
+    "Barbell Back Squat", "Front Squat", "Leg Press", "Romanian Deadlift",
+    "Conventional Deadlift", "Walking Lunges with Dumbbells",
+    "Leg Extension", "Lying Leg Curl", "Standing Calf Raise",
+    "Barbell Bench Press", "Incline Dumbbell Press", "Chest Press Machine",
+    "Cable Fly", "Lat Pulldown", "Seated Cable Row", "Barbell Row",
+    "Single-arm Dumbbell Row", "Pull-ups", "Overhead Press",
+    "Dumbbell Lateral Raise", "Face Pull", "Barbell Curl",
+    "Hammer Curl", "Triceps Pushdown", "Skull Crushers",
+    "Hanging Leg Raise", "Cable Crunch", "Hip Thrust", "Goblet Squat",
+    "Treadmill Incline Walk",
+]
+
+SETS_REPS = ["3 × 8", "3 × 10", "3 × 12", "4 × 8", "4 × 10", "3 × 15",
+             "4 × 6", "3 × 30 sec", "3 × 45 sec", "2 × 20"]
+
+# ---------------- MEALS ----------------
+
+VEG_BREAKFAST = [
+    "Vegetable poha with peanuts", "Idli (3) with sambar",
+    "Besan chilla with mint chutney", "Ragi dosa with coconut chutney",
+    "Vegetable upma", "Oats porridge with banana", "Moong dal cheela",
+    "Paneer paratha with curd", "Sprouts salad with lemon",
+    "Pesarattu with ginger chutney",
+]
+EGG_BREAKFAST = [
+    "Boiled eggs (3) with brown bread", "Egg bhurji with 2 chapatis",
+    "Masala omelette with toast", "Egg dosa with chutney",
+]
+LUNCH = [
+    "Rice, dal, mixed vegetable sabzi and curd",
+    "2 chapatis, rajma curry and salad",
+    "Jeera rice with chana masala and cucumber raita",
+    "Curd rice with pickle and boiled chana",
+    "Sambar rice with beans poriyal",
+    "2 chapatis, palak paneer and salad",
+    "Vegetable pulao with raita",
+    "Millet khichdi with curd",
+    "Lemon rice with peanut and sprouts",
+    "2 chapatis, toor dal and bhindi fry",
+]
+NONVEG_LUNCH = [
+    "Rice with chicken curry and salad",
+    "2 chapatis with fish curry and vegetables",
+    "Chicken biryani (small portion) with raita",
+]
+DINNER = [
+    "2 chapatis with dal and sautéed vegetables",
+    "Vegetable khichdi with curd",
+    "Paneer bhurji with 2 phulkas",
+    "Ragi mudde with sambar",
+    "Dal soup with vegetable stir-fry",
+    "Idiyappam with vegetable stew",
+    "Moong dal with jeera rice (small)",
+    "Soya chunk curry with 2 chapatis",
+]
+EGG_DINNER = [
+    "Egg curry with 2 chapatis", "Boiled eggs with vegetable soup",
+]
+NONVEG_DINNER = [
+    "Grilled chicken with 2 chapatis and salad",
+    "Fish fry (shallow) with rice and rasam",
+]
+
+# ---------------- BUILDER ----------------
+
+def _workout_day(rng, pool, day):
+    if day == 7:
+        return ["    - Active recovery: 20–30 min walk + stretching"]
+    picks = rng.sample(pool, rng.randint(4, 6))
+    return [f"    - {name}: {rng.choice(SETS_REPS)}" for name in picks]
+
+
+def _meal_pools(diet):
+    breakfast, lunch, dinner = list(VEG_BREAKFAST), list(LUNCH), list(DINNER)
+    if diet in ("Eggetarian", "Non-Vegetarian"):
+        breakfast += EGG_BREAKFAST
+        dinner += EGG_DINNER
+    if diet == "Non-Vegetarian":
+        lunch += NONVEG_LUNCH
+        dinner += NONVEG_DINNER
+    return breakfast, lunch, dinner
+
+
+def make_plan(rng=None, week=1, diet="Vegetarian", workout_place="Home",
+              city="Chennai", budget=500):
+    rng = rng or random.Random()
+    pool = GYM_EXERCISES if workout_place == "Gym" else HOME_EXERCISES
+    breakfast, lunch, dinner = _meal_pools(diet)
+
+    lines = [
+        f"- Title: Week {week} Fitness Plan ({workout_place}, {diet}, ₹{budget}/week, {city})",
+        "",
+        "- 7-Day Workout Plan",
+    ]
+    for day in range(1, 8):
+        lines.append(f"  - Day {day}:")
+        lines.extend(_workout_day(rng, pool, day))
+
+    lines += ["", "- 7-Day Diet Plan"]
+    for day in range(1, 8):
+        lines += [
+            f"  - Day {day}:",
+            f"    - Breakfast: {rng.choice(breakfast)}",
+            f"    - Lunch: {rng.choice(lunch)}",
+            f"    - Dinner: {rng.choice(dinner)}",
+        ]
+
+    lines += [
+        "",
+        "- Hydration:",
+        "  - Drink 2.5–3 liters of water daily",
+    ]
+    return "\n".join(lines)
+
+
+def make_corpus(n, seed=42):
+    rng = random.Random(seed)
+    return [
+        make_plan(
+            rng,
+            week=rng.randint(1, 20),
+            diet=rng.choice(["Vegetarian", "Eggetarian", "Non-Vegetarian"]),
+            workout_place=rng.choice(["Home", "Gym"]),
+            budget=rng.randrange(100, 1001, 50),
+        )
+        for _ in range(n)
+    ]
@@ -0,0 +1,172 @@
+import argparse
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+from auth import hash_password
+from database import get_repository, backend_name
+from plan_codec import encode_plan
+from plan_model import plan_to_json
+from profile_options import STATE_CITY_MAP, GOALS, DIETS, WORKOUT_PLACES, DIFFICULTIES
+from sample_plans import make_plan
+
+# Synthetic users with profiles, weekly plans and check-ins, bulk loaded
+# (COPY on Postgres, executemany on SQLite) in one transaction per batch.
+# Building and compressing plan bodies dominates, so batches are generated
+# in worker processes while the parent writes finished ones in order.
+#
+#   python seed.py --users 1000 --weeks 8
+#   python seed.py --users 100000 --weeks 20 --batch 2000
+#   DB_BACKEND=sqlite SQLITE_PATH=load.db python seed.py --users 5000
+#
+# Each batch has its own RNG derived from --seed, so the same arguments
+# always produce the same rows whatever --workers is. Every seeded user
+# logs in with the password "password".
+
+PREFERENCES = [
+    "No eggs on weekdays", "Knee pain, avoid jumping", "Prefer morning workouts",
+    "Lactose intolerant", "Short on time, 30 min max", "No mushrooms",
+    "South Indian meals please", "Avoid heavy dinners",
+]
+
+# Weekly weight change (mean, spread) in kg per goal
+WEIGHT_TREND = {
+    "Fat Loss": (-0.5, 0.3),
+    "Muscle Gain": (0.25, 0.2),
+    "Maintenance": (0.0, 0.2),
+}
+
+
+def _user_rows(rng, uid, plan_id, username, password_hash, weeks, until):
+    state = rng.choice(list(STATE_CITY_MAP))
+    city = rng.choice(STATE_CITY_MAP[state])
+    goal = rng.choice(GOALS)
+    diet = rng.choice(DIETS)
+    place = rng.choice(WORKOUT_PLACES)
+    budget = rng.randrange(100, 1001, 50)
+    age = rng.randint(16, 40)
+    height = round(rng.uniform(150, 190), 1)
+    weight = round(rng.uniform(50, 110), 1)
+
+    created = until - timedelta(days=7 * weeks + rng.randint(0, 180),
+                                minutes=rng.randint(0, 24 * 60))
+    users = [(uid, username, password_hash, created)]
+    plans, progress = [], []
+
+    trend, spread = WEIGHT_TREND[goal]
+    for week in range(1, weeks + 1):
+        at = created + timedelta(days=7 * (week - 1), minutes=rng.randint(1, 30))
+
+        if week > 1:
+            # Check-in submitted right before that week's plan is generated
+            weight = round(weight + rng.gauss(trend, spread), 1)
+            progress.append((uid, week, weight, rng.choice(DIFFICULTIES),
+                             at - timedelta(minutes=1)))
+
+        body = make_plan(rng, week=week, diet=diet, workout_place=place,
+                         city=city, budget=budget)
+        plans.append((plan_id, uid, week, encode_plan(body), len(body),
+                      plan_to_json(body), at))
+        plan_id += 1
+
+    profile = [(uid, age, height, weight, state, city, goal, diet, place, budget)]
+    prefs = [(uid, "user_preferences", rng.choice(PREFERENCES))] \
+        if rng.random() < 0.3 else []
+
+    return users, profile, plans, progress, prefs
+
+
+COLUMNS = {
+    "users": ("id", "username", "password_hash", "created_at"),
+    "user_profile": ("user_id", "age", "height", "weight", "state", "city",
+                     "goal", "diet", "workout_place", "budget"),
+    "plans": ("id", "user_id", "week", "plan_z", "plan_length", "plan_json",
+              "timestamp"),
+    "progress": ("user_id", "week", "weight", "difficulty", "timestamp"),
+    "preferences": ("user_id", "key", "value"),
+}
+
+
+def _make_batch(job):
+    seed, batch_no, first, n, first_uid, first_plan, weeks, until, prefix, \
+        password_hash = job
+    rng = random.Random(f"{seed}:{batch_no}")
+    tables = {name: [] for name in COLUMNS}
+
+    for i in range(n):
+        rows = _user_rows(rng, first_uid + i, first_plan + i * weeks,
+                          f"{prefix}{first + i + 1:07d}", password_hash,
+                          weeks, until)
+        for name, table_rows in zip(COLUMNS, rows):
+            tables[name].extend(table_rows)
+
+    return tables
+
+
+def seed(users, weeks, seed=42, batch_size=1000, until=None, prefix="seed",
+         workers=None):
+    repo = get_repository()
+    until = until or datetime.combine(datetime.utcnow().date(), datetime.min.time())
+    password_hash = hash_password("password")
+
+    if repo.user_exists(f"{prefix}{1:07d}"):
+        raise SystemExit(f"Users with prefix {prefix!r} already exist; "
+                         "pick another --prefix or a fresh database")
+
+    first_uid = repo.max_id("users") + 1
+    first_plan = repo.max_id("plans") + 1
+    jobs = [
+        (seed, batch_no, first, min(batch_size, users - first),
+         first_uid + first, first_plan + first * weeks, weeks, until, prefix,
+         password_hash)
+        for batch_no, first in enumerate(range(0, users, batch_size))
+    ]
+
+    start = time.perf_counter()
+    done = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for job, tables in zip(jobs, pool.map(_make_batch, jobs)):
+            # Parents first so every foreign key is satisfied within the batch
+            with repo.transaction(write=True) as cur:
+                for name, columns in COLUMNS.items():
+                    repo.copy_rows(cur, name, columns, tables[name])
+
+            done += job[3]
+            elapsed = time.perf_counter() - start
+            print(f"seeded {done}/{users} users, {done * weeks} plans "
+                  f"({done / elapsed:,.0f} users/s)")
+
+    for table in ("users", "plans", "progress"):
+        repo.sync_id_sequence(table)
+    repo.analyze()
+
+    return done
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-load synthetic FitAI data")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--weeks", type=int, default=8, help="plans per user")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch", type=int, default=1000,
+                        help="users per transaction")
+    parser.add_argument("--until", type=datetime.fromisoformat, default=None,
+                        help="latest timestamp, YYYY-MM-DD (default: today)")
+    parser.add_argument("--prefix", default="seed", help="username prefix")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="processes generating plan bodies")
+    args = parser.parse_args(argv)
+
+    print(f"backend: {backend_name()}")
+    start = time.perf_counter()
+    seed(args.users, args.weeks, args.seed, args.batch, args.until, args.prefix,
+         args.workers)
+    print(f"done in {time.perf_counter() - start:,.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,278 @@
+import re
+from dataclasses import dataclass
+
+# Every SQL statement on a request path, by name.
+#
+# Written in psycopg2 style (%s / %(name)s); {plan_blob} and {for_update}
+# are filled in per backend by compile_statements(). PostgresRepository
+# PREPAREs each one once per pooled connection and runs it with EXECUTE,
+# SQLite keeps them in its per-connection statement cache, and async_db
+# hands the numbered ($1..$n) form to asyncpg, which prepares on first use.
+#
+# Bulk loading and admin maintenance (COPY, setval, ANALYZE) stay ad hoc.
+
+_INACTIVE_USERS = """
+    FROM users u
+    WHERE u.created_at < %(cutoff)s
+      AND NOT EXISTS (
+          SELECT 1 FROM plans p
+          WHERE p.user_id = u.id AND p.timestamp >= %(cutoff)s)
+      AND NOT EXISTS (
+          SELECT 1 FROM progress g
+          WHERE g.user_id = u.id AND g.timestamp >= %(cutoff)s)
+"""
+
+STATEMENTS = {
+    # ---------------- USERS ----------------
+    "user_insert":
+        "INSERT INTO users (username, password_hash) VALUES (%s, %s)",
+    "login":
+        "SELECT id FROM users WHERE username=%s AND password_hash=%s",
+    "user_exists":
+        "SELECT 1 FROM users WHERE username=%s",
+    "all_users":
+        "SELECT id, username FROM users ORDER BY username",
+    "user_delete":
+        "DELETE FROM users WHERE id=%s",
+    "users_purge_chunk":
+        "DELETE FROM users WHERE id = ANY(%s)",
+    "inactive_count":
+        "SELECT COUNT(*) " + _INACTIVE_USERS,
+    "inactive_users":
+        "SELECT u.id " + _INACTIVE_USERS
+        + " AND u.id > %(after)s ORDER BY u.id LIMIT %(limit)s",
+
+    # ---------------- PLANS ----------------
+    "plan_history": """
+        SELECT id, week, {plan_blob}, timestamp
+        FROM plans
+        WHERE user_id=%s
+        ORDER BY week DESC
+    """,
+    "plan_index": """
+        SELECT id, week, timestamp, plan_length
+        FROM plans
+        WHERE user_id=%s AND week < %s
+        ORDER BY week DESC
+        LIMIT %s
+    """,
+    "plan_body":
+        "SELECT {plan_blob} FROM plans WHERE id=%s",
+    "plan_model":
+        "SELECT plan_json FROM plans WHERE id=%s",
+    "plan_id":
+        "SELECT id FROM plans WHERE user_id=%s AND week=%s",
+    "plan_lock": """
+        SELECT id, {plan_blob} FROM plans
+        WHERE user_id=%s AND week=%s
+        {for_update}
+    """,
+    "plan_write": """
+        UPDATE plans
+        SET plan = NULL, plan_z = %s, plan_length = %s, plan_json = %s,
+            timestamp = CURRENT_TIMESTAMP
+        WHERE id = %s
+    """,
+    "plan_upsert": """
+        INSERT INTO plans (user_id, week, plan_z, plan_length, plan_json)
+        VALUES (%s, %s, %s, %s, %s)
+        ON CONFLICT(user_id, week)
+        DO UPDATE SET
+            plan = NULL,
+            plan_z = excluded.plan_z,
+            plan_length = excluded.plan_length,
+            plan_json = excluded.plan_json,
+            timestamp = CURRENT_TIMESTAMP
+        RETURNING id
+    """,
+    "plan_delete":
+        "DELETE FROM plans WHERE id=%s RETURNING user_id, week",
+    "legacy_plan_count":
+        "SELECT COUNT(*) FROM plans WHERE plan_z IS NULL AND plan IS NOT NULL",
+    "legacy_plan_batch": """
+        SELECT id, plan FROM plans
+        WHERE id > %s AND plan_z IS NULL AND plan IS NOT NULL
+        ORDER BY id
+        LIMIT %s
+    """,
+    "legacy_plan_compress": """
+        UPDATE plans
+        SET plan_z = %s, plan = NULL,
+            plan_length = COALESCE(plan_length, %s),
+            plan_json = COALESCE(plan_json, %s)
+        WHERE id = %s AND plan_z IS NULL
+    """,
+
+    # ---------------- PLAN VERSIONS ----------------
+    "version_head":
+        "SELECT MAX(version) FROM plan_versions WHERE plan_id=%s",
+    "version_insert": """
+        INSERT INTO plan_versions
+        (plan_id, user_id, week, version, parent_version,
+         is_snapshot, payload, payload_size, note)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+    """,
+    "version_list": """
+        SELECT v.version, v.is_snapshot, v.payload_size, v.note, v.timestamp
+        FROM plan_versions v
+        JOIN plans p ON p.id = v.plan_id
+        WHERE p.user_id=%s AND p.week=%s
+        ORDER BY v.version DESC
+    """,
+    # Nearest snapshot at or below `v`, then its deltas in order
+    "version_replay": """
+        SELECT version, is_snapshot, payload
+        FROM plan_versions
+        WHERE plan_id=%(pid)s AND version <= %(v)s AND version >= (
+            SELECT MAX(version) FROM plan_versions
+            WHERE plan_id=%(pid)s AND version <= %(v)s AND is_snapshot
+        )
+        ORDER BY version
+    """,
+
+    # ---------------- PROFILE / PROGRESS ----------------
+    "profile": """
+        SELECT age, height, weight, state, city, goal,
+               diet, workout_place, budget
+        FROM user_profile
+        WHERE user_id=%s
+    """,
+    "profile_upsert": """
+        INSERT INTO user_profile
+        (user_id, age, height, weight, state, city,
+         goal, diet, workout_place, budget)
+        VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
+        ON CONFLICT (user_id)
+        DO UPDATE SET
+            age=EXCLUDED.age,
+            height=EXCLUDED.height,
+            weight=EXCLUDED.weight,
+            state=EXCLUDED.state,
+            city=EXCLUDED.city,
+            goal=EXCLUDED.goal,
+            diet=EXCLUDED.diet,
+            workout_place=EXCLUDED.workout_place,
+            budget=EXCLUDED.budget
+    """,
+    "progress": """
+        SELECT week, weight, difficulty, timestamp
+        FROM progress
+        WHERE user_id=%s
+        ORDER BY week ASC
+    """,
+    "progress_insert":
+        "INSERT INTO progress(user_id, week, weight, difficulty) VALUES (%s,%s,%s,%s)",
+    "progress_delete_week":
+        "DELETE FROM progress WHERE user_id=%s AND week=%s",
+    "weight_update":
+        "UPDATE user_profile SET weight = %s WHERE user_id = %s",
+    "preferences_upsert": """
+        INSERT INTO preferences (user_id, key, value)
+        VALUES (%s, 'user_preferences', %s)
+        ON CONFLICT (user_id, key)
+        DO UPDATE SET
+            value = EXCLUDED.value
+    """,
+
+    # ---------------- GENERATION JOBS ----------------
+    # Jobs a dead process left queued / running stop blocking new ones
+    "job_expire": """
+        UPDATE generation_jobs
+        SET status = 'failed', error = 'interrupted',
+            updated_at = CURRENT_TIMESTAMP
+        WHERE user_id=%s AND week=%s AND status IN ('queued', 'running')
+          AND updated_at < %s
+    """,
+    "job_active": """
+        SELECT id FROM generation_jobs
+        WHERE user_id=%s AND week=%s AND status IN ('queued', 'running')
+    """,
+    "job_insert": """
+        INSERT INTO generation_jobs (user_id, week, kind)
+        VALUES (%s, %s, %s)
+        RETURNING id
+    """,
+    # Heartbeat: jobs this process still holds are not stale
+    "job_touch": """
+        UPDATE generation_jobs
+        SET updated_at = CURRENT_TIMESTAMP
+        WHERE id = %s AND status IN ('queued', 'running')
+    """,
+    "job_update": """
+        UPDATE generation_jobs
+        SET status = %s, result = %s, error = %s,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE id = %s
+    """,
+    "job_get": """
+        SELECT id, user_id, week, kind, status, result, error,
+               created_at, updated_at
+        FROM generation_jobs
+        WHERE id=%s
+    """,
+    "job_latest": """
+        SELECT id, user_id, week, kind, status, result, error,
+               created_at, updated_at
+        FROM generation_jobs
+        WHERE user_id=%s AND week=%s
+        ORDER BY id DESC
+        LIMIT 1
+    """,
+
+    # ---------------- SESSION STATE ----------------
+    "user_state": """
+        SELECT p.age, p.height, p.weight, p.state, p.city, p.goal,
+               p.diet, p.workout_place, p.budget,
+               p.user_id IS NOT NULL,
+               (SELECT COUNT(*) FROM plans
+                WHERE user_id=%(uid)s),
+               (SELECT COALESCE(MAX(week), 0) FROM plans
+                WHERE user_id=%(uid)s),
+               (SELECT {plan_blob} FROM plans
+                WHERE user_id=%(uid)s
+                ORDER BY timestamp DESC LIMIT 1),
+               (SELECT value FROM preferences
+                WHERE user_id=%(uid)s AND key='user_preferences')
+        FROM (SELECT 1) AS one
+        LEFT JOIN user_profile p ON p.user_id=%(uid)s
+    """,
+}
+
+_PARAM = re.compile(r"%\((\w+)\)s|%s")
+
+
+@dataclass(frozen=True)
+class Statement:
+    name: str
+    text: str           # %s / %(name)s placeholders
+    numbered: str       # $1..$n placeholders, for PREPARE and asyncpg
+    params: tuple       # dict keys in $n order (named statements only)
+
+    @property
+    def arity(self):
+        return len(self.params)
+
+    def positional(self, params):
+        if isinstance(params, dict):
+            return tuple(params[key] for key in self.params)
+        return tuple(params)
+
+
+def _compile(name, text):
+    keys = []
+
+    def number(match):
+        key = match.group(1)
+        if key is None or key not in keys:
+            keys.append(key)
+            return f"${len(keys)}"
+        return f"${keys.index(key) + 1}"
+
+    return Statement(name, text, _PARAM.sub(number, text), tuple(keys))
+
+
+def compile_statements(plan_blob, for_update=""):
+    return {
+        name: _compile(name, sql.format(plan_blob=plan_blob, for_update=for_update))
+        for name, sql in STATEMENTS.items()
+    }
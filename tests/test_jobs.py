@@ -0,0 +1,37 @@
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("streamlit")
+pytest.importorskip("psycopg2")
+
+import database
+from jobs import DONE, JobQueue
+from repository import SQLiteRepository
+
+
+def test_long_queued_job_is_not_expired(tmp_path, monkeypatch):
+    repo = SQLiteRepository(str(tmp_path / "jobs.db"))
+    monkeypatch.setattr(database, "get_repository", lambda: repo)
+    repo.create_user("queued", "x")
+    uid = repo.find_user("queued", "x")[0]
+
+    queue = JobQueue(workers=1, stale_after=2, heartbeat=0.2)
+    release = threading.Event()
+    running = queue.submit(uid, 1, "plan", lambda job: release.wait(10) and "plan 1")
+    queued = queue.submit(uid, 2, "plan", lambda job: "plan 2")
+    try:
+        # Past stale_after (CURRENT_TIMESTAMP keeps whole seconds), yet
+        # another process submitting either week still finds it active
+        time.sleep(3.5)
+        assert database.create_job(uid, 1, "plan", stale_after=2) == (running.id, False)
+        assert database.create_job(uid, 2, "plan", stale_after=2) == (queued.id, False)
+    finally:
+        release.set()
+
+    deadline = time.monotonic() + 10
+    while queued.active and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert database.get_job(running.id).status == DONE
+    assert database.get_job(queued.id).status == DONE
@@ -0,0 +1,76 @@
+import re
+
+from plan_model import Plan, parse_plan
+from sample_plans import make_corpus, make_plan
+
+LOOSE = """Here is your personalised plan:
+# Week 2 Fitness Plan
+**7-Day Workout Plan**
+Warm up for 5 minutes before every session.
+Day 1 (Upper Body):
+* Push-ups 3x12
+* Plank (3 × 30 sec)
+  * Note: keep your core tight
+Day 2: Lower
+- Lunges: 3x10
+Day 3: Rest
+""" + "".join(f"Day {d}:\n- Walk: 20 min\n" for d in range(4, 8)) + """
+## Diet Plan
+Drink water with every meal.
+Day 1: Breakfast: Poha
+- Lunch: Dal rice
+""" + "".join(f"Day {d}:\n- Dinner: Roti\n" for d in range(2, 8)) + """Hydration:
+- 3L water
+Tips:
+- Sleep 8 hours
+- Meal prep on Sunday
+"""
+
+
+def _lines(text):
+    return [line.strip() for line in text.splitlines() if line.strip()]
+
+
+def test_sample_plans_round_trip():
+    for plan in make_corpus(200) + [make_plan(week=3, workout_place="Gym")]:
+        out = parse_plan(plan).to_markdown()
+        assert out == plan
+        # and every non-blank line survives, in order
+        assert _lines(out) == _lines(plan)
+
+
+def test_json_round_trip():
+    for plan in make_corpus(50):
+        model = parse_plan(plan)
+        assert Plan.from_json(model.to_json()).to_markdown() == plan
+
+
+def test_loose_plan_keeps_unplaced_text():
+    plan = parse_plan(LOOSE)
+    assert plan.complete
+    assert plan.title == "Week 2 Fitness Plan"
+    assert plan.notes == [
+        "Here is your personalised plan:",
+        "Warm up for 5 minutes before every session.",
+        "Drink water with every meal.",
+        "Tips:",
+        "- Sleep 8 hours",
+        "- Meal prep on Sunday",
+    ]
+    assert plan.workout[0].notes == ["Note: keep your core tight"]
+    # a trailing "Tips" section is not filed as Day 7 meals
+    assert [m.food for m in plan.diet[-1].meals] == ["Roti"]
+
+    out = parse_plan(plan.to_markdown())
+    assert out.to_json() == plan.to_json()
+    words = set(re.findall(r"\w+", plan.to_markdown()))
+    assert set(re.findall(r"\w+", LOOSE)) <= words
+
+
+def test_preamble_does_not_replace_explicit_title():
+    body = make_plan(week=2)
+    plan = parse_plan("Sure! Here is your updated plan\n\n" + body)
+    assert plan.title == parse_plan(body).title
+    assert plan.notes == ["Sure! Here is your updated plan"]
+    # without a "Title:" line the first heading still names the plan
+    assert parse_plan(LOOSE).title == "Week 2 Fitness Plan"
@@ -0,0 +1,43 @@
+import difflib
+import json
+
+import pytest
+
+from plan_model import parse_plan
+from plan_patch import PatchError, apply_patch, parse_patch
+from sample_plans import make_corpus
+from tests.test_plan_model import LOOSE
+
+
+def _ops(*ops):
+    return parse_patch(json.dumps({"ops": list(ops)}))
+
+
+def _changed(before, after):
+    diff = difflib.unified_diff(before.splitlines(), after.splitlines(), lineterm="", n=0)
+    return [line for line in diff if line[:1] in "+-" and line[:3] not in ("+++", "---")]
+
+
+def test_patch_touches_only_targeted_lines():
+    ops = _ops({"op": "set_meal", "day": 3, "meal": "Dinner", "food": "Grilled fish"},
+               {"op": "add_exercise", "day": 1, "name": "Plank", "detail": "3 × 30s"})
+    for plan in make_corpus(20):
+        out = apply_patch(plan, ops)
+        model = parse_plan(out)
+        assert model.diet_day(3).meal("Dinner").food == "Grilled fish"
+        assert model.workout_day(1).exercises[-1].name == "Plank"
+        assert len(_changed(plan, out)) <= 3
+
+
+def test_loose_plan_keeps_its_text():
+    out = apply_patch(LOOSE, _ops(
+        {"op": "set_meal", "day": 1, "meal": "Breakfast", "food": "Idli"},
+        {"op": "replace_exercise", "day": 1, "old": "push", "name": "Dips", "detail": "3x8"},
+    ))
+    assert _changed(LOOSE, out) == [
+        "-* Push-ups 3x12", "+* Dips: 3x8",
+        "-Day 1: Breakfast: Poha", "+Day 1: Breakfast: Idli",
+    ]
+
+    with pytest.raises(PatchError):
+        apply_patch(LOOSE, _ops({"op": "remove_exercise", "day": 1, "old": "Deadlift"}))